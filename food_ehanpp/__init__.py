@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Food-eHANPP helper package
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: calculation stages, figures and functions to store, query and post-process
+the urban and rural Food-eHANPP results.
+
+    import food_ehanpp
+    inputs = food_ehanpp.load('.')
+    results = food_ehanpp.run(inputs=inputs)
+    food_ehanpp.plot_figures(food_ehanpp.figure_data(results.df_food_regional, results.df_pop_reg), '.')
+
+Importing the package is cheap: the stage functions are looked up in their modules on
+first use, so pandas, dask and matplotlib are only imported when they are needed.
+"""
+
+import importlib
+
+
+# public name -> module
+_API = {'load': 'pipeline', 'prepare': 'pipeline', 'allocate': 'pipeline', 'aggregate_national': 'pipeline',
+        'aggregate_regional': 'pipeline', 'run': 'pipeline', 'write_outputs': 'pipeline',
+        'Inputs': 'pipeline', 'Results': 'pipeline',
+        'figure_data': 'figures', 'plot_figures': 'figures', 'read_figure_data': 'figures',
+        'ScenarioEngine': 'scenarios', 'ResultsCube': 'results_cube', 'read_results': 'export',
+        'ProductResults': 'product_results'}
+
+__all__ = sorted(_API)
+
+
+def __getattr__(name):
+    if name not in _API:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'{__name__}.{_API[name]}'), name)
+    globals()[name] = value # look up only once
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
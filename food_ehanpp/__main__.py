@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""python -m food_ehanpp <command>, see food_ehanpp.cli"""
+
+from food_ehanpp.cli import main
+
+
+main()
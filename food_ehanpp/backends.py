@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Dataframe backends
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: the stages from the eHANPP csv to the national results, written once as a
+plan of backend operations (scan_csv, filter, join, with_columns, group_sum) and run by
+
+    PolarsBackend   lazy polars: the whole plan is optimised before it runs (filters and
+                    projections pushed down to the csv reader, no intermediate copies,
+                    multi-threaded joins and group-bys)
+
+The pandas backend is food_ehanpp.pipeline itself (run(..., backend='pandas') calls
+pipeline.run), so there is one pandas implementation of the calculation.
+
+Column expressions are functions of a column accessor c (column name -> pandas Series or
+polars expression). The urban/rural split, the derivatives and the elasticities are the
+same functions as in food_ehanpp.pipeline and food_ehanpp.sensitivity.
+
+Differences to food_ehanpp.pipeline: the infrastructure rows are not cut out and concatenated
+again but handled by conditional columns and primary_product_Code stays a string column.
+The results are otherwise the same; the regional aggregation runs in pandas as before.
+
+check_against_pipeline compares the national results of a run with those of pipeline.run.
+
+Usage:
+    results = run('.', backend='polars')
+    check_against_pipeline(results, '.')
+"""
+
+import os
+
+import pandas as pd
+
+from food_ehanpp import pipeline
+from food_ehanpp.grouping import country_classification, select_scheme
+from food_ehanpp.pipeline import (EHANPP_FILE, FOOD_4_COLUMNS, FOOD_SUPPLY_FILE, GDD_COLUMNS, LINK, NATIONAL_COLUMNS, NATIONAL_KEYS,
+                                  SOMALIA_SELECTION, Inputs, Results, aggregate_regional, country_table, group_population,
+                                  load_gdd, load_look_up, national_population, urban_rural)
+from food_ehanpp.scenarios import BOUNDS
+from food_ehanpp.sensitivity import derivative_expressions, elasticity_expressions
+from food_ehanpp.validation import check_master_table, check_no_nans, check_same_results
+
+
+###############################################################################
+#                                Backends                                     #
+###############################################################################
+
+class PolarsBackend:
+    """Lazy polars: operations extend a query plan, collect_all optimises and runs it."""
+
+    name = 'polars'
+
+    def __init__(self):
+        import polars as pl
+        self.pl = pl
+
+    def scan_csv(self, file, dtypes=None, encoding='utf-8'):
+        pl = self.pl
+        types = {'float64': pl.Float64, 'int64': pl.Int64, 'object': pl.String}
+        overrides = {column: types[dtype] for column, dtype in (dtypes or {}).items()}
+        if encoding in ['utf-8', 'utf8']:
+            return pl.scan_csv(file, schema_overrides=overrides)
+        # the lazy reader only decodes utf-8
+        return pl.read_csv(file, schema_overrides=overrides, encoding=encoding).lazy()
+
+    def from_pandas(self, df):
+        # object columns (mixed numbers and strings, e.g. item codes) as strings
+        df = df.copy()
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        return self.pl.from_pandas(df).lazy()
+
+    # expressions
+    def when(self, condition, then, otherwise):
+        pl = self.pl
+        then = then if isinstance(then, pl.Expr) else pl.lit(then)
+        otherwise = otherwise if isinstance(otherwise, pl.Expr) else pl.lit(otherwise)
+        return pl.when(condition).then(then).otherwise(otherwise)
+
+    def nonzero(self, x):
+        return self.pl.when(x != 0).then(x)
+
+    def is_null(self, x):
+        return x.is_null()
+
+    def isin(self, x, values):
+        return x.is_in(list(values))
+
+    def to_float(self, x):
+        return x.cast(self.pl.Float64, strict=False)
+
+    # frames
+    def filter(self, df, predicate):
+        return df.filter(predicate(self.pl.col))
+
+    def with_columns(self, df, expressions):
+        """Add or replace the columns of expressions(c) -> {name: expression}, all computed from df."""
+        return df.with_columns([expression.alias(name) for name, expression in expressions(self.pl.col).items()])
+
+    def select(self, df, columns):
+        return df.select(list(columns))
+
+    def drop(self, df, columns):
+        return df.drop(list(columns))
+
+    def rename(self, df, columns):
+        return df.rename(columns)
+
+    def join(self, left, right, on, how='left'):
+        return left.join(right, on=on, how=how, coalesce=True)
+
+    def unique(self, df, columns):
+        return df.select(list(columns)).unique()
+
+    def group_sum(self, df, keys, columns):
+        # sorted by the keys like pandas groupby
+        return df.group_by(keys).agg(self.pl.col(list(columns)).sum()).sort(keys)
+
+    def fill_null(self, df, value):
+        numeric = self.pl.selectors.numeric()
+        return df.with_columns(numeric.fill_nan(value).fill_null(value))
+
+    def collect_all(self, frames):
+        # one plan for all frames: common parts (csv scan, joins) run once
+        return [df.to_pandas() for df in self.pl.collect_all(list(frames))]
+
+
+BACKENDS = {'polars': PolarsBackend}
+
+
+def get_backend(backend):
+    """Backend of a name ('polars'), a backend instance is returned as is."""
+    return BACKENDS[backend]() if isinstance(backend, str) else backend
+
+
+###############################################################################
+#                                 Stages                                      #
+###############################################################################
+
+def read_ehanpp(b, file):
+    """eHANPP food data summed up by Destination (country of consumption), see pipeline.load_ehanpp."""
+    df = b.scan_csv(file, dtypes={'Destination_code_FAO': 'float64','primary_product_Code': 'object', 'Origin_code_FAO': 'float64'})
+
+    # Undo specification that has been done for Zenodo:
+    df = b.with_columns(df, lambda c: {
+        'primary_product': b.when(c('primary_product') == 'Agri. Infrastructure', 'Infrastructure', c('primary_product')),
+        'primary_product_Code': b.when(c('primary_product_Code') == 'Agri.Infra', 'Infrastructure', c('primary_product_Code'))})
+
+    #Select only Food Items = drop Unknown and other uses
+    df = b.filter(df, lambda c: ~b.isin(c('Final_use'), ['Unknown', 'Other uses']))
+    return b.group_sum(df, ['Destination','Destination_code_FAO','Year','Final_use','primary_product','primary_product_Code'],
+                       ['HANPP_embodied_in_trade'])
+
+
+def read_food_supply(b, file):
+    """Food supply with numeric product code (column code)."""
+    df = b.scan_csv(file, encoding='latin-1')
+    df = b.select(df, ['Destination_code_FAO','Destination','GDD_code','Year','primary_product','primary_product_Code','tonnes_traded_dm'])
+    df = b.with_columns(b.rename(df, {'primary_product_Code': 'code'}), lambda c: {
+        'Destination_code_FAO': b.to_float(c('Destination_code_FAO')), 'code': b.to_float(c('code'))})
+    return b.filter(df, lambda c: ~b.is_null(c('code')))
+
+
+def look_up_tables(b, look_up, GDD):
+    """Look-up tables as backend frames with the key types of the eHANPP data (codes float64, years int64)."""
+    df_countries = country_table(look_up['country_groups']).dropna(subset=['income_group'])
+    df_countries['Destination_code_FAO'] = df_countries['Destination_code_FAO'].astype('float64')
+
+    tables = {'countries': df_countries}
+    for name, sheet, columns in [('products', 'products', ['food_group','GDD_item_code','GDD_item']),
+                                 ('kcal', 'factors', ['dm_content','kcal/g'])]:
+        df = look_up[sheet][['primary_product_Code'] + columns].drop_duplicates().rename(columns={'primary_product_Code': 'code'})
+        df['code'] = pd.to_numeric(df['code'], errors='coerce').astype('float64') #as the codes of the eHANPP data
+        tables[name] = df.dropna(subset=['code'])
+
+    #GDD per estimate and the values of Ethiopia (for Somalia) side by side
+    tables['GDD'] = {}
+    df_eth = None
+    for estimate, df in GDD.items():
+        df = df[['GDD_code','Year','GDD_item_code',f'GDD_urban_{estimate}',f'GDD_rural_{estimate}']].astype({'Year': 'int64'})
+        tables['GDD'][estimate] = df
+        df = df.loc[df['GDD_code'] == 'ETH'].drop(columns='GDD_code')
+        df_eth = df if df_eth is None else df_eth.merge(df, how='outer', on=['Year','GDD_item_code'])
+    tables['eth'] = df_eth.rename(columns={column: column + '_eth' for column in GDD_COLUMNS})
+
+    #population of all countries, the join selects the considered ones
+    df_pop = national_population(look_up['total_population'], look_up['urban_population'])
+    tables['pop'] = df_pop.astype({'Destination_code_FAO': 'float64', 'Year': 'int64'})
+
+    return {name: ({estimate: b.from_pandas(df) for estimate, df in df.items()} if name == 'GDD' else b.from_pandas(df))
+            for name, df in tables.items()}
+
+
+def master_table(b, df_food, df_food_supply, tables):
+    """Master table (df_food_6 of the pipeline) and the considered country-years.
+
+    Countries, food groups, GDD with the corrections of pipeline.add_gdd, population, food supply
+    and the allocation of pipeline.allocate.
+    """
+    #Add regions and dismiss countries that are not considered
+    df = b.join(df_food, tables['countries'], on=['Destination_code_FAO'], how='inner')
+    df_country_years = b.unique(df, ['Year','Destination_code_FAO'])
+
+    #food groups and GDD items (infrastructure has no numeric code and gets 'Infra')
+    df = b.with_columns(df, lambda c: {'code': b.to_float(c('primary_product_Code')),
+                                       'infra': c('primary_product_Code') == 'Infrastructure'})
+    df = b.join(df, tables['products'], on=['code'])
+    df = b.with_columns(df, lambda c: {column: b.when(c('infra'), 'Infra', c(column))
+                                       for column in ['food_group','GDD_item_code','GDD_item']})
+
+    #add GDD data
+    for df_GDD in tables['GDD'].values():
+        df = b.join(df, df_GDD, on=['GDD_code','Year','GDD_item_code'])
+
+    #correct nans:
+        #1 city states: 0 rural population
+        #2 Stimulants and Spices are seperated equally between urban and urual due to missing GDD values
+    def corrections(c):
+        stimulants = c('food_group') == 'Sugars and stimulants'
+        columns = {}
+        for column in GDD_COLUMNS:
+            value = c(column)
+            if '_rural_' in column:
+                value = b.when((c('GDD_code') == 'SGP') & b.is_null(value), 0, value)
+            columns[column] = b.when(stimulants & b.is_null(value), 1, value)
+        columns['GDD_item'] = b.when(stimulants & b.is_null(c('GDD_item')), 'XX', c('GDD_item'))
+        return columns
+    df = b.with_columns(df, corrections)
+
+        #3 no GDD for North Korea: removed (its infrastructure rows are kept, as in the pipeline)
+    df = b.filter(df, lambda c: (c('GDD_code') != 'PRK') | c('infra'))
+
+        #4 Somalia: values of Ethiopia, rows selected by the gaps before filling
+    df = b.join(df, tables['eth'], on=['Year','GDD_item_code'])
+    df = b.with_columns(df, lambda c: {
+        column: b.when((c('GDD_code') == 'SOM') & b.is_null(c(selection)), c(column + '_eth'), c(column))
+        for column, selection in SOMALIA_SELECTION.items()})
+    df = b.drop(df, [column + '_eth' for column in GDD_COLUMNS])
+
+        #infrastructure: same intake in urban and rural areas
+    df = b.with_columns(df, lambda c: {column: b.when(c('infra'), 1.0, c(column)) for column in GDD_COLUMNS})
+
+    #add population, supply and kcal (infrastructure has no code and no match)
+    df = b.join(df, tables['pop'], on=['Destination_code_FAO','Year'])
+    df = b.join(df, df_food_supply, on=['Destination_code_FAO','Destination','GDD_code','Year','primary_product','code'])
+    df = b.join(df, tables['kcal'], on=['code'])
+    return allocate(b, df), df_country_years
+
+
+def allocate(b, df):
+    """Urban/rural Food-eHANPP and kcal of the median, high and low estimate, see pipeline.allocate."""
+    #Supply in kcal
+    df = b.with_columns(df, lambda c: {'kcal_traded': c('tonnes_traded_dm') / c('dm_content') * 1000 * 1000 * c('kcal/g')})
+    df = b.drop(df, ['dm_content','kcal/g','code','infra'])
+
+    def split(c):
+        columns = {'kcal/cap/day': (c('kcal_traded') / c('pop_national')) /365}
+        for scenario, (gdd_urban, gdd_rural) in BOUNDS.items():
+            columns[f'FeH_urban_{scenario}'], columns[f'FeH_rural_{scenario}'] = urban_rural(c, gdd_urban, gdd_rural, 'HANPP_embodied_in_trade')
+            columns[f'kcal_urban_{scenario}'], columns[f'kcal_rural_{scenario}'] = urban_rural(c, gdd_urban, gdd_rural, 'kcal_traded')
+        return columns
+    df = b.with_columns(df, split)
+
+    def per_capita(c):
+        columns = {}
+        for scenario in BOUNDS:
+            columns[f'FeH_urban_cap_{scenario}'] = c(f'FeH_urban_{scenario}') / c('urban population')
+            columns[f'FeH_rural_cap_{scenario}'] = c(f'FeH_rural_{scenario}') / b.nonzero(c('rural population'))
+        columns['kcal_urb_cap_median'] = (c('kcal_urban_median') / c('urban population')) / 365
+        columns['kcal_rur_cap_median'] = c('kcal_rural_median') / b.nonzero(c('rural population')) / 365
+        return columns
+    df = b.with_columns(df, per_capita)
+
+    #sensitivity: derivatives with respect to pop_urb_share and GDD_urban/GDD_rural
+    return b.with_columns(df, lambda c: derivative_expressions(c, b.nonzero))
+
+
+def national(b, df_food_6, df_pop):
+    """National results with elasticities, see pipeline.aggregate_national."""
+    df = b.group_sum(b.fill_null(df_food_6, 0), NATIONAL_KEYS, NATIONAL_COLUMNS)
+    df = b.join(df, b.select(df_pop, ['Destination_code_FAO','Year','pop_urb_share']), on=['Destination_code_FAO','Year'])
+    df = b.with_columns(df, lambda c: elasticity_expressions(c, c('pop_urb_share'), b.nonzero))
+    return b.drop(df, ['pop_urb_share'])
+
+
+def run(path='.', link=LINK, backend='polars', look_up=None, GDD=None):
+    """Master table and national results with the backend, regional results in pandas; returns Results
+    like pipeline.run (without df_food_5). look_up and GDD can be passed to reuse loaded tables.
+    backend 'pandas' runs pipeline.run on the same tables."""
+    look_up = look_up if look_up is not None else load_look_up(link)
+    GDD = GDD if GDD is not None else load_gdd(link)
+    if backend == 'pandas':
+        inputs = Inputs(df_food=pipeline.load_ehanpp(os.path.join(path, EHANPP_FILE)), look_up=look_up, GDD=GDD,
+                        df0_food_supply=pipeline.read_food_supply(os.path.join(path, FOOD_SUPPLY_FILE)))
+        return pipeline.run(path, link, inputs=inputs)
+    b = get_backend(backend)
+    tables = look_up_tables(b, look_up, GDD)
+
+    df_food = read_ehanpp(b, os.path.join(path, EHANPP_FILE))
+    df_food_supply = read_food_supply(b, os.path.join(path, FOOD_SUPPLY_FILE))
+    df_food_6, df_country_years = master_table(b, df_food, df_food_supply, tables)
+    df_food_national = national(b, df_food_6, tables['pop'])
+    df_food_6, df_food_national, df_country_years = b.collect_all([df_food_6, df_food_national, df_country_years])
+
+    check_no_nans(df_food_6, 'df_food_4', FOOD_4_COLUMNS) #! should be 0 rows
+    check_master_table(df_food_6)
+
+    #population of the considered countries and of the country groupings
+    df0_countries = look_up['country_groups']
+    df_classification = country_classification(df0_countries, sorted(df_country_years['Year'].unique()))
+    df_pop_nat = national_population(look_up['total_population'], look_up['urban_population'], df_country_years)
+    df_pop_groups = group_population(df_pop_nat, df_classification)
+
+    df_food_groups, df_food_regional = aggregate_regional(df_food_national, df_classification, df_pop_groups)
+    return Results(df_food_6=df_food_6, df_food_national=df_food_national, df_food_groups=df_food_groups,
+                   df_food_regional=df_food_regional, df_countries=country_table(df0_countries),
+                   df_classification=df_classification, df_pop_nat=df_pop_nat, df_pop_groups=df_pop_groups,
+                   df_pop_reg=select_scheme(df_pop_groups, 'income_group'))
+
+
+def check_against_pipeline(results, path='.', link=LINK, look_up=None, GDD=None, name='polars'):
+    """Raise a ValidationError if the national results of a backend run differ from those of
+    pipeline.run (the reference) on the same inputs; returns the reference Results."""
+    reference = run(path, link, backend='pandas', look_up=look_up, GDD=GDD)
+    check_same_results(results.df_food_national, reference.df_food_national, NATIONAL_KEYS, NATIONAL_COLUMNS,
+                       f'df_food_national ({name})')
+    return reference
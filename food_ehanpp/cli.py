@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Command line interface
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: subcommands for the stages of the calculation. Only argparse is imported at
+start-up, pandas/dask/matplotlib are imported by the subcommand that needs them.
+
+    python -m food_ehanpp run [--path .] [--no-figures]    calculation, outputs and figures
+    python -m food_ehanpp run --distributed [--scheduler tcp://host:8786]   ... on a dask cluster
+    python -m food_ehanpp run --backend polars             ... as one lazy polars query
+    python -m food_ehanpp run --compact [--precision-report]   ... with float32 tables (and their deviation from float64)
+    python -m food_ehanpp run --exact-sums                 ... with exact sums (bit-identical for any row order)
+    python -m food_ehanpp run --check                      ... and compare the national results with the reference
+    python -m food_ehanpp run --kernels                    ... with fused allocation/summation (numba if installed)
+    python -m food_ehanpp run --strata GDD_DIR POP_CSV     ... and split into age, sex and education strata
+    python -m food_ehanpp run --gdd GDD_DIR                ... with GDD data extracted from the GDD country files
+    python -m food_ehanpp update [--years 2021]             append new data years to the stored results
+    python -m food_ehanpp gdd GDD_DIR [--output gdd]        extract the GDD data (Arrow files)
+    python -m food_ehanpp gdd-synthetic DIR [--countries 185] write synthetic GDD country files
+    python -m food_ehanpp gdd-benchmark [--scale 185x7x22]  time and memory of the GDD extraction on synthetic files
+    python -m food_ehanpp plot [--path .]                   figures from exported figure data
+    python -m food_ehanpp reports [--countries 100 351] [--pdf]   report figures per country
+    python -m food_ehanpp decompose [--start 1990 --end 2019]   LMDI decomposition of urban/rural FeH changes
+    python -m food_ehanpp inequality [--draws 1000]         Gini/Theil of FeH per capita with GDD resampling bands
+    python -m food_ehanpp preview [--countries 0.5]         approximate figures from a coarsened master table
+    python -m food_ehanpp scenarios --share-delta 0.1 0.2   what-if scenarios from scenario_engine.npz
+    python -m food_ehanpp serve [--path .]                  serve the results cube over HTTP
+    python -m food_ehanpp session [--config session.json]   keep the results in memory, recompute on input changes
+"""
+
+import argparse
+import os
+
+
+def _run(args):
+    if args.distributed or args.scheduler:
+        from food_ehanpp import distributed
+        with distributed.start_client(args.scheduler, args.workers): # open until the outputs are written
+            _run_stages(args)
+    else:
+        _run_stages(args)
+
+
+def _run_stages(args):
+    from food_ehanpp.pipeline import LINK, load, load_look_up, run, write_outputs
+
+    link = args.link or LINK
+    GDD = inputs = None
+    if args.gdd:
+        from food_ehanpp.gdd import gdd_tables
+        GDD = gdd_tables(args.gdd)
+        if not (args.distributed or args.scheduler or args.backend):
+            inputs = load(args.path, link, GDD=GDD)
+
+    if args.distributed or args.scheduler:
+        from food_ehanpp import distributed
+        if GDD is not None:
+            inputs = distributed.load(args.path, link, args.partitions, GDD=GDD)
+        results = distributed.run(args.path, link, inputs=inputs, npartitions=args.partitions)
+        if args.check:
+            distributed.check_against_pipeline(results, args.path, link, GDD)
+    elif args.compact:
+        from food_ehanpp.precision import run_compact
+        results = run_compact(args.path, link, inputs=inputs, reference=args.precision_report)
+        if args.precision_report:
+            results.precision.to_csv(os.path.join(args.path, 'precision_report.csv'), index=False)
+            print('max. relative deviation from float64: {:.2e}, master table {:.0f} MB instead of {:.0f} MB'.format(
+                results.precision['max_rel_deviation'].max(), results.memory['compact'] / 1e6, results.memory['float64'] / 1e6))
+    elif args.kernels:
+        from food_ehanpp import kernels
+        results = kernels.run(args.path, link, inputs=inputs)
+    elif args.backend:
+        from food_ehanpp import backends
+        look_up = load_look_up(link)
+        results = backends.run(args.path, link, backend=args.backend, look_up=look_up, GDD=GDD)
+        if args.check and args.backend != 'pandas':
+            backends.check_against_pipeline(results, args.path, link, look_up, GDD, args.backend)
+    else:
+        if args.check and inputs is None:
+            inputs = load(args.path, link)
+        results = run(args.path, link, inputs=inputs, exact_sums=args.exact_sums)
+        if args.check:
+            from food_ehanpp.joins import check_against_merges
+            check_against_merges(inputs)
+    data = None
+    if not args.no_figures or not args.no_export:
+        from food_ehanpp.figures import figure_data
+        data = figure_data(results.df_food_regional, results.df_pop_reg)
+    if not args.no_export:
+        write_outputs(results, args.path, data, products=args.products)
+    if args.strata:
+        from food_ehanpp import strata
+        df_food_6 = results.df_food_6
+        if hasattr(df_food_6, 'compute'): # master table of --distributed is a dask frame
+            df_food_6 = df_food_6.compute()
+        strata.write_strata(os.path.join(args.path, 'results', 'strata'), df_food_6,
+                            strata.read_strata_intake(args.strata[0]), strata.read_strata_population(args.strata[1]))
+    if not args.no_figures:
+        from food_ehanpp.figures import plot_figures
+        plot_figures(data, args.path)
+
+
+def _update(args):
+    from food_ehanpp.incremental import update
+    from food_ehanpp.pipeline import LINK
+
+    results = update(args.path, args.link or LINK, years=args.years)
+    print('appended years: {}, recomputed regional years: {}'.format(results.years, results.recomputed_years))
+
+
+def _gdd(args):
+    from food_ehanpp.gdd import gdd_tables, write_gdd_tables
+
+    write_gdd_tables(args.output, gdd_tables(args.source))
+
+
+def _gdd_synthetic(args):
+    from food_ehanpp.gdd_synthetic import write_synthetic_gdd
+
+    write_synthetic_gdd(args.output, args.countries, args.years, args.variables, args.seed)
+
+
+def _gdd_benchmark(args):
+    from food_ehanpp.gdd_synthetic import benchmark
+
+    scales = [tuple(int(n) for n in scale.split('x')) for scale in args.scale]
+    report = benchmark(scales, args.keep, args.repeat)
+    report.to_csv(args.output, index=False)
+    print(report.to_string(index=False))
+
+
+def _plot(args):
+    from food_ehanpp.figures import plot_figures, read_figure_data
+
+    plot_figures(read_figure_data(os.path.join(args.path, 'results')), args.path)
+
+
+def _reports(args):
+    from food_ehanpp.country_reports import PROCESSES, write_country_reports
+    from food_ehanpp.export import read_results
+    from food_ehanpp.pipeline import LINK, load_look_up, national_population
+
+    df_food_national = read_results(os.path.join(args.path, 'results', 'national.parquet'))
+    look_up = load_look_up(args.link or LINK)
+    df_pop_nat = national_population(look_up['total_population'], look_up['urban_population'])
+    directory = os.path.join(args.path, 'country_reports')
+    write_country_reports(df_food_national, df_pop_nat, directory, countries=args.countries,
+                          processes=args.processes or PROCESSES,
+                          pdf=os.path.join(args.path, 'country_reports.pdf') if args.pdf else None)
+
+
+def _national_inputs(args):
+    """Stored national results, national population, classification and group population of a run."""
+    from food_ehanpp.export import read_results
+    from food_ehanpp.grouping import country_classification
+    from food_ehanpp.pipeline import LINK, group_population, load_look_up, national_population
+
+    df_food_national = read_results(os.path.join(args.path, 'results', 'national.parquet'))
+    look_up = load_look_up(args.link or LINK)
+    df_pop_nat = national_population(look_up['total_population'], look_up['urban_population'], df_food_national)
+    df_classification = country_classification(look_up['country_groups'], sorted(df_food_national['Year'].unique()))
+    return df_food_national, df_pop_nat, df_classification, group_population(df_pop_nat, df_classification)
+
+
+def _decompose(args):
+    from food_ehanpp.decomposition import decompose
+
+    if (args.start is None) != (args.end is None):
+        raise SystemExit('decompose: --start and --end are used together')
+    pairs = [(args.start, args.end)] if args.start is not None else None
+    decompose(*_national_inputs(args), pairs=pairs, scheme=args.scheme).to_csv(args.output, index=False)
+
+
+def _inequality(args):
+    from food_ehanpp.inequality import inequality, urban_rural_gaps
+
+    df_food_national, df_pop_nat, _, _ = _national_inputs(args)
+    inequality(df_food_national, df_pop_nat, draws=args.draws, seed=args.seed, by_year=args.by_year).to_csv(args.output, index=False)
+    if args.gaps:
+        urban_rural_gaps(df_food_national, df_pop_nat).to_csv(args.gaps, index=False)
+
+
+def _preview(args):
+    from food_ehanpp.figures import plot_figures
+    from food_ehanpp.preview import build_preview_inputs, deviation_report, run_preview
+
+    directory = os.path.join(args.path, 'preview')
+    if args.build or not os.path.exists(os.path.join(directory, 'master.parquet')):
+        from food_ehanpp import joins
+        from food_ehanpp.pipeline import LINK, load
+        build_preview_inputs(directory, joins.prepare(load(args.path, args.link or LINK)))
+    _, data = run_preview(directory, countries=args.countries, year_step=args.year_step, seed=args.seed)
+    plot_figures(data, directory)
+    report = deviation_report(data, os.path.join(args.path, 'results'))
+    report.to_csv(os.path.join(directory, 'preview_deviation.csv'), index=False)
+    if len(report):
+        print('max. relative deviation from the last full run: {:.1%}'.format(report['max_rel_deviation'].max()))
+
+
+def _scenarios(args):
+    from food_ehanpp.scenarios import ScenarioEngine
+
+    engine = ScenarioEngine.load(os.path.join(args.path, 'scenario_engine.npz'))
+    result = engine.evaluate(share_year=args.share_year, share_delta=args.share_delta,
+                             diet_year=args.diet_year, convergence=args.convergence, bound=args.bound)
+    result.to_frame().to_csv(args.output, index=False)
+
+
+def _serve(args):
+    from food_ehanpp.results_cube import serve_results_cube
+
+    serve_results_cube(os.path.join(args.path, 'results_cube'), args.host, args.port)
+
+
+def _session(args):
+    from food_ehanpp.session import Session
+
+    session = Session(args.path, args.config)
+    try:
+        session.watch(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def _values(values):
+    """Single value as scalar, several values as list (one scenario per value)."""
+    if values is None:
+        return None
+    return values[0] if len(values) == 1 else values
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='food_ehanpp', description='Urban and rural Food-eHANPP')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('run', help='calculation, outputs and figures')
+    command.add_argument('--path', default='.', help='folder with the eHANPP and food supply csv, outputs are written here')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx and the GDD csv (default: GitHub repository)')
+    command.add_argument('--no-figures', action='store_true', help='do not plot the figures')
+    command.add_argument('--no-export', action='store_true', help='do not write cube, scenario engine, parquet and xlsx')
+    command.add_argument('--products', action='store_true', help='also write product-level national results (product_results.npz)')
+    command.add_argument('--distributed', action='store_true', help='allocation and national aggregation on a local dask cluster')
+    command.add_argument('--scheduler', default=None, help='address of a dask scheduler (implies --distributed)')
+    command.add_argument('--workers', type=int, default=None, help='number of local workers (default: one per core)')
+    command.add_argument('--partitions', type=int, default=32, help='partitions of the eHANPP data (by country)')
+    command.add_argument('--exact-sums', action='store_true',
+                         help='exact national and country group sums, independent of the row order (food_ehanpp/summation.py); '
+                              'not with --distributed, --compact, --kernels or --backend')
+    command.add_argument('--compact', action='store_true',
+                         help='float32 tables (food_ehanpp.precision)')
+    command.add_argument('--precision-report', action='store_true',
+                         help='with --compact: also run in float64 and write precision_report.csv (deviation from float64)')
+    command.add_argument('--kernels', action='store_true',
+                         help='allocation and national sums in one pass over the master table (food_ehanpp.kernels)')
+    command.add_argument('--backend', default=None, choices=['pandas', 'polars'],
+                         help='run eHANPP csv to national results as one query plan of this backend (food_ehanpp.backends, pandas: pipeline.run)')
+    command.add_argument('--gdd', default=None, metavar='GDD_DIR',
+                         help='GDD data from the GDD country files or the Arrow files of the gdd subcommand instead of the GDD csv')
+    command.add_argument('--check', action='store_true',
+                         help='also compare the national results with the reference implementation '
+                              '(dense joins: pandas merges, --backend polars and --distributed: pandas run)')
+    command.add_argument('--strata', nargs=2, default=None, metavar=('GDD_DIR', 'POPULATION_CSV'),
+                         help='also split national results into urban/rural x age x sex x education strata '
+                              '(GDD country files and population per stratum, results/strata/*.parquet)')
+    command.set_defaults(function=_run)
+
+    command = commands.add_parser('update', help='append new data years to the results of a previous run (results/*.parquet)')
+    command.add_argument('--path', default='.', help='folder with the eHANPP and food supply csv and the results folder')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx and the GDD csv (default: GitHub repository)')
+    command.add_argument('--years', type=int, nargs='+', default=None, help='years to (re)compute (default: years not stored yet)')
+    command.set_defaults(function=_update)
+
+    command = commands.add_parser('gdd', help='extract urban/rural GDD data from the GDD country files (vXX_cnty.csv)')
+    command.add_argument('source', help='folder with the extracted GDD country files')
+    command.add_argument('--output', default='gdd', help='folder of the Arrow files GDD_<estimate>.arrow')
+    command.set_defaults(function=_gdd)
+
+    command = commands.add_parser('gdd-synthetic', help='write synthetic GDD country files (vXX_cnty.csv, random values)')
+    command.add_argument('output', help='folder of the files')
+    command.add_argument('--countries', type=int, default=185)
+    command.add_argument('--years', type=int, default=7, help='number of GDD years from 1990 to 2018')
+    command.add_argument('--variables', type=int, default=22, help='number of GDD variables (22: all variables of the calculation)')
+    command.add_argument('--seed', type=int, default=0)
+    command.set_defaults(function=_gdd_synthetic)
+
+    command = commands.add_parser('gdd-benchmark', help='time and memory of the GDD extraction on synthetic GDD files')
+    command.add_argument('--scale', nargs='+', default=['20x7x22', '185x7x22', '185x29x22'],
+                         help='countries x years x variables of each run')
+    command.add_argument('--repeat', type=int, default=3, help='runs per scale (best time)')
+    command.add_argument('--keep', default=None, help='folder for the synthetic files (default: temporary, removed)')
+    command.add_argument('--output', default='gdd_benchmark.csv')
+    command.set_defaults(function=_gdd_benchmark)
+
+    command = commands.add_parser('plot', help='figures from the exported figure data (results/figure_data_*.parquet)')
+    command.add_argument('--path', default='.')
+    command.set_defaults(function=_plot)
+
+    command = commands.add_parser('reports', help='report figures per country from results/national.parquet (country_reports folder)')
+    command.add_argument('--path', default='.', help='folder with the results of a run')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx (population, default: GitHub repository)')
+    command.add_argument('--countries', type=int, nargs='+', default=None, help='FAO codes (default: all countries)')
+    command.add_argument('--processes', type=int, default=None, help='worker processes (default: one per core)')
+    command.add_argument('--pdf', action='store_true', help='also write all reports as pages of country_reports.pdf')
+    command.set_defaults(function=_reports)
+
+    command = commands.add_parser('decompose', help='LMDI decomposition of urban/rural FeH changes (results/national.parquet)')
+    command.add_argument('--path', default='.', help='folder with the results of a run')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx (population and groups, default: GitHub repository)')
+    command.add_argument('--start', type=int, default=None, help='first year (default: all consecutive years)')
+    command.add_argument('--end', type=int, default=None, help='last year')
+    command.add_argument('--scheme', default='income_group', help='country grouping of the group rows')
+    command.add_argument('--output', default='decomposition.csv')
+    command.set_defaults(function=_decompose)
+
+    command = commands.add_parser('inequality', help='inequality of FeH per capita between countries and urban/rural areas per year')
+    command.add_argument('--path', default='.', help='folder with the results of a run')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx (population, default: GitHub repository)')
+    command.add_argument('--draws', type=int, default=1000, help='draws within the GDD intervals for the confidence bands')
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--by-year', action='store_true', help='independent draws per year (default: one draw per country)')
+    command.add_argument('--output', default='inequality.csv')
+    command.add_argument('--gaps', default=None, help='also write the urban/rural ratio per country and year to this csv')
+    command.set_defaults(function=_inequality)
+
+    command = commands.add_parser('preview', help='approximate figures from a coarsened master table (preview folder)')
+    command.add_argument('--path', default='.', help='folder with the eHANPP and food supply csv and the results of the last full run')
+    command.add_argument('--link', default=None, help='location of look_up.xlsx and the GDD csv (default: GitHub repository)')
+    command.add_argument('--build', action='store_true', help='(re)build the coarsened tables from the inputs')
+    command.add_argument('--countries', type=float, default=None, help='share of countries in the sample (default: all)')
+    command.add_argument('--year-step', type=int, default=1, help='use every n-th year')
+    command.add_argument('--seed', type=int, default=0, help='seed of the country sample')
+    command.set_defaults(function=_preview)
+
+    command = commands.add_parser('scenarios', help='what-if scenarios (one per value, equal numbers of values)')
+    command.add_argument('--path', default='.', help='folder with scenario_engine.npz')
+    command.add_argument('--share-year', type=int, nargs='+')
+    command.add_argument('--share-delta', type=float, nargs='+', default=[0.0])
+    command.add_argument('--diet-year', type=int, nargs='+')
+    command.add_argument('--convergence', type=float, nargs='+', default=[0.0])
+    command.add_argument('--bound', default='median', choices=['median', 'hoch', 'niedrig'])
+    command.add_argument('--output', default='scenarios.csv')
+    command.set_defaults(function=_scenarios)
+
+    command = commands.add_parser('serve', help='serve the results cube (results_cube) over HTTP')
+    command.add_argument('--path', default='.')
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=8050)
+    command.set_defaults(function=_serve)
+
+    command = commands.add_parser('session', help='keep inputs and results in memory and recompute the stages after changed inputs')
+    command.add_argument('--path', default='.', help='folder with the eHANPP and food supply csv')
+    command.add_argument('--config', default=None, help='json file with the parameters of food_ehanpp.session.DEFAULTS (watched)')
+    command.add_argument('--interval', type=float, default=2.0, help='seconds between two checks of the input files')
+    command.set_defaults(function=_session)
+    return parser
+
+
+def _check_run_options(parser, args):
+    """Reject options of run that the chosen execution path would ignore."""
+    paths = {'--distributed': args.distributed or args.scheduler, '--compact': args.compact,
+             '--kernels': args.kernels, '--backend': args.backend}
+    chosen = [option for option, used in paths.items() if used]
+    if len(chosen) > 1: # _run_stages would take the first one and ignore the others
+        parser.error('run: ' + ', '.join(chosen) + ' are different execution paths, choose one')
+    if args.exact_sums and chosen:
+        parser.error(f'run: --exact-sums only applies to the default calculation, not with {chosen[0]}')
+    if args.check and (args.compact or args.kernels or args.backend == 'pandas'):
+        parser.error('run: --check has no reference for --compact (see --precision-report), --kernels or --backend pandas')
+    if args.precision_report and not args.compact:
+        parser.error('run: --precision-report needs --compact')
+
+
+def main(argv=None):
+    command_parser = parser()
+    args = command_parser.parse_args(argv)
+    if args.command == 'run':
+        _check_run_options(command_parser, args)
+    if args.command == 'scenarios':
+        for name in ['share_year', 'share_delta', 'diet_year', 'convergence']:
+            setattr(args, name, _values(getattr(args, name)))
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Country reports
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: Figure 3/4-style panels for every country from the national results, one png
+per country (and optionally all countries as pages of one pdf):
+
+    a) Food-eHANPP by food group              d) urban and rural Food-eHANPP
+    b) food supply by food group              e) urban and rural Food-eHANPP per capita (with GDD bounds)
+    c) urban and rural population             f) urban and rural supply of livestock and plant-based products
+
+The panel data of all countries is computed in one pass (country_data). The figure is built
+once per worker process (ReportTemplate: axes, ticks, legends, one artist per series); a
+country only replaces the data of the artists, the y limits and the title before saving, so
+no figure is rebuilt. Countries are rendered in a process pool. The pdf is written by the
+calling process with its own template (pages of one file cannot be written in parallel).
+
+Usage:
+    write_country_reports(results.df_food_national, results.df_pop_nat, 'country_reports', pdf='country_reports.pdf')
+
+    python -m food_ehanpp reports [--countries 100 351] [--pdf]
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.figures import COLORS_FEH_URB_RUR, COLORS_FOOD_GROUPS, LIVESTOCK_PRODUCTS, _pyplot
+
+
+FOOD_GROUPS = ['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables',
+               'Sugars and stimulants','Embodied built-up land']
+RURAL_COLOR, URBAN_COLOR = COLORS_FEH_URB_RUR
+
+# panel -> title, unit, kind (area: stacked areas, line: lines, band: lines with bounds), series, colors
+PANELS = {'a': {'title': 'a) Food-eHANPP by food group', 'unit': 'Mt dm/yr', 'kind': 'area',
+                'series': FOOD_GROUPS, 'colors': COLORS_FOOD_GROUPS},
+          'b': {'title': 'b) Food supply', 'unit': 'Tcal/yr', 'kind': 'area',
+                'series': FOOD_GROUPS[:-1], 'colors': COLORS_FOOD_GROUPS[:-1]},
+          'c': {'title': 'c) Urban and rural population', 'unit': 'million', 'kind': 'area',
+                'series': ['rural', 'urban'], 'colors': [RURAL_COLOR, URBAN_COLOR]},
+          'd': {'title': 'd) Urban and rural Food-eHANPP', 'unit': 'Mt dm/yr', 'kind': 'area',
+                'series': ['rural', 'urban'], 'colors': [RURAL_COLOR, URBAN_COLOR]},
+          'e': {'title': 'e) Urban and rural Food-eHANPP per capita', 'unit': 't dm/cap/yr', 'kind': 'band',
+                'series': ['rural', 'urban'], 'colors': [RURAL_COLOR, URBAN_COLOR],
+                'bands': [('rural-lower boundary', 'rural-upper boundary'), ('urban-lower boundary', 'urban-upper boundary')]},
+          'f': {'title': 'f) Livestock and plant-based supply', 'unit': 'kcal/cap/day', 'kind': 'line',
+                'series': ['rural livestock', 'urban livestock', 'rural plant-based', 'urban plant-based'],
+                'colors': [RURAL_COLOR, URBAN_COLOR, RURAL_COLOR, URBAN_COLOR], 'styles': ['-', '-', '--', '--']}}
+
+PROCESSES = os.cpu_count() or 1
+DPI = 150
+
+
+###############################################################################
+#                                 Data                                        #
+###############################################################################
+
+def country_data(df_food_national, df_pop_nat):
+    """Panel data of all countries: index (Destination_code_FAO, Year), columns (panel, series)."""
+    keys = ['Destination_code_FAO', 'Year']
+    df = df_food_national.copy()
+    df['food_group'] = df['food_group'].astype(str).replace({group: 'Livestock products' for group in LIVESTOCK_PRODUCTS})
+    df['food_group'] = df['food_group'].replace({'Infra': 'Embodied built-up land'})
+    df['Year'] = df['Year'].astype(int)
+
+    def by_food_group(column):
+        return df.pivot_table(index=keys, columns='food_group', values=column, aggfunc='sum')
+
+    sums = df.groupby(keys)[['FeH_urban_median','FeH_rural_median','FeH_urban_hoch','FeH_rural_hoch',
+                             'FeH_urban_niedrig','FeH_rural_niedrig']].sum()
+    livestock = df['food_group'] == 'Livestock products'
+    kcal_livestock = df.loc[livestock].groupby(keys)[['kcal_urban_median','kcal_rural_median']].sum()
+    kcal_plant = df.loc[~livestock & (df['food_group'] != 'Embodied built-up land')].groupby(keys)[
+        ['kcal_urban_median','kcal_rural_median']].sum()
+    pop = df_pop_nat.astype({'Year': int}).set_index(keys)[['urban population','rural population']].reindex(sums.index)
+    urban = pop['urban population']
+    rural = pop['rural population'].where(pop['rural population'] != 0)
+
+    panels = {'a': by_food_group('HANPP_embodied_in_trade') / 1000 / 1000, # to Mt
+              'b': by_food_group('kcal_traded') / 1000 / 1000 / 1000 / 1000, # to Tcal
+              'c': pd.DataFrame({'rural': pop['rural population'], 'urban': urban}) / 1000 / 1000, # to million
+              'd': pd.DataFrame({'rural': sums['FeH_rural_median'], 'urban': sums['FeH_urban_median']}) / 1000 / 1000,
+              'e': pd.DataFrame({'rural': sums['FeH_rural_median'] / rural, 'urban': sums['FeH_urban_median'] / urban,
+                                 'rural-lower boundary': sums['FeH_rural_niedrig'] / rural,
+                                 'rural-upper boundary': sums['FeH_rural_hoch'] / rural,
+                                 'urban-lower boundary': sums['FeH_urban_hoch'] / urban,
+                                 'urban-upper boundary': sums['FeH_urban_niedrig'] / urban}),
+              'f': pd.DataFrame({'rural livestock': kcal_livestock['kcal_rural_median'] / rural,
+                                 'urban livestock': kcal_livestock['kcal_urban_median'] / urban,
+                                 'rural plant-based': kcal_plant['kcal_rural_median'] / rural,
+                                 'urban plant-based': kcal_plant['kcal_urban_median'] / urban}) / 365}
+    frames = {}
+    for panel, spec in PANELS.items():
+        columns = spec['series'] + [bound for band in spec.get('bands', []) for bound in band]
+        frames[panel] = panels[panel].reindex(index=sums.index, columns=columns)
+    return pd.concat(frames, axis=1).replace([np.inf, -np.inf], np.nan) # countries without urban population
+
+
+def country_names(df_food_national):
+    """FAO code -> country name."""
+    df = df_food_national[['Destination_code_FAO', 'Destination']].drop_duplicates('Destination_code_FAO')
+    return dict(zip(df['Destination_code_FAO'], df['Destination'].astype(str)))
+
+
+def _file_name(code, name):
+    return '{}_{}'.format(code, re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_'))
+
+
+###############################################################################
+#                                Template                                     #
+###############################################################################
+
+def _polygon(x, lower, upper):
+    """Vertices of the area between lower and upper (years with missing values are left out)."""
+    shown = np.isfinite(lower) & np.isfinite(upper)
+    x, lower, upper = x[shown], lower[shown], upper[shown]
+    return np.concatenate([np.column_stack([x, upper]), np.column_stack([x[::-1], lower[::-1]])])
+
+
+class ReportTemplate:
+    """Figure of a country report with all artists; draw replaces their data."""
+
+    def __init__(self, years):
+        plt = _pyplot()
+        self.years = np.asarray(years, dtype='float64')
+        self.fig, axes = plt.subplots(2, 3, figsize=(15, 10))
+        self.title = self.fig.suptitle('', fontsize=18)
+        self.artists = {}
+        zeros = np.zeros_like(self.years)
+        for ax, (panel, spec) in zip(axes.flat, PANELS.items()):
+            if spec['kind'] == 'area':
+                series = [ax.fill_between(self.years, zeros, zeros, color=color, linewidth=0, label=name)
+                          for name, color in zip(spec['series'], spec['colors'])]
+            else:
+                styles = spec.get('styles', ['-'] * len(spec['series']))
+                series = [ax.plot(self.years, zeros, color=color, linewidth=3, linestyle=style, label=name)[0]
+                          for name, color, style in zip(spec['series'], spec['colors'], styles)]
+            bands = [ax.fill_between(self.years, zeros, zeros, color=color, alpha=0.3, linewidth=0)
+                     for color in spec['colors'][:len(spec.get('bands', []))]]
+            ax.set_title(spec['title'], fontsize=13)
+            ax.set_ylabel(spec['unit'], fontsize=13)
+            ax.set_xlim(1990, 2020)
+            ax.set_xticks([1990, 2000, 2010, 2020])
+            ax.tick_params(axis='both', labelsize=12)
+            ax.ticklabel_format(axis='y', style='sci', scilimits=(-2, 4)) # tick labels of similar width for all countries
+            ax.grid(color='black', linewidth=0.3, alpha=0.2)
+            ax.legend(fontsize=9, frameon=False, loc='upper left')
+            self.artists[panel] = (ax, series, bands)
+        self.fig.tight_layout(rect=(0, 0, 1, 0.96))
+
+    def draw(self, name, panels):
+        """Show the panel data of one country (panel -> data frame, index years as the template)."""
+        self.title.set_text(name)
+        for panel, (ax, series, bands) in self.artists.items():
+            spec = PANELS[panel]
+            df = panels[panel]
+            if spec['kind'] == 'area':
+                bottom = np.zeros_like(self.years)
+                for artist, column in zip(series, spec['series']):
+                    top = bottom + np.nan_to_num(df[column].to_numpy(dtype='float64'))
+                    artist.set_verts([_polygon(self.years, bottom, top)])
+                    bottom = top
+                highest = bottom.max(initial=0)
+            else:
+                for artist, column in zip(series, spec['series']):
+                    artist.set_ydata(df[column].to_numpy(dtype='float64'))
+                for artist, (lower, upper) in zip(bands, spec.get('bands', [])):
+                    artist.set_verts([_polygon(self.years, df[lower].to_numpy(dtype='float64'), df[upper].to_numpy(dtype='float64'))])
+                highest = np.nanmax(df.to_numpy(dtype='float64'), initial=0)
+            ax.set_ylim(0, highest * 1.15 if highest > 0 else 1)
+
+
+###############################################################################
+#                                Rendering                                    #
+###############################################################################
+
+_template = None # template of a worker process
+
+
+def _start_worker(years):
+    global _template
+    _template = ReportTemplate(years)
+
+
+def _render(task):
+    file, name, panels, dpi = task
+    _template.draw(name, panels)
+    _template.fig.savefig(file, dpi=dpi)
+    return file
+
+
+def _country_panels(data, code, years):
+    df = data.loc[code].reindex(years)
+    return {panel: df[panel] for panel in PANELS}
+
+
+def write_country_reports(df_food_national, df_pop_nat, directory='country_reports', countries=None,
+                          processes=PROCESSES, pdf=None, dpi=DPI):
+    """Report figure of every country (or of countries, FAO codes) as <code>_<name>.png in
+    directory, rendered in processes worker processes; with pdf, also all reports as pages
+    of that file. Returns the png files."""
+    os.makedirs(directory, exist_ok=True)
+    data = country_data(df_food_national, df_pop_nat)
+    names = country_names(df_food_national)
+    years = sorted(data.index.get_level_values('Year').unique())
+    codes = sorted(data.index.get_level_values('Destination_code_FAO').unique()) if countries is None else list(countries)
+    tasks = [(os.path.join(directory, _file_name(code, names[code]) + '.png'), names[code],
+              _country_panels(data, code, years), dpi) for code in codes]
+
+    if processes == 1:
+        _start_worker(years)
+        files = [_render(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_start_worker, initargs=(years,)) as pool:
+            files = list(pool.map(_render, tasks, chunksize=max(1, len(tasks) // (4 * processes))))
+
+    if pdf is not None:
+        from matplotlib.backends.backend_pdf import PdfPages
+        template = ReportTemplate(years)
+        with PdfPages(pdf) as pages:
+            for _, name, panels, _ in tasks:
+                template.draw(name, panels)
+                pages.savefig(template.fig)
+    return files
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Index decomposition of urban and rural Food-eHANPP
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: additive LMDI (log mean Divisia index, LMDI-I) decomposition of the change of
+urban and rural Food-eHANPP of every country and country group between two years into
+
+    FeH_area = P * (P_area / P) * (K_area / P_area) * sum over food groups g (K_g / K_area) * (FeH_g / K_g)
+               population  urbanization  supply per capita     diet composition   intensity
+
+with P population, K kcal supply of the area (urban or rural; the urbanization factor of
+rural areas is the rural share) and the change of FeH
+
+    dFeH_area = sum over g L(FeH_g,end, FeH_g,start) * ln(factor_end / factor_start),   L(x, y) = (x - y) / (ln x - ln y)
+
+summed per driver. Embodied built-up land (Infra) has no kcal of its own; it counts as one
+group with diet share 1 and intensity FeH_Infra / K_area. Zero (and negative) values are
+replaced by DELTA (Ang & Liu 2007), so the contributions add up to the change up to the
+residual column, which is only non-zero where FeH or kcal of a group are negative. Missing
+population gives missing contributions.
+
+All countries/groups, year pairs, areas and GDD scenarios are computed at once on arrays
+(area x scenario x unit x year x food group) built from the national results.
+
+Usage:
+    df = decompose(results.df_food_national, results.df_pop_nat, results.df_classification,
+                   results.df_pop_groups, pairs=[(1990, 2019)])
+
+    python -m food_ehanpp decompose --start 1990 --end 2019
+"""
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.grouping import select_scheme
+from food_ehanpp.scenarios import BOUNDS
+
+
+DRIVERS = ['population', 'urbanization', 'supply_per_capita', 'diet_composition', 'intensity']
+AREAS = ['urban', 'rural']
+INFRASTRUCTURE = 'Infra' # food group of embodied built-up land in the national results
+DELTA = 1e-20 # replaces zero values in logarithms
+
+
+###############################################################################
+#                                 Arrays                                      #
+###############################################################################
+
+def _value_columns():
+    return [f'{kind}_{area}_{scenario}' for kind in ['FeH', 'kcal'] for area in AREAS for scenario in BOUNDS]
+
+
+def unit_tables(df_food_national, df_pop_nat, df_classification=None, df_pop_groups=None, scheme='income_group'):
+    """FeH and kcal by unit (country code or group of scheme), year and food group, and the
+    population of the units; level is 'country' or the scheme."""
+    columns = _value_columns()
+    df = df_food_national.astype({'Year': int})
+    df['food_group'] = df['food_group'].astype(str)
+    df_food = df.groupby(['Destination_code_FAO', 'Year', 'food_group'])[columns].sum().reset_index()
+    df_pop = df_pop_nat.astype({'Year': int}).rename(columns={'pop_national': 'population'})
+
+    foods = [df_food.rename(columns={'Destination_code_FAO': 'unit'}).assign(level='country')]
+    pops = [df_pop[['Destination_code_FAO', 'Year', 'population', 'urban population', 'rural population']]
+            .rename(columns={'Destination_code_FAO': 'unit'}).assign(level='country')]
+    if df_classification is not None:
+        classification = select_scheme(df_classification, scheme, 'unit').astype({'Year': int})
+        df_groups = df_food.merge(classification, how='inner', on=['Destination_code_FAO', 'Year'])
+        foods.append(df_groups.groupby(['unit', 'Year', 'food_group'])[columns].sum().reset_index().assign(level=scheme))
+        df_pop_reg = select_scheme(df_pop_groups, scheme, 'unit').astype({'Year': int})
+        pops.append(df_pop_reg.rename(columns={'pop_regional': 'population'})[
+            ['unit', 'Year', 'population', 'urban population', 'rural population']].assign(level=scheme))
+    df_food = pd.concat(foods, ignore_index=True)
+    df_pop = pd.concat(pops, ignore_index=True)
+    for df in (df_food, df_pop):
+        df['unit'] = df['unit'].astype(str)
+    return df_food, df_pop
+
+
+def unit_arrays(df_food, df_pop):
+    """Dense arrays of unit_tables: FeH and kcal (area x scenario x unit x year x food group, missing: 0),
+    population (unit x year) and area population (area x unit x year); with the axis labels."""
+    units = df_food[['level', 'unit']].drop_duplicates().sort_values(['level', 'unit']).reset_index(drop=True)
+    numbers = units.rename_axis('number').reset_index()
+    years = np.sort(df_food['Year'].unique())
+    food_groups = sorted(df_food['food_group'].unique())
+    shape = (len(units), len(years), len(food_groups))
+
+    df = df_food.merge(numbers, on=['level', 'unit']).set_index(['number', 'Year', 'food_group'])
+    df = df.reindex(pd.MultiIndex.from_product([range(len(units)), years, food_groups]))[_value_columns()].fillna(0)
+    def array(kind):
+        return np.stack([np.stack([df[f'{kind}_{area}_{scenario}'].to_numpy(dtype='float64').reshape(shape)
+                                   for scenario in BOUNDS]) for area in AREAS])
+
+    pop = df_pop.merge(numbers, on=['level', 'unit']).set_index(['number', 'Year'])
+    pop = pop.reindex(pd.MultiIndex.from_product([range(len(units)), years]))
+    population = pop['population'].to_numpy(dtype='float64').reshape(shape[:2])
+    area_population = np.stack([pop[f'{area} population'].to_numpy(dtype='float64').reshape(shape[:2]) for area in AREAS])
+    return array('FeH'), array('kcal'), population, area_population, (units, years, food_groups)
+
+
+###############################################################################
+#                               Decomposition                                 #
+###############################################################################
+
+def _positive(x):
+    """x with values <= 0 replaced by DELTA (missing values stay missing)."""
+    return np.where(x > 0, x, np.where(np.isnan(x), np.nan, DELTA))
+
+
+def log_mean(x, y):
+    """Logarithmic mean L(x, y) = (x - y) / (ln x - ln y), L(x, x) = x, of positive arrays."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (x - y) / (np.log(x) - np.log(y))
+    return np.where(np.isclose(x, y, rtol=1e-12, atol=0), x, mean)
+
+
+def factors(FeH, kcal, population, area_population, infrastructure):
+    """Drivers of the identity (see module description), arrays like FeH (population,
+    urbanization and supply per capita with a food group axis of length 1). infrastructure:
+    boolean mask of the food group axis."""
+    FeH, kcal = _positive(FeH), _positive(kcal)
+    kcal_area = np.where(infrastructure, 0, kcal).sum(axis=-1, keepdims=True)
+    population = _positive(population)[None, None, :, :, None]
+    area_population = _positive(area_population)[:, None, :, :, None]
+    diet = np.where(infrastructure, 1.0, kcal / kcal_area)
+    intensity = np.where(infrastructure, FeH / kcal_area, FeH / kcal)
+    return {'population': population, 'urbanization': area_population / population,
+            'supply_per_capita': kcal_area / area_population, 'diet_composition': diet, 'intensity': intensity}
+
+
+def lmdi(FeH, kcal, population, area_population, infrastructure, start, end):
+    """Contributions of DRIVERS to the change of FeH from the years at positions start to end
+    (arrays of year positions): driver -> array area x scenario x unit x pair, FeH at start and
+    end and the residual (same shape)."""
+    drivers = factors(FeH, kcal, population, area_population, infrastructure)
+    weight = log_mean(_positive(FeH[..., end, :]), _positive(FeH[..., start, :]))
+    contributions = {name: (weight * np.log(factor[..., end, :] / factor[..., start, :])).sum(axis=-1)
+                     for name, factor in drivers.items()}
+    total = np.nan_to_num(FeH).sum(axis=-1)
+    change = total[..., end] - total[..., start]
+    residual = change - sum(contributions.values())
+    return contributions, total[..., start], total[..., end], residual
+
+
+def consecutive_pairs(years):
+    """(year, next year) of all consecutive years: the contributions add up over the chain."""
+    return list(zip(years[:-1], years[1:]))
+
+
+def decompose(df_food_national, df_pop_nat, df_classification=None, df_pop_groups=None, pairs=None,
+              scheme='income_group'):
+    """LMDI decomposition of urban and rural FeH (all GDD scenarios) of every country, and of the
+    groups of scheme if df_classification and df_pop_groups are given, for the year pairs
+    (start, end) (default: consecutive years). One row per unit, area, scenario and pair."""
+    df_food, df_pop = unit_tables(df_food_national, df_pop_nat, df_classification, df_pop_groups, scheme)
+    FeH, kcal, population, area_population, (units, years, food_groups) = unit_arrays(df_food, df_pop)
+    if pairs is None:
+        pairs = consecutive_pairs(list(years))
+    position = {year: i for i, year in enumerate(years)}
+    start = np.array([position[first] for first, _ in pairs])
+    end = np.array([position[last] for _, last in pairs])
+    infrastructure = np.array([group == INFRASTRUCTURE for group in food_groups])
+
+    contributions, FeH_start, FeH_end, residual = lmdi(FeH, kcal, population, area_population, infrastructure, start, end)
+    area, scenario, unit, pair = np.indices(residual.shape).reshape(4, -1)
+    df = pd.DataFrame({'level': units['level'].to_numpy()[unit], 'unit': units['unit'].to_numpy()[unit],
+                       'area': np.asarray(AREAS)[area], 'scenario': np.asarray(list(BOUNDS))[scenario],
+                       'start': np.asarray([first for first, _ in pairs])[pair], 'end': np.asarray([last for _, last in pairs])[pair],
+                       'FeH_start': FeH_start.ravel(), 'FeH_end': FeH_end.ravel()})
+    df['change'] = df['FeH_end'] - df['FeH_start']
+    for name in DRIVERS:
+        df[name] = contributions[name].ravel()
+    df['residual'] = residual.ravel()
+    return df
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Distributed execution on a dask cluster
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: runs the heavy stages of food_ehanpp.pipeline (merges with the look-up tables,
+GDD join, urban/rural allocation and national aggregation) in dask instead of pandas.
+
+The eHANPP data is summed up by Destination in dask and partitioned by Destination_code_FAO
+(each partition holds all rows of its countries), the food supply data is partitioned with the
+same divisions. Every partition then runs the pandas stages of the pipeline unchanged:
+add_countries, add_food_groups, add_gdd, add_food_supply, allocate and aggregate_national.
+The small tables (look_up.xlsx sheets, GDD, national population) are broadcast to the
+workers once. Only the national results (country x year x final use x food group) are
+gathered; regional aggregation and figures run in pandas as before.
+
+The scheduler is the dask.distributed client: a LocalCluster (all cores, one process per
+worker) or, with an address, an existing multi-node cluster. In the latter case the
+input files have to be readable by all workers (shared file system or URL).
+
+check_against_pipeline compares the national results with those of pipeline.run (pandas) on
+the same input files.
+
+Usage:
+    with start_client():                        # or start_client('tcp://scheduler:8786')
+        results = run('.')
+        results.df_food_national
+        check_against_pipeline(results, '.')
+"""
+
+import os
+
+import numpy as np
+
+from food_ehanpp.grouping import country_classification, select_scheme
+from food_ehanpp.pipeline import (EHANPP_FILE, FOOD_SUPPLY_FILE, LINK, NATIONAL_COLUMNS, NATIONAL_KEYS, Inputs, Results,
+                                  add_countries, add_food_groups, add_food_supply, add_gdd, aggregate_national,
+                                  aggregate_regional, allocate, country_table, group_population,
+                                  load_gdd, load_look_up, national_population)
+from food_ehanpp.validation import check_same_results
+
+
+NPARTITIONS = 32 # partitions of the eHANPP data, each with ~6 countries
+BLOCKSIZE = '64MB' # csv block size read by one task
+
+
+def start_client(address=None, n_workers=None, threads_per_worker=1):
+    """dask.distributed client of the scheduler at address or of a new LocalCluster.
+
+    The client registers itself as default scheduler, so all following dask computations
+    (also in run) use the cluster. Use it as context manager (with start_client() as client:)
+    so that it and its local cluster are closed.
+    """
+    from dask.distributed import Client
+
+    if address is not None:
+        return Client(address)
+    return Client(n_workers=n_workers, threads_per_worker=threads_per_worker, processes=True) # closes its LocalCluster on close
+
+
+def _divisions(codes, npartitions):
+    """Sorted division boundaries that split the country codes into npartitions partitions."""
+    codes = np.unique(np.asarray(codes, dtype='float64'))
+    positions = np.linspace(0, len(codes) - 1, min(npartitions, len(codes) - 1) + 1).round().astype(int)
+    return [float(code) for code in codes[np.unique(positions)]]
+
+
+def read_ehanpp(file, codes, npartitions=NPARTITIONS, blocksize=BLOCKSIZE):
+    """eHANPP data of the considered countries summed up by Destination, indexed and partitioned by Destination_code_FAO."""
+    import dask.dataframe as dd
+
+    ddf = dd.read_csv(file, blocksize=blocksize,
+                      dtype={'Destination_code_FAO': 'float64','primary_product_Code': 'object', 'Origin_code_FAO': 'float64'})
+
+    # Undo specification that has been done for Zenodo:
+    ddf['primary_product'] = ddf['primary_product'].replace('Agri. Infrastructure', 'Infrastructure')
+    ddf['primary_product_Code'] = ddf['primary_product_Code'].replace('Agri.Infra', 'Infrastructure')
+
+    #Select only Food Items of considered countries (as add_countries)
+    ddf = ddf.loc[~ddf['Final_use'].isin(['Unknown', 'Other uses']) & ddf['Destination_code_FAO'].isin(list(codes))]
+
+    #reduce dataframe volume by summing up by Destination = Country of consumption:
+    ddf = ddf.groupby(['Destination','Destination_code_FAO','Year','Final_use',
+                       'primary_product','primary_product_Code'])[['HANPP_embodied_in_trade']].sum(
+                           split_out=npartitions).reset_index()
+    return ddf.set_index('Destination_code_FAO', divisions=_divisions(codes, npartitions))
+
+
+def read_food_supply(file, divisions, blocksize=BLOCKSIZE):
+    """Food supply data partitioned with the same divisions as the eHANPP data."""
+    import dask.dataframe as dd
+
+    ddf = dd.read_csv(file, blocksize=blocksize, encoding='latin-1')
+    ddf['Destination_code_FAO'] = ddf['Destination_code_FAO'].astype('float64')
+    return ddf.set_index('Destination_code_FAO', divisions=list(divisions))
+
+
+def load(path='.', link=LINK, npartitions=NPARTITIONS, GDD=None):
+    """Inputs with eHANPP (df_food) and food supply (df0_food_supply) as persisted dask frames
+    (GDD tables that are passed are not read)."""
+    look_up = load_look_up(link)
+    codes = country_table(look_up['country_groups']).dropna(subset=['income_group'])['Destination_code_FAO']
+    df_food = read_ehanpp(os.path.join(path, EHANPP_FILE), codes, npartitions).persist()
+    df0_food_supply = read_food_supply(os.path.join(path, FOOD_SUPPLY_FILE), df_food.divisions).persist()
+    return Inputs(df_food=df_food, look_up=look_up, GDD=GDD if GDD is not None else load_gdd(link),
+                  df0_food_supply=df0_food_supply)
+
+
+def ethiopia_gdd(GDD):
+    """GDD values of Ethiopia (all estimates) for the gaps of Somalia, which is in another partition."""
+    df_eth = None
+    for df in GDD.values():
+        df = df.loc[df['GDD_code'] == 'ETH']
+        df_eth = df if df_eth is None else df_eth.merge(df, how='outer', on=['GDD_code','Year','GDD_item_code'])
+    return df_eth
+
+
+def _master_partition(df_food, df_food_supply, lookups):
+    """Master table df_food_6 of the countries of one partition (pandas stages of the pipeline)."""
+    df_food_1, _ = add_countries(df_food.reset_index(), lookups['country_groups'])
+    df_food_2, df_infra = add_food_groups(df_food_1, lookups['products'])
+    df_food_4 = add_gdd(df_food_2, df_infra, lookups['products'], lookups['GDD'], lookups['df_eth'])
+    df_food_5 = add_food_supply(df_food_4, lookups['df_pop_nat'], df_food_supply.reset_index(), lookups['factors'])
+    return allocate(df_food_5)
+
+
+def run(path='.', link=LINK, inputs=None, npartitions=NPARTITIONS, output=None):
+    """All stages with allocation and national aggregation in dask; returns Results like pipeline.run.
+
+    df_food_6 of the results is a (lazy) dask frame, all other tables are pandas. With output,
+    the national results are also written as parquet dataset partitioned by Year.
+    """
+    import dask
+    import dask.dataframe as dd
+
+    if inputs is None:
+        inputs = load(path, link, npartitions)
+    df0_countries = inputs.look_up['country_groups']
+    df_countries = country_table(df0_countries)
+
+    #considered country-years (= rows of df_food_1) for population and classification
+    df_country_years = inputs.df_food.reset_index()[['Year','Destination_code_FAO']].drop_duplicates().compute()
+    df_classification = country_classification(df0_countries, sorted(df_country_years['Year'].unique()))
+    df_pop_nat = national_population(inputs.look_up['total_population'], inputs.look_up['urban_population'], df_country_years)
+    df_pop_groups = group_population(df_pop_nat, df_classification)
+
+    #small tables are sent to every worker once
+    lookups = {'country_groups': df0_countries, 'products': inputs.look_up['products'],
+               'factors': inputs.look_up['factors'], 'GDD': inputs.GDD,
+               'df_eth': ethiopia_gdd(inputs.GDD), 'df_pop_nat': df_pop_nat}
+    broadcast = dask.delayed(lookups, pure=True)
+
+    #metadata: the same stages on empty partitions
+    meta_6 = _master_partition(inputs.df_food._meta, inputs.df0_food_supply._meta, lookups)
+    df_food_6 = dd.map_partitions(_master_partition, inputs.df_food, inputs.df0_food_supply, broadcast,
+                                  meta=meta_6, enforce_metadata=False).clear_divisions()
+
+    #partitions hold whole countries, so national sums need no shuffle
+    df_food_national = df_food_6.map_partitions(aggregate_national, dask.delayed(df_pop_nat, pure=True),
+                                                meta=aggregate_national(meta_6, df_pop_nat), enforce_metadata=False)
+    if output is not None:
+        df_food_national.to_parquet(output, partition_on=['Year'], write_index=False)
+    df_food_national = df_food_national.compute().reset_index(drop=True)
+
+    df_food_groups, df_food_regional = aggregate_regional(df_food_national, df_classification, df_pop_groups)
+    return Results(df_food_6=df_food_6, df_food_national=df_food_national, df_food_groups=df_food_groups,
+                   df_food_regional=df_food_regional, df_countries=df_countries, df_classification=df_classification,
+                   df_pop_nat=df_pop_nat, df_pop_groups=df_pop_groups, df_pop_reg=select_scheme(df_pop_groups, 'income_group'))
+
+
+def check_against_pipeline(results, path='.', link=LINK, GDD=None):
+    """Raise a ValidationError if the national results of a distributed run differ from those of
+    pipeline.run on the same input files; returns the reference Results."""
+    from food_ehanpp import pipeline
+
+    reference = pipeline.run(inputs=pipeline.load(path, link, GDD=GDD))
+    check_same_results(results.df_food_national, reference.df_food_national, NATIONAL_KEYS, NATIONAL_COLUMNS,
+                       'df_food_national (distributed)')
+    return reference
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Results export
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: writes the national, regional and figure-data tables as compressed parquet
+files (typed columns, dictionary encoded keys, row-group statistics) and the figure data
+for the SI as xlsx with a streaming (write-only) Excel writer.
+
+Usage:
+    export_results('results', df_food_national, df_food_regional, figure_data)
+    read_results('results/national.parquet', filters=[('Year', '>=', 2010), ('Destination', '==', 'India')])
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# key columns are stored dictionary encoded, sorted in this order for selective row-group statistics
+KEY_COLUMNS = ['scheme', 'group', 'Destination_code_FAO', 'Destination', 'GDD_code', 'income_group', 'Year',
+               'Final_use', 'food_group', 'primary_product', 'primary_product_Code']
+
+# small integer types for codes and years
+INTEGER_COLUMNS = {'Destination_code_FAO': 'int16', 'Year': 'int16'}
+
+ROW_GROUP_SIZE = 50000
+COMPRESSION = 'zstd'
+
+
+###############################################################################
+#                                 Parquet                                     #
+###############################################################################
+
+def _typed(df):
+    """Copy of df with categorical keys, small integer codes and float64 values."""
+    df = df.reset_index(drop=True)
+    columns = {}
+    for column in df.columns:
+        if column in INTEGER_COLUMNS:
+            columns[column] = df[column].astype(INTEGER_COLUMNS[column])
+        elif column in KEY_COLUMNS:
+            columns[column] = df[column].astype(str).astype('category')
+        elif df[column].dtype == object:
+            try:
+                columns[column] = pd.to_numeric(df[column]).astype('float64')
+            except (ValueError, TypeError):
+                columns[column] = df[column].astype(str).astype('category')
+        else:
+            columns[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return pd.DataFrame(columns)
+
+
+def write_parquet(df, file, row_group_size=ROW_GROUP_SIZE):
+    """Write df as compressed parquet file, sorted by its key columns so that filters can skip row groups."""
+    df = _typed(df)
+    keys = [column for column in KEY_COLUMNS if column in df.columns]
+    if keys:
+        df = df.sort_values(keys, kind='stable').reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    dictionary_columns = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    pq.write_table(table, file, row_group_size=row_group_size, compression=COMPRESSION,
+                   use_dictionary=dictionary_columns, write_statistics=True)
+
+
+def read_results(file, columns=None, filters=None):
+    """Read (parts of) a parquet file written by write_parquet.
+
+    filters are pyarrow filters, e.g. [('Year', '>=', 2010), ('income_group', '==', 'L')],
+    row groups that cannot match are skipped.
+    """
+    return pq.read_table(file, columns=columns, filters=filters).to_pandas()
+
+
+def export_results(directory, df_food_national, df_food_regional, figure_data=None, df_food_groups=None):
+    """Write national, regional, country-group (all schemes) and figure-data tables as parquet files to directory."""
+    os.makedirs(directory, exist_ok=True)
+    write_parquet(df_food_national, os.path.join(directory, 'national.parquet'))
+    write_parquet(df_food_regional, os.path.join(directory, 'regional.parquet'))
+    if df_food_groups is not None:
+        write_parquet(df_food_groups, os.path.join(directory, 'groups.parquet'))
+    for name, df in (figure_data or {}).items():
+        write_parquet(_flat(df), os.path.join(directory, f'figure_data_{name}.parquet'))
+
+
+###############################################################################
+#                                   Excel                                     #
+###############################################################################
+
+def _flat(df):
+    """Figure data frames have years/income groups as index: move it into columns."""
+    df = df.reset_index()
+    df.columns = [' - '.join(str(c) for c in column) if isinstance(column, tuple) else str(column)
+                  for column in df.columns]
+    return df
+
+
+def write_si_workbook(file, sheets, chunk_size=10000):
+    """Write each data frame in sheets (sheet name -> data frame) to one sheet of an xlsx file.
+
+    openpyxl's write-only mode streams rows to disk, so memory stays constant
+    no matter how large the tables are; rows are converted in chunks of chunk_size.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for name, df in sheets.items():
+        df = _flat(df)
+        sheet = workbook.create_sheet(title=str(name)[:31]) # Excel limit for sheet names
+        sheet.append(list(df.columns))
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            chunk = chunk.astype(object).where(chunk.notna(), None) # empty cells instead of NaN
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+    workbook.save(file)
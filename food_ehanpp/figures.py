@@ -0,0 +1,932 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Figures
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: data frames and plots of Figure 3, Figure 4 and the SI figures S5a-d from the
+regional (income group) results. The figure data is a dict name -> data frame (Fig3a ...
+FigS5d), it is exported with the results and can be read back with read_figure_data, so
+figures can be redrawn without recalculating. matplotlib is only imported by the plot
+functions and always uses the non-interactive Agg backend.
+
+Usage:
+    data = figure_data(results.df_food_regional, results.df_pop_reg)
+    plot_figures(data, '.')
+"""
+
+import glob
+import os
+
+import pandas as pd
+
+
+INCOME_GROUP_MAPPING = {'L': 'Low-income',
+                        'LM': 'Lower-middle-income',
+                        'UM': 'Upper-middle-income',
+                        'H': 'High-income'}
+INCOME_GROUP_ORDER = ['Low-income', 'Lower-middle-income', 'Upper-middle-income', 'High-income', 'Global']
+INCOME_GROUPS_SI = ['Low-income','Lower-middle-income','Upper-middle-income','High-income','Global']
+
+LIVESTOCK_PRODUCTS = ['Milk and milk products','Monogastric products','Ruminant meat']
+
+COLORS_FOOD_GROUPS = ['#833C0C','#FFC000','#F4B084','#9BC2E6','#F290DF','#AEAAAA','#44546A']
+COLORS_FOOD_GROUPSANDALL = ['#833C0C','#FFC000','#F4B084','#9BC2E6','#F290DF','#AEAAAA','black']
+COLORS_REGIONS = ['#F4D03F','#2874A6','#A93226','#73C6B6']
+COLORS_REGIONSANDGLO = ['#F4D03F','#2874A6','#A93226','#73C6B6','black']
+COLORS_FEH_URB_RUR = ['#00B050','#808080']
+COLORS_FEH_URB_RUR_GLO = ['black','#00B050','#00B050','#00B050','#808080','#808080','#808080']
+COLORS_FIG4 = ['#F4D03F','#2874A6','#A93226','#73C6B6','#595959']
+
+# index columns of the exported (flat) figure data
+FIGURE_INDEX = {'Fig3': ['Year'], 'Fig4': ['income_group'], 'FigS5': ['Year', 'income_group']}
+
+
+def _pyplot():
+    """matplotlib.pyplot with the Agg backend: plots are not shown interactively, only saved."""
+    import matplotlib as mpl
+    mpl.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+###############################################################################
+#                            Figure data                                      #
+###############################################################################
+
+def figure3_data(df_food_regional):
+    """Data frames of Figure 3a-i (index Year)."""
+    #Dataframes for Figure 3abc
+    #stacked regions in pop
+    df_food_regions_pop = df_food_regional[['income_group','Year','pop_regional']].drop_duplicates()
+    df_food_regions_pop = df_food_regions_pop.groupby(['income_group','Year']).sum(['pop_regional']).reset_index()
+    df_food_regions_pop = df_food_regions_pop.pivot(index = 'Year', columns='income_group', values='pop_regional')
+    df_food_regions_pop = df_food_regions_pop / 1000 /1000/1000  # to billion
+    df_food_regions_pop = df_food_regions_pop.rename(columns={'H': 'High-income',
+                                                              'L': 'Low-income',
+                                                              'LM': 'Lower-middle-income',
+                                                              'UM': 'Upper-middle-income'})
+    df_food_regions_pop = df_food_regions_pop[['Low-income', 'Lower-middle-income','Upper-middle-income','High-income']]
+    #stacked regions in FeH
+    df_food_regions_FeH = df_food_regional[['income_group','Year','HANPP_embodied_in_trade']]
+    df_food_regions_FeH = df_food_regions_FeH.groupby(['income_group','Year']).sum(['HANPP_embodied_in_trade']).reset_index()
+    df_food_regions_FeH = df_food_regions_FeH.pivot(index = 'Year', columns='income_group', values='HANPP_embodied_in_trade')
+    df_food_regions_FeH = df_food_regions_FeH / 1000 /1000/1000 # to Gt
+    df_food_regions_FeH = df_food_regions_FeH.rename(columns={'H': 'High-income',
+                                                              'L': 'Low-income',
+                                                              'LM': 'Lower-middle-income',
+                                                              'UM': 'Upper-middle-income'})
+    df_food_regions_FeH = df_food_regions_FeH[['Low-income', 'Lower-middle-income','Upper-middle-income','High-income']]
+    #intensities regions FeH/cap
+    df_food_regions_pop_glo = df_food_regions_pop.copy()
+    df_food_regions_pop_glo['Global'] = df_food_regions_pop_glo.sum(axis=1)
+
+    df_food_regions_FeH_glo = df_food_regions_FeH.copy()
+    df_food_regions_FeH_glo['Global'] = df_food_regions_FeH_glo.sum(axis=1)
+
+    df_food_regions_int = df_food_regions_FeH_glo/df_food_regions_pop_glo
+    df_food_regions_int = df_food_regions_int[['Low-income', 'Lower-middle-income','Upper-middle-income','High-income','Global']]
+    ###############################################################################
+    #Dataframes for Figure 3def
+    #stacked food group in kcal
+    df_food_group_global_kcal = df_food_regional[['income_group','Year','food_group','kcal_traded']]
+    df_food_group_global_kcal = df_food_group_global_kcal.groupby(['Year','food_group']).sum(['kcal_traded']).reset_index()
+    df_food_group_global_kcal = df_food_group_global_kcal.pivot(index = 'Year', columns='food_group', values='kcal_traded')
+    df_food_group_global_kcal['Livestock products'] = df_food_group_global_kcal['Ruminant meat'] + df_food_group_global_kcal['Monogastric products'] + df_food_group_global_kcal['Milk and milk products']
+    df_food_group_global_kcal['overall'] = df_food_group_global_kcal.sum(axis=1)
+    df_food_group_global_kcal = df_food_group_global_kcal[['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables','Sugars and stimulants', 'overall']]
+
+    #stacked food group in FeH
+    df_food_group_global_FeH = df_food_regional[['income_group','Year','food_group','HANPP_embodied_in_trade']]
+    df_food_group_global_FeH = df_food_group_global_FeH.groupby(['Year','food_group']).sum(['HANPP_embodied_in_trade']).reset_index()
+    df_food_group_global_FeH = df_food_group_global_FeH.pivot(index = 'Year', columns='food_group', values='HANPP_embodied_in_trade')
+    df_food_group_global_FeH['Livestock products'] = df_food_group_global_FeH['Ruminant meat'] + df_food_group_global_FeH['Monogastric products'] + df_food_group_global_FeH['Milk and milk products']
+    df_food_group_global_FeH['overall'] = df_food_group_global_FeH.sum(axis=1)
+
+    #Rename Infrastructure:
+    df_food_group_global_FeH = df_food_group_global_FeH.rename(columns={'Infra': 'Embodied built-up land'})
+    #Reorder columns:
+    df_food_group_global_FeH = df_food_group_global_FeH[['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables','Sugars and stimulants','Embodied built-up land', 'overall']]
+
+    #intensities food group FeH/kcal
+    df_food_group_global_int = df_food_group_global_FeH/df_food_group_global_kcal
+
+    #Delete overall/infrastrcuture from kcal and int columns:
+    df_food_group_global_kcal = df_food_group_global_kcal[['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables','Sugars and stimulants']]
+    df_food_group_global_int = df_food_group_global_int[['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables','Sugars and stimulants','overall']]
+    #delete overall from FeH
+    df_food_group_global_FeH = df_food_group_global_FeH[['Livestock products','Cereals','Tubers and legumes','Oil seeds and nuts','Fruits and Vegetables','Sugars and stimulants','Embodied built-up land']]
+
+    df_food_group_global_kcal = df_food_group_global_kcal/1000/1000/1000/1000/1000 # to Exacal
+    df_food_group_global_FeH = df_food_group_global_FeH / 1000 /1000/1000 # to Gt
+    df_food_group_global_int = df_food_group_global_int *1000 *1000 #from t/kcal to g/kcal
+
+    ###############################################################################
+    #Dataframes for Figure 3ghi
+    #stacked regions in urb/rur
+    df_food_urbrur_pop = df_food_regional[['income_group','Year','urban population','rural population']].drop_duplicates()
+    df_food_urbrur_pop = df_food_urbrur_pop.groupby('Year').sum(['urban population','rural population']).reset_index()
+    df_food_urbrur_pop = df_food_urbrur_pop.set_index('Year')
+    df_food_urbrur_pop = df_food_urbrur_pop.rename(columns={'urban population': 'urban','rural population': 'rural'})
+    df_food_urbrur_pop = df_food_urbrur_pop / 1000 /1000/1000  # to billion
+    df_food_urbrur_pop = df_food_urbrur_pop[['rural','urban']]
+
+    #stacked regions in FeH
+    #median
+    df_food_urbrur_FeH = df_food_regional[['income_group','Year','FeH_urban_median','FeH_rural_median']]
+    df_food_urbrur_FeH = df_food_urbrur_FeH.groupby('Year').sum(['FeH_urban_median','FeH_rural_median']).reset_index()
+    df_food_urbrur_FeH = df_food_urbrur_FeH.set_index('Year')
+    df_food_urbrur_FeH = df_food_urbrur_FeH.rename(columns={'FeH_urban_median': 'urban','FeH_rural_median': 'rural'})
+    df_food_urbrur_FeH = df_food_urbrur_FeH / 1000 /1000/1000 # to Gt
+    df_food_urbrur_FeH = df_food_urbrur_FeH[['rural','urban']]
+
+    #intensities urban/rural FeH/cap including uncertainty
+    df_food_urbrur_FeH_unc = df_food_regional[['income_group','Year','FeH_urban_median','FeH_rural_median','FeH_urban_niedrig','FeH_rural_niedrig',
+                                               'FeH_urban_hoch','FeH_rural_hoch']]
+    df_food_urbrur_FeH_unc = df_food_urbrur_FeH_unc.groupby('Year').sum(['FeH_urban_median','FeH_rural_median','FeH_urban_niedrig','FeH_rural_niedrig',
+                                               'FeH_urban_hoch','FeH_rural_hoch']).reset_index()
+    df_food_urbrur_FeH_unc = df_food_urbrur_FeH_unc.set_index('Year')
+    df_food_urbrur_FeH_unc = df_food_urbrur_FeH_unc / 1000 /1000/1000 # to Gt
+
+    df_food_urbrur_FeH_unc = df_food_urbrur_FeH_unc.rename(columns={'FeH_urban_median': 'urban','FeH_rural_median': 'rural',
+                                                                    'FeH_urban_hoch': 'urban-lower boundary','FeH_rural_hoch': 'rural-upper boundary',
+                                                                    'FeH_urban_niedrig': 'urban-upper boundary','FeH_rural_niedrig': 'rural-lower boundary'})
+
+    df_food_urbrur_FeH_unc['global'] = df_food_urbrur_FeH_unc['urban'] + df_food_urbrur_FeH_unc['rural']
+
+    df_food_urbrur_pop_glo = df_food_urbrur_pop.copy()
+    df_food_urbrur_pop_glo['global'] = df_food_urbrur_pop_glo.sum(axis=1)
+    df_food_urbrur_pop_glo['urban-lower boundary'] = df_food_urbrur_pop_glo['urban']
+    df_food_urbrur_pop_glo['rural-lower boundary'] = df_food_urbrur_pop_glo['rural']
+    df_food_urbrur_pop_glo['rural-upper boundary'] = df_food_urbrur_pop_glo['rural']
+    df_food_urbrur_pop_glo['urban-upper boundary'] = df_food_urbrur_pop_glo['urban']
+
+    df_food_urbrur_int = df_food_urbrur_FeH_unc/df_food_urbrur_pop_glo
+    return {'Fig3a': df_food_regions_pop, 'Fig3b': df_food_regions_FeH, 'Fig3c': df_food_regions_int,
+            'Fig3d': df_food_group_global_kcal, 'Fig3e': df_food_group_global_FeH, 'Fig3f': df_food_group_global_int,
+            'Fig3g': df_food_urbrur_pop, 'Fig3h': df_food_urbrur_FeH, 'Fig3i': df_food_urbrur_int}
+
+
+def figure4_data(df_food_regional, df_pop_reg):
+    """Data frames of Figure 4a-d for 1990 and 2019 (index income group)."""
+    #Dataframe for Figure 4a: Urban/Rural Food-eHANPP per capita
+    df_food_reg_urbrur_cap_FeH = df_food_regional.groupby(['income_group','Year']).sum().reset_index()
+    df_food_reg_urbrur_cap_FeH = df_food_reg_urbrur_cap_FeH[['income_group','Year','FeH_urban_median','FeH_rural_median']]
+
+    #1990
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH.loc[df_food_reg_urbrur_cap_FeH['Year'].isin([1990])]
+    #addpop
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH_1990.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_FeH_1990.loc[7]= df_food_reg_urbrur_cap_FeH_1990.sum()
+    df_food_reg_urbrur_cap_FeH_1990.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_FeH_1990['urban_FeH_cap'] = df_food_reg_urbrur_cap_FeH_1990['FeH_urban_median'] / df_food_reg_urbrur_cap_FeH_1990['urban population']
+    df_food_reg_urbrur_cap_FeH_1990['rural_FeH_cap'] = df_food_reg_urbrur_cap_FeH_1990['FeH_rural_median'] / df_food_reg_urbrur_cap_FeH_1990['rural population']
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH_1990.set_index('income_group')
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH_1990[['urban_FeH_cap','rural_FeH_cap']]
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH_1990.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_FeH_1990 = df_food_reg_urbrur_cap_FeH_1990.loc[INCOME_GROUP_ORDER]
+
+    #2019
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH.loc[df_food_reg_urbrur_cap_FeH['Year'].isin([2019])]
+    #addpop
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH_2019.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_FeH_2019.loc[7]= df_food_reg_urbrur_cap_FeH_2019.sum()
+    df_food_reg_urbrur_cap_FeH_2019.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_FeH_2019['urban_FeH_cap'] = df_food_reg_urbrur_cap_FeH_2019['FeH_urban_median'] / df_food_reg_urbrur_cap_FeH_2019['urban population']
+    df_food_reg_urbrur_cap_FeH_2019['rural_FeH_cap'] = df_food_reg_urbrur_cap_FeH_2019['FeH_rural_median'] / df_food_reg_urbrur_cap_FeH_2019['rural population']
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH_2019.set_index('income_group')
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH_2019[['urban_FeH_cap','rural_FeH_cap']]
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH_2019.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_FeH_2019 = df_food_reg_urbrur_cap_FeH_2019.loc[INCOME_GROUP_ORDER]
+
+    ###############################################################################
+    #Dataframe for Figure 4b: Urban/Rural Food-eHANPP intensity
+    df_food_reg_urbrur_FeHint_cap = df_food_regional.groupby(['income_group','Year']).sum().reset_index()
+    df_food_reg_urbrur_FeHint_cap = df_food_reg_urbrur_FeHint_cap[['income_group','Year','FeH_urban_median','FeH_rural_median','kcal_urban_median','kcal_rural_median']]
+
+    #1990
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap.loc[df_food_reg_urbrur_FeHint_cap['Year'].isin([1990])]
+    #add global
+    df_food_reg_urbrur_FeHint_cap_1990.loc[7]= df_food_reg_urbrur_FeHint_cap_1990.sum()
+    df_food_reg_urbrur_FeHint_cap_1990.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_FeHint_cap_1990['urban_FeHint_cap'] = df_food_reg_urbrur_FeHint_cap_1990['FeH_urban_median'] / df_food_reg_urbrur_FeHint_cap_1990['kcal_urban_median']
+    df_food_reg_urbrur_FeHint_cap_1990['rural_FeHint_cap'] = df_food_reg_urbrur_FeHint_cap_1990['FeH_rural_median'] / df_food_reg_urbrur_FeHint_cap_1990['kcal_rural_median']
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap_1990.set_index('income_group')
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap_1990[['urban_FeHint_cap','rural_FeHint_cap']]
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap_1990  * 1000 * 1000  #Umrechnung von t/kcal in g/kcal
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap_1990.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_FeHint_cap_1990 = df_food_reg_urbrur_FeHint_cap_1990.loc[INCOME_GROUP_ORDER]
+
+    #2019
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap.loc[df_food_reg_urbrur_FeHint_cap['Year'].isin([2019])]
+    #add global
+    df_food_reg_urbrur_FeHint_cap_2019.loc[7]= df_food_reg_urbrur_FeHint_cap_2019.sum()
+    df_food_reg_urbrur_FeHint_cap_2019.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_FeHint_cap_2019['urban_FeHint_cap'] = df_food_reg_urbrur_FeHint_cap_2019['FeH_urban_median'] / df_food_reg_urbrur_FeHint_cap_2019['kcal_urban_median']
+    df_food_reg_urbrur_FeHint_cap_2019['rural_FeHint_cap'] = df_food_reg_urbrur_FeHint_cap_2019['FeH_rural_median'] / df_food_reg_urbrur_FeHint_cap_2019['kcal_rural_median']
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap_2019.set_index('income_group')
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap_2019[['urban_FeHint_cap','rural_FeHint_cap']]
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap_2019  * 1000 * 1000  #Umrechnung von t/kcal in g/kcal
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap_2019.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_FeHint_cap_2019 = df_food_reg_urbrur_FeHint_cap_2019.loc[INCOME_GROUP_ORDER]
+
+    ###############################################################################
+    #Dataframe for Figure c: Urban/Rural livestock supply
+    df_food_reg_urbrur_cap_live = df_food_regional[['income_group','Year','food_group','kcal_urban_median','kcal_rural_median']]
+    df_food_reg_urbrur_cap_live = df_food_reg_urbrur_cap_live.loc[df_food_reg_urbrur_cap_live['food_group'].isin(LIVESTOCK_PRODUCTS)]
+    df_food_reg_urbrur_cap_live = df_food_reg_urbrur_cap_live.groupby(['income_group','Year']).sum().reset_index()
+
+    #1990
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live.loc[df_food_reg_urbrur_cap_live['Year'].isin([1990])]
+    #addpop
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live_1990.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_live_1990.loc[7]= df_food_reg_urbrur_cap_live_1990.sum()
+    df_food_reg_urbrur_cap_live_1990.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_live_1990['urban_live_cap'] = (df_food_reg_urbrur_cap_live_1990['kcal_urban_median'] / df_food_reg_urbrur_cap_live_1990['urban population']) /365
+    df_food_reg_urbrur_cap_live_1990['rural_live_cap'] = (df_food_reg_urbrur_cap_live_1990['kcal_rural_median'] / df_food_reg_urbrur_cap_live_1990['rural population']) /365
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live_1990.set_index('income_group')
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live_1990[['urban_live_cap','rural_live_cap']]
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live_1990.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_live_1990 = df_food_reg_urbrur_cap_live_1990.loc[INCOME_GROUP_ORDER]
+
+    #2019
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live.loc[df_food_reg_urbrur_cap_live['Year'].isin([2019])]
+    #addpop
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live_2019.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_live_2019.loc[7]= df_food_reg_urbrur_cap_live_2019.sum()
+    df_food_reg_urbrur_cap_live_2019.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_live_2019['urban_live_cap'] = (df_food_reg_urbrur_cap_live_2019['kcal_urban_median'] / df_food_reg_urbrur_cap_live_2019['urban population']) / 365
+    df_food_reg_urbrur_cap_live_2019['rural_live_cap'] = (df_food_reg_urbrur_cap_live_2019['kcal_rural_median'] / df_food_reg_urbrur_cap_live_2019['rural population'])/ 365
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live_2019.set_index('income_group')
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live_2019[['urban_live_cap','rural_live_cap']]
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live_2019.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_live_2019 = df_food_reg_urbrur_cap_live_2019.loc[INCOME_GROUP_ORDER]
+    ###############################################################################
+    #Dataframe for Figure 3d: Urban/rural plant-based supply
+
+    df_food_reg_urbrur_cap_plant = df_food_regional[['income_group','Year','food_group','kcal_urban_median','kcal_rural_median']]
+    df_food_reg_urbrur_cap_plant = df_food_reg_urbrur_cap_plant.loc[~df_food_reg_urbrur_cap_plant['food_group'].isin(LIVESTOCK_PRODUCTS)]
+    df_food_reg_urbrur_cap_plant = df_food_reg_urbrur_cap_plant.groupby(['income_group','Year']).sum().reset_index()
+
+    #1990
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant.loc[df_food_reg_urbrur_cap_plant['Year'].isin([1990])]
+    #addpop
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant_1990.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_plant_1990.loc[7]= df_food_reg_urbrur_cap_plant_1990.sum()
+    df_food_reg_urbrur_cap_plant_1990.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_plant_1990['urban_plant_cap'] = (df_food_reg_urbrur_cap_plant_1990['kcal_urban_median'] / df_food_reg_urbrur_cap_plant_1990['urban population']) /365
+    df_food_reg_urbrur_cap_plant_1990['rural_plant_cap'] = (df_food_reg_urbrur_cap_plant_1990['kcal_rural_median'] / df_food_reg_urbrur_cap_plant_1990['rural population']) /365
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant_1990.set_index('income_group')
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant_1990[['urban_plant_cap','rural_plant_cap']]
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant_1990.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_plant_1990 = df_food_reg_urbrur_cap_plant_1990.loc[INCOME_GROUP_ORDER]
+
+    #2019
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant.loc[df_food_reg_urbrur_cap_plant['Year'].isin([2019])]
+    #addpop
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant_2019.merge(df_pop_reg, how = 'left', on = ['income_group','Year'])
+    #add global
+    df_food_reg_urbrur_cap_plant_2019.loc[7]= df_food_reg_urbrur_cap_plant_2019.sum()
+    df_food_reg_urbrur_cap_plant_2019.at[7, 'income_group'] = 'Global'
+    df_food_reg_urbrur_cap_plant_2019['urban_plant_cap'] = (df_food_reg_urbrur_cap_plant_2019['kcal_urban_median'] / df_food_reg_urbrur_cap_plant_2019['urban population']) / 365
+    df_food_reg_urbrur_cap_plant_2019['rural_plant_cap'] = (df_food_reg_urbrur_cap_plant_2019['kcal_rural_median'] / df_food_reg_urbrur_cap_plant_2019['rural population'])/ 365
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant_2019.set_index('income_group')
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant_2019[['urban_plant_cap','rural_plant_cap']]
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant_2019.rename(index=INCOME_GROUP_MAPPING)
+    df_food_reg_urbrur_cap_plant_2019 = df_food_reg_urbrur_cap_plant_2019.loc[INCOME_GROUP_ORDER]
+    return {'Fig4a_1990': df_food_reg_urbrur_cap_FeH_1990, 'Fig4a_2019': df_food_reg_urbrur_cap_FeH_2019,
+            'Fig4b_1990': df_food_reg_urbrur_FeHint_cap_1990, 'Fig4b_2019': df_food_reg_urbrur_FeHint_cap_2019,
+            'Fig4c_1990': df_food_reg_urbrur_cap_live_1990, 'Fig4c_2019': df_food_reg_urbrur_cap_live_2019,
+            'Fig4d_1990': df_food_reg_urbrur_cap_plant_1990, 'Fig4d_2019': df_food_reg_urbrur_cap_plant_2019}
+
+
+def si_figure_data(df_food_regional, df_pop_reg):
+    """Data frames of the SI Figures S5a-d (index Year, income group)."""
+    #Dataframe for SI Figure 5a: Urban/Rural Food-eHANPP per capita
+
+    # Base dataframe
+    df_food_reg_urbrur_cap_FeH_SI = df_food_regional.groupby(['income_group','Year']).sum().reset_index()
+    df_food_reg_urbrur_cap_FeH_SI = df_food_reg_urbrur_cap_FeH_SI[['income_group','Year','FeH_urban_median','FeH_rural_median']]
+
+    # Merge with population
+    df_food_reg_urbrur_cap_FeH_SI = df_food_reg_urbrur_cap_FeH_SI.merge(df_pop_reg, how='left', on=['income_group','Year'])
+
+    # Add global row per year
+    df_global_SI = df_food_reg_urbrur_cap_FeH_SI.groupby('Year').sum().reset_index()
+    df_global_SI['income_group'] = 'Global'
+
+    # Combine with regional data
+    df_food_reg_urbrur_cap_FeH_all_SI = pd.concat([df_food_reg_urbrur_cap_FeH_SI, df_global_SI], ignore_index=True)
+
+    # Compute per capita values
+    df_food_reg_urbrur_cap_FeH_all_SI['urban_FeH_cap'] = (df_food_reg_urbrur_cap_FeH_all_SI['FeH_urban_median'] / df_food_reg_urbrur_cap_FeH_all_SI['urban population'])
+    df_food_reg_urbrur_cap_FeH_all_SI['rural_FeH_cap'] = (df_food_reg_urbrur_cap_FeH_all_SI['FeH_rural_median'] / df_food_reg_urbrur_cap_FeH_all_SI['rural population'])
+
+    # Apply mapping and order
+    df_food_reg_urbrur_cap_FeH_all_SI['income_group'] = df_food_reg_urbrur_cap_FeH_all_SI['income_group'].replace(INCOME_GROUP_MAPPING)
+
+    df_food_reg_urbrur_cap_FeH_all_SI = df_food_reg_urbrur_cap_FeH_all_SI.set_index(['Year','income_group'])
+    df_food_reg_urbrur_cap_FeH_all_SI = df_food_reg_urbrur_cap_FeH_all_SI[['urban_FeH_cap','rural_FeH_cap']]
+
+    # Optional: sort income groups
+    df_food_reg_urbrur_cap_FeH_all_SI = (df_food_reg_urbrur_cap_FeH_all_SI.reindex(INCOME_GROUP_ORDER, level=1).sort_index())
+
+    #Dataframe for Figure S5b: Urban/Rural Food-eHANPP intensity
+    # Base dataframe
+    df_food_reg_urbrur_FeHint_cap_SI = df_food_regional.groupby(['income_group','Year']).sum().reset_index()
+    df_food_reg_urbrur_FeHint_cap_SI = df_food_reg_urbrur_FeHint_cap_SI[[
+        'income_group','Year','FeH_urban_median','FeH_rural_median',
+        'kcal_urban_median','kcal_rural_median']]
+
+    # Add global row per year
+    df_global_SI = df_food_reg_urbrur_FeHint_cap_SI.groupby('Year').sum().reset_index()
+    df_global_SI['income_group'] = 'Global'
+    # Combine with regional data
+    df_food_reg_urbrur_FeHint_cap_all_SI = pd.concat([df_food_reg_urbrur_FeHint_cap_SI, df_global_SI], ignore_index=True)
+
+    # Compute per kcal values
+    df_food_reg_urbrur_FeHint_cap_all_SI['urban_FeHint_cap'] = (df_food_reg_urbrur_FeHint_cap_all_SI['FeH_urban_median'] / df_food_reg_urbrur_FeHint_cap_all_SI['kcal_urban_median'])
+    df_food_reg_urbrur_FeHint_cap_all_SI['rural_FeHint_cap'] = (df_food_reg_urbrur_FeHint_cap_all_SI['FeH_rural_median'] / df_food_reg_urbrur_FeHint_cap_all_SI['kcal_rural_median'])
+
+    # Convert from t/kcal to g/kcal
+    df_food_reg_urbrur_FeHint_cap_all_SI['urban_FeHint_cap'] *= 1000 * 1000
+    df_food_reg_urbrur_FeHint_cap_all_SI['rural_FeHint_cap'] *= 1000 * 1000
+
+    # Apply mapping
+    df_food_reg_urbrur_FeHint_cap_all_SI['income_group'] = df_food_reg_urbrur_FeHint_cap_all_SI['income_group'].replace(INCOME_GROUP_MAPPING)
+
+    # Set index for clean structure
+    df_food_reg_urbrur_FeHint_cap_all_SI = df_food_reg_urbrur_FeHint_cap_all_SI.set_index(['Year','income_group'])
+    df_food_reg_urbrur_FeHint_cap_all_SI = df_food_reg_urbrur_FeHint_cap_all_SI[['urban_FeHint_cap','rural_FeHint_cap']]
+
+    # Sort income groups for consistency
+    df_food_reg_urbrur_FeHint_cap_all_SI = (df_food_reg_urbrur_FeHint_cap_all_SI.reindex(INCOME_GROUP_ORDER, level=1).sort_index())
+
+    #Dataframe for Figure S5c: Urban/Rural livestock supply
+    # Filter for livestock products
+    df_food_reg_urbrur_cap_live_SI = df_food_regional[['income_group','Year','food_group','kcal_urban_median','kcal_rural_median']]
+    df_food_reg_urbrur_cap_live_SI = df_food_reg_urbrur_cap_live_SI.loc[df_food_reg_urbrur_cap_live_SI['food_group'].isin(LIVESTOCK_PRODUCTS)]
+
+    # Aggregate across livestock products
+    df_food_reg_urbrur_cap_live_SI = df_food_reg_urbrur_cap_live_SI.groupby(['income_group','Year']).sum().reset_index()
+    # Merge with population
+    df_food_reg_urbrur_cap_live_SI = df_food_reg_urbrur_cap_live_SI.merge(df_pop_reg, how='left', on=['income_group','Year'])
+    # Add global row per year
+    df_global_SI = df_food_reg_urbrur_cap_live_SI.groupby('Year').sum().reset_index()
+    df_global_SI['income_group'] = 'Global'
+    # Combine
+    df_food_reg_urbrur_cap_live_all_SI = pd.concat([df_food_reg_urbrur_cap_live_SI, df_global_SI], ignore_index=True)
+    # Compute per capita kcal/day
+    df_food_reg_urbrur_cap_live_all_SI['urban_live_cap'] = (df_food_reg_urbrur_cap_live_all_SI['kcal_urban_median'] / df_food_reg_urbrur_cap_live_all_SI['urban population']) / 365
+    df_food_reg_urbrur_cap_live_all_SI['rural_live_cap'] = (df_food_reg_urbrur_cap_live_all_SI['kcal_rural_median'] / df_food_reg_urbrur_cap_live_all_SI['rural population']) / 365
+    # Apply mapping
+    df_food_reg_urbrur_cap_live_all_SI['income_group'] = df_food_reg_urbrur_cap_live_all_SI['income_group'].replace(INCOME_GROUP_MAPPING)
+    # Set tidy index
+    df_food_reg_urbrur_cap_live_all_SI = df_food_reg_urbrur_cap_live_all_SI.set_index(['Year','income_group'])
+    df_food_reg_urbrur_cap_live_all_SI = df_food_reg_urbrur_cap_live_all_SI[['urban_live_cap','rural_live_cap']]
+    # Sort income groups
+
+    #Dataframe for Figure S5d: Urban/rural plant-based supply
+    df_food_reg_urbrur_cap_plant_SI = df_food_regional[['income_group','Year','food_group','kcal_urban_median','kcal_rural_median']]
+    df_food_reg_urbrur_cap_plant_SI = df_food_reg_urbrur_cap_plant_SI.loc[~df_food_reg_urbrur_cap_plant_SI['food_group'].isin(LIVESTOCK_PRODUCTS)]
+    # Aggregate across plant products
+    df_food_reg_urbrur_cap_plant_SI = df_food_reg_urbrur_cap_plant_SI.groupby(['income_group','Year']).sum().reset_index()
+    # Merge with population
+    df_food_reg_urbrur_cap_plant_SI = df_food_reg_urbrur_cap_plant_SI.merge(df_pop_reg, how='left', on=['income_group','Year'])
+    # Add global row per year
+    df_global_SI = df_food_reg_urbrur_cap_plant_SI.groupby('Year').sum().reset_index()
+    df_global_SI['income_group'] = 'Global'
+    # Combine
+    df_food_reg_urbrur_cap_plant_all_SI = pd.concat([df_food_reg_urbrur_cap_plant_SI, df_global_SI], ignore_index=True)
+    # Compute per capita kcal/day
+    df_food_reg_urbrur_cap_plant_all_SI['urban_plant_cap'] = (df_food_reg_urbrur_cap_plant_all_SI['kcal_urban_median'] / df_food_reg_urbrur_cap_plant_all_SI['urban population']) / 365
+    df_food_reg_urbrur_cap_plant_all_SI['rural_plant_cap'] = (df_food_reg_urbrur_cap_plant_all_SI['kcal_rural_median'] / df_food_reg_urbrur_cap_plant_all_SI['rural population']) / 365
+    # Apply mapping
+    df_food_reg_urbrur_cap_plant_all_SI['income_group'] = df_food_reg_urbrur_cap_plant_all_SI['income_group'].replace(INCOME_GROUP_MAPPING)
+    # Set tidy index
+    df_food_reg_urbrur_cap_plant_all_SI = df_food_reg_urbrur_cap_plant_all_SI.set_index(['Year','income_group'])
+    df_food_reg_urbrur_cap_plant_all_SI = df_food_reg_urbrur_cap_plant_all_SI[['urban_plant_cap','rural_plant_cap']]
+    # Sort income groups
+    return {'FigS5a': df_food_reg_urbrur_cap_FeH_all_SI, 'FigS5b': df_food_reg_urbrur_FeHint_cap_all_SI,
+            'FigS5c': df_food_reg_urbrur_cap_live_all_SI, 'FigS5d': df_food_reg_urbrur_cap_plant_all_SI}
+
+
+def figure_data(df_food_regional, df_pop_reg):
+    """Data of all figures, name -> data frame."""
+    data = figure3_data(df_food_regional)
+    data.update(figure4_data(df_food_regional, df_pop_reg))
+    data.update(si_figure_data(df_food_regional, df_pop_reg))
+    return data
+
+
+def read_figure_data(directory):
+    """Figure data exported by food_ehanpp.export (figure_data_<name>.parquet) with the original index."""
+    data = {}
+    for file in sorted(glob.glob(os.path.join(directory, 'figure_data_*.parquet'))):
+        name = os.path.basename(file)[len('figure_data_'):-len('.parquet')]
+        df = pd.read_parquet(file)
+        index = FIGURE_INDEX[name.split('_')[0].rstrip('abcdefghi')]
+        data[name] = df.set_index(index[0] if len(index) == 1 else index)
+    return data
+
+
+###############################################################################
+#                               PLOTS                                         #
+###############################################################################
+
+def plot_figure3(figure_data, path):
+    """Figure 3 (3x3 panels) as figure3.png in path."""
+    plt = _pyplot()
+    #PLOT: Figure 3
+    dataframes_fig3 = [figure_data[name] for name in ['Fig3a', 'Fig3b', 'Fig3c', 'Fig3d', 'Fig3e', 'Fig3f', 'Fig3g', 'Fig3h', 'Fig3i']]
+
+    colors_fig3 = [COLORS_REGIONS,COLORS_REGIONS,COLORS_REGIONSANDGLO,
+                   COLORS_FOOD_GROUPS,COLORS_FOOD_GROUPS,COLORS_FOOD_GROUPSANDALL,
+                   COLORS_FEH_URB_RUR,COLORS_FEH_URB_RUR,COLORS_FEH_URB_RUR_GLO]
+
+    fig, axes = plt.subplots(3, 3, figsize=(15, 15)) # Define each subplot individually
+    # Subplot 1
+    df1 = dataframes_fig3[0]
+    colors1 = colors_fig3[0]
+    ax1 = axes[0,0]
+    df1.plot(kind='area', ax=ax1, xlim=(1990, 2020), ylim=(0, 8), xlabel='',
+             grid=True, color=colors1, linewidth=0, legend=False)
+    ax1.set_title('a) Population by region', fontsize=15)
+    ax1.set_ylabel('billion', fontsize=15)
+    ax1.set_xlabel('', fontsize=15)
+    ax1.tick_params(axis='x', labelsize=15)
+    ax1.tick_params(axis='y', labelsize=15)
+    ax1.set_xticks([1990, 2000, 2010, 2020])
+    ax1.set_yticks([0, 2, 4, 6, 8])
+    ax1.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups1 = df1.columns
+    cumulative1 = df1.cumsum(axis=1)
+    for group in groups1:
+        x_pos = 2020
+        if x_pos in df1.index:
+            y_pos = (cumulative1[group] - df1[group] / 2).loc[x_pos]
+            ax1.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+    # Subplot 2
+    df2 = dataframes_fig3[1]
+    colors2 = colors_fig3[1]
+    ax2 = axes[0,1]
+    df2.plot(kind='area', ax=ax2, xlim=(1990, 2020), ylim=(0, 18), xlabel='',
+             grid=True, color=colors1, linewidth=0, legend=False)
+    ax2.set_title('b) Food-eHANPP by region', fontsize=15)
+    ax2.set_ylabel('Gt dm/yr', fontsize=15)
+    ax2.set_xlabel('', fontsize=15)
+    ax2.tick_params(axis='x', labelsize=15)
+    ax2.tick_params(axis='y', labelsize=15)
+    ax2.set_xticks([1990, 2000, 2010, 2020])
+    ax2.set_yticks([0, 3, 6, 9, 12, 15, 18])
+    ax2.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups2 = df2.columns
+    cumulative2 = df2.cumsum(axis=1)
+    for group in groups2:
+        x_pos = 2020
+        if x_pos in df2.index:
+            y_pos = (cumulative2[group] - df2[group] / 2).loc[x_pos]
+            ax2.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+    # Subplot 3
+    df3 = dataframes_fig3[2]
+    colors3 = colors_fig3[2]
+    ax3 = axes[0,2]
+    df3.plot(kind='line', ax=ax3, xlim=(1990, 2020), ylim=(0, 6), xlabel='',
+             grid=True, color=colors3, linewidth=4, legend=True)
+    ax3.set_title('c) Food-eHANPP per capita', fontsize=15)
+    ax3.legend(title='', loc = 'upper right', fontsize = 13)
+    ax3.set_ylabel('t dm/cap/yr', fontsize=15)
+    ax3.set_xlabel('', fontsize=15)
+    ax3.tick_params(axis='x', labelsize=15)
+    ax3.tick_params(axis='y', labelsize=15)
+    ax3.set_xticks([1990, 2000, 2010, 2020])
+    ax3.set_yticks([0,1,2,3,4,5,6])
+    ax3.grid(color='black', linewidth=0.3, alpha=0.2)
+
+    # Subplot 4
+    df4 = dataframes_fig3[3]
+    colors4 = colors_fig3[3]
+    ax4 = axes[1,0]
+    df4.plot(kind='area', ax=ax4, xlim=(1990, 2020), ylim=(0, 8), xlabel='',
+             grid=True, color=colors4, linewidth=0, legend=False)
+    ax4.set_title('d) Food supply', fontsize=15)
+    ax4.set_ylabel('Ecal/yr', fontsize=15)
+    ax4.set_xlabel('', fontsize=15)
+    ax4.tick_params(axis='x', labelsize=15)
+    ax4.tick_params(axis='y', labelsize=15)
+    ax4.set_xticks([1990, 2000, 2010, 2020])
+    ax4.set_yticks([0, 2, 4, 6, 8, 10])
+    ax4.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups4 = df4.columns
+    cumulative4 = df4.cumsum(axis=1)
+    for group in groups4:
+        x_pos = 2020
+        if x_pos in df4.index:
+            y_pos = (cumulative4[group] - df4[group] / 2).loc[x_pos]
+            ax4.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+    # Subplot 5
+    df5 = dataframes_fig3[4]
+    colors5 = colors_fig3[4]
+    ax5 = axes[1,1]
+    df5.plot(kind='area', ax=ax5, xlim=(1990, 2020), ylim=(0, 18), xlabel='',
+             grid=True, color=colors5, linewidth=0, legend=False)
+    ax5.set_title('e) Food-eHANPP by food group', fontsize=15)
+    ax5.set_ylabel('Gt dm/yr', fontsize=15)
+    ax5.set_xlabel('', fontsize=15)
+    ax5.tick_params(axis='x', labelsize=15)
+    ax5.tick_params(axis='y', labelsize=15)
+    ax5.set_xticks([1990, 2000, 2010, 2020])
+    ax5.set_yticks([0, 3, 6, 9, 12, 15, 18])
+    ax5.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups5 = df5.columns
+    cumulative5 = df5.cumsum(axis=1)
+    for group in groups5:
+        x_pos = 2020
+        if x_pos in df5.index:
+            y_pos = (cumulative5[group] - df5[group] / 2).loc[x_pos]
+            ax5.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+
+    # Subplot 6
+    df6 = dataframes_fig3[5]
+    colors6 = colors_fig3[5]
+    ax6 = axes[1,2]
+    df6.plot(kind='line', ax=ax6, xlim=(1990, 2020), ylim=(0, 8), xlabel='',
+             grid=True, color=colors6, linewidth=4, legend=True)
+    ax6.set_title('f) Food-eHANPP-intensity', fontsize=15)
+    ax6.legend(title='', loc = 'upper right', fontsize = 11)
+    ax6.set_ylabel('g dm/kcal', fontsize=15)
+    ax6.set_xlabel('', fontsize=15)
+    ax6.tick_params(axis='x', labelsize=15)
+    ax6.tick_params(axis='y', labelsize=15)
+    ax6.set_xticks([1990, 2000, 2010, 2020])
+    ax6.set_yticks([0, 2, 4, 6, 8, 10, 12])
+    ax6.grid(color='black', linewidth=0.3, alpha=0.2)
+
+    # Subplot 7
+    df7 = dataframes_fig3[6]
+    colors7 = colors_fig3[6]
+    ax7 = axes[2,0]
+    df7.plot(kind='area', ax=ax7, xlim=(1990, 2020), ylim=(0, 8), xlabel='',
+             grid=True, color=colors7, linewidth=0, legend=False)
+    ax7.set_title('g) Urban and rural population', fontsize=15)
+    ax7.set_ylabel('billion', fontsize=15)
+    ax7.set_xlabel('', fontsize=15)
+    ax7.tick_params(axis='x', labelsize=15)
+    ax7.tick_params(axis='y', labelsize=15)
+    ax7.set_xticks([1990, 2000, 2010, 2020])
+    ax7.set_yticks([0, 2, 4, 6, 8])
+    ax7.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups7 = df7.columns
+    cumulative7 = df7.cumsum(axis=1)
+    for group in groups7:
+        x_pos = 2020
+        if x_pos in df7.index:
+            y_pos = (cumulative7[group] - df7[group] / 2).loc[x_pos]
+            ax7.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+
+    # Subplot 8
+    df8 = dataframes_fig3[7]
+    colors8 = colors_fig3[7]
+    ax8 = axes[2,1]
+    df8.plot(kind='area', ax=ax8, xlim=(1990, 2020), ylim=(0, 18), xlabel='',
+             grid=True, color=colors8, linewidth=0, legend=False)
+    ax8.set_title('h) Urban and rural Food-eHANPP', fontsize=15)
+    ax8.set_ylabel('Gt dm/yr', fontsize=15)
+    ax8.set_xlabel('', fontsize=12)
+    ax8.tick_params(axis='x', labelsize=15)
+    ax8.tick_params(axis='y', labelsize=15)
+    ax8.set_xticks([1990, 2000, 2010, 2020])
+    ax8.set_yticks([0, 3, 6, 9, 12, 15, 18])
+    ax8.grid(color='black', linewidth=0.3, alpha=0.2)
+    groups8 = df8.columns
+    cumulative8 = df8.cumsum(axis=1)
+    for group in groups8:
+        x_pos = 2020
+        if x_pos in df8.index:
+            y_pos = (cumulative8[group] - df8[group] / 2).loc[x_pos]
+            ax8.text(x_pos, y_pos, group, fontsize=15, ha='right', va='center')
+
+    # Subplot 9
+    df9 = dataframes_fig3[8]
+    colors9 = colors_fig3[8]
+    ax9 = axes[2,2]
+    df9.plot(kind='line', ax=ax9, xlim=(1990, 2020), ylim=(0, 4), xlabel='',
+             grid=True, color=colors9, linewidth=1, legend=True)
+    ax9.set_title('i) Urban and rural Food-eHANPP per capita', fontsize=15)
+    ax9.legend(title='', loc = 'lower left', fontsize = 12)
+    ax9.set_ylabel('t dm/cap/yr', fontsize=15)
+    ax9.set_xlabel('', fontsize=15)
+    ax9.tick_params(axis='x', labelsize=15)
+    ax9.tick_params(axis='y', labelsize=15)
+    ax9.set_xticks([1990, 2000, 2010, 2020])
+    ax9.set_yticks([0,1,2,3,4])
+    ax9.grid(color='black', linewidth=0.3, alpha=0.2)
+    # Set individual line widths
+    lines = ax9.get_lines()
+    line_widths = [4, 4, 1, 1, 4, 1, 1]
+    for line, lw in zip(lines, line_widths):
+        line.set_linewidth(lw)
+    # define lines for shading
+    x = df9.index
+    y1 = df9['rural-lower boundary']  # First line
+    y2 = df9['rural-upper boundary']  # Second line
+    y3 = df9['urban-lower boundary']  # First line
+    y4 = df9['urban-upper boundary']  # Second line
+    # Fill the area between the two lines
+    ax9.fill_between(x, y1, y2, color='#00B050', alpha=0.3)
+    ax9.fill_between(x, y3, y4, color='#C9C9C9', alpha=0.3)
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figure3.png', dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_figure4(figure_data, path):
+    """Figure 4 (2x2 panels, 1990 and 2019) as figure4.png in path."""
+    plt = _pyplot()
+    #PLOT: Figure 4abcd
+    dataframes_fig4 = [figure_data[f'Fig4{panel}_{year}'] for panel in 'abcd' for year in [1990, 2019]]
+    df_food_reg_urbrur_cap_FeH_1990 = dataframes_fig4[0]
+    fig, axes = plt.subplots(2, 2, figsize=(10, 10)) # Define each subplot individually
+    #Subplot 1
+    df1 = dataframes_fig4[0]
+    df2 = dataframes_fig4[1]
+    ax1 = axes[0,0]
+    df1.plot.scatter(
+        x='urban_FeH_cap', y='rural_FeH_cap', xlim=(0,5),
+        xticks=[0,1,2,3,4,5], ylim=(0,5), yticks=[0,1,2,3,4,5],
+        xlabel='Urban Food-eHANPP in t dm/cap/yr\n', ylabel='Rural Food-eHANPP in t dm/cap/yr',
+        legend=True, c=COLORS_FIG4, s=80, ax=ax1)
+    ax1.scatter( # Plot the second set of points on the same axes
+        df2['urban_FeH_cap'], df2['rural_FeH_cap'],
+        c=COLORS_FIG4, s=80)
+    for i in range(len(df2)): # Add black arrows connecting the points from 1990 to 2019 for each region
+        ax1.annotate(
+            '', xy=(df2['urban_FeH_cap'].iloc[i], df2['rural_FeH_cap'].iloc[i]),
+            xytext=(df1['urban_FeH_cap'].iloc[i], df1['rural_FeH_cap'].iloc[i]),
+            arrowprops=dict(
+                arrowstyle="->,head_length=0.4,head_width=0.2",
+                color='black',
+                linewidth=1.5,
+                shrinkA=0, shrinkB=0))
+    ax1.set_xlabel('Urban Food-eHANPP in t dm/cap/yr', fontsize=12)
+    ax1.set_ylabel('Rural Food-eHANPP in t dm/cap/yr', fontsize=12)
+    ax1.tick_params(axis='x', labelsize=12)
+    ax1.tick_params(axis='y', labelsize=12)
+    ax1.grid(color='gray', linewidth=0.5, alpha=0.2)
+    ax1.set_title('a) Urban and rural per capita Food-eHANPP')
+    ax1.plot([0, 5], [0, 5], linestyle='--', color='black')
+    legend_labels = df_food_reg_urbrur_cap_FeH_1990.index.unique()
+    legend_handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=color, markersize=10, label=label)
+                      for color, label in zip(COLORS_FIG4, legend_labels)]
+    ax1.legend(handles=legend_handles, fontsize=9.5, loc='upper left', frameon=False, bbox_to_anchor=(-0.03, 1), handletextpad=0.1)
+    textstr = 'arrow from 1990 to 2019' # Add a textbox in the bottom right corner
+    props = dict(boxstyle='round', facecolor='white', edgecolor='black', alpha=0.8)
+    ax1.text(0.95, 0.05, textstr, transform=ax1.transAxes, fontsize=8,
+             verticalalignment='bottom', horizontalalignment='right', bbox=props)
+    xlim1 = ax1.get_xlim()
+    ylim1 = ax1.get_ylim()
+    aspect_ratio1 = (xlim1[1] - xlim1[0]) / (ylim1[1] - ylim1[0])
+    ax1.set_aspect(aspect_ratio1)
+
+    # Subplot 2
+    df3 = dataframes_fig4[2]
+    df4 = dataframes_fig4[3]
+    ax2 = axes[0,1]
+    df3.plot.scatter(
+        x='urban_FeHint_cap', y='rural_FeHint_cap', xlim=(0,6),
+        xticks=[0,1,2,3,4,5,6], ylim=(0,6), yticks=[0,1,2,3,4,5,6],
+        xlabel='Urban Food-eHANPP intensity in g dm/kcal/yr', ylabel='Rural Food-eHANPP intensity in g dm/kcal/yr',
+        legend=True, c=COLORS_FIG4, s=80, ax=ax2)
+    ax2.scatter( # Plot the second set of points on the same axes
+        df4['urban_FeHint_cap'], df4['rural_FeHint_cap'],
+        c=COLORS_FIG4, s=80)
+    for i in range(len(df4)): # Add black arrows connecting the points from 1990 to 2019 for each region
+        ax2.annotate(
+            '', xy=(df4['urban_FeHint_cap'].iloc[i], df4['rural_FeHint_cap'].iloc[i]),
+            xytext=(df3['urban_FeHint_cap'].iloc[i], df3['rural_FeHint_cap'].iloc[i]),
+            arrowprops=dict(
+                arrowstyle="->,head_length=0.4,head_width=0.2",
+                color='black',
+                linewidth=1.5,
+                shrinkA=0, shrinkB=0))
+    ax2.set_xlabel('Urban Food-eHANPP intensity in g dm/kcal/yr', fontsize=12)
+    ax2.set_ylabel('Rural Food-eHANPP intensity in g dm/kcal/yr', fontsize=12)
+    ax2.tick_params(axis='x', labelsize=12)
+    ax2.tick_params(axis='y', labelsize=12)
+    ax2.grid(color='gray', linewidth=0.5, alpha=0.2)
+    ax2.set_title('b) Urban and rural Food-eHANPP intensity')
+    ax2.plot([0, 6], [0, 6], linestyle='--', color='black')
+    legend_labels = df_food_reg_urbrur_cap_FeH_1990.index.unique()
+    legend_handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=color, markersize=10, label=label)
+                      for color, label in zip(COLORS_FIG4, legend_labels)]
+    ax2.legend(handles=legend_handles, fontsize=9.5, loc='upper left', frameon=False, bbox_to_anchor=(-0.03, 1), handletextpad=0.1)
+    textstr = 'arrow from 1990 to 2019' # Add a textbox in the bottom right corner
+    props = dict(boxstyle='round', facecolor='white', edgecolor='black', alpha=0.8)
+    ax2.text(0.95, 0.05, textstr, transform=ax2.transAxes, fontsize=8,
+             verticalalignment='bottom', horizontalalignment='right', bbox=props)
+    xlim2 = ax2.get_xlim()
+    ylim2 = ax2.get_ylim()
+    aspect_ratio2 = (xlim2[1] - xlim2[0]) / (ylim2[1] - ylim2[0])
+    ax2.set_aspect(aspect_ratio2)
+
+    #Subplot 3
+    df5 = dataframes_fig4[4]
+    df6 = dataframes_fig4[5]
+    ax3 = axes[1,0]
+    df5.plot.scatter(
+        x='urban_live_cap', y='rural_live_cap', xlim=(0,1250),
+        xticks=[0,250,500,750,1000,1250], ylim=(0,1250), yticks=[0,250,500,750,1000,1250],
+        xlabel='Urban livestock products supply in kcal/cap/day', ylabel='Rural livestock products supply in kcal/cap/day',
+        legend=True, c=COLORS_FIG4, s=80, ax=ax3)
+    ax3.scatter( # Plot the second set of points on the same axes
+        df6['urban_live_cap'], df6['rural_live_cap'],
+        c=COLORS_FIG4, s=80)
+    for i in range(len(df6)): # Add black arrows connecting the points from 1990 to 2019 for each region
+        ax3.annotate(
+            '', xy=(df6['urban_live_cap'].iloc[i], df6['rural_live_cap'].iloc[i]),
+            xytext=(df5['urban_live_cap'].iloc[i], df5['rural_live_cap'].iloc[i]),
+            arrowprops=dict(
+                arrowstyle="->,head_length=0.4,head_width=0.2",
+                color='black',
+                linewidth=1.5,
+                shrinkA=0, shrinkB=0))
+    ax3.set_xlabel('Urban livestock products supply in kcal/cap/day', fontsize=12)
+    ax3.set_ylabel('Rural livestock products supply in kcal/cap/day', fontsize=12)
+    ax3.tick_params(axis='x', labelsize=12)
+    ax3.tick_params(axis='y', labelsize=12)
+    ax3.grid(color='gray', linewidth=0.5, alpha=0.2)
+    ax3.set_title('c) Urban and rural per capita supply\nlivestock products')
+    ax3.plot([0, 2000], [0, 2000], linestyle='--', color='black')
+    legend_labels = df_food_reg_urbrur_cap_FeH_1990.index.unique()
+    legend_handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=color, markersize=10, label=label)
+                      for color, label in zip(COLORS_FIG4, legend_labels)]
+    ax3.legend(handles=legend_handles, fontsize=9.5, loc='upper left', frameon=False, bbox_to_anchor=(-0.03, 1), handletextpad=0.1)
+    textstr = 'arrow from 1990 to 2019' # Add a textbox in the bottom right corner
+    props = dict(boxstyle='round', facecolor='white', edgecolor='black', alpha=0.8)
+    ax3.text(0.95, 0.05, textstr, transform=ax3.transAxes, fontsize=8,
+             verticalalignment='bottom', horizontalalignment='right', bbox=props)
+    xlim3 = ax3.get_xlim()
+    ylim3 = ax3.get_ylim()
+    aspect_ratio3 = (xlim3[1] - xlim3[0]) / (ylim3[1] - ylim3[0])
+    ax3.set_aspect(aspect_ratio3)
+
+    #Subplot 4
+    df7 = dataframes_fig4[6]
+    df8 = dataframes_fig4[7]
+    ax4 = axes[1,1]
+    df7.plot.scatter(
+        x='urban_plant_cap', y='rural_plant_cap', xlim=(1000,3500),
+        xticks=[1000,1500,2000,2500,3000,3500], ylim=(1000,3500), yticks=[1000,1500,2000,2500,3000,3500],
+        xlabel='Urban plant supply in kcal/cap/yr', ylabel='Rural plant supply in kcal/cap/yr',
+        legend=True, c=COLORS_FIG4, s=80, ax=ax4)
+    ax4.scatter( # Plot the second set of points on the same axes
+        df8['urban_plant_cap'], df8['rural_plant_cap'],
+        c=COLORS_FIG4, s=80)
+    for i in range(len(df8)): # Add black arrows connecting the points from 1990 to 2019 for each region
+        ax4.annotate(
+            '', xy=(df8['urban_plant_cap'].iloc[i], df8['rural_plant_cap'].iloc[i]),
+            xytext=(df7['urban_plant_cap'].iloc[i], df7['rural_plant_cap'].iloc[i]),
+            arrowprops=dict(
+                arrowstyle="->,head_length=0.4,head_width=0.2",
+                color='black',
+                linewidth=1.5,
+                shrinkA=0, shrinkB=0))
+    ax4.set_xlabel('Urban plant supply in kcal/cap/yr', fontsize=12)
+    ax4.set_ylabel('Rural plant supply in kcal/cap/yr', fontsize=12)
+    ax4.tick_params(axis='x', labelsize=12)
+    ax4.tick_params(axis='y', labelsize=12)
+    ax4.grid(color='gray', linewidth=0.5, alpha=0.2)
+    ax4.set_title('d) Urban and rural per capita supply\nplant products')
+    ax4.plot([0, 3500], [0, 3500], linestyle='--', color='black')
+    legend_labels = df_food_reg_urbrur_cap_FeH_1990.index.unique()
+    legend_handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=color, markersize=10, label=label)
+                      for color, label in zip(COLORS_FIG4, legend_labels)]
+    ax4.legend(handles=legend_handles, fontsize=9.5, loc='upper left', frameon=False, bbox_to_anchor=(-0.03, 1), handletextpad=0.1)
+    textstr = 'arrow from 1990 to 2019' # Add a textbox in the bottom right corner
+    props = dict(boxstyle='round', facecolor='white', edgecolor='black', alpha=0.8)
+    ax4.text(0.95, 0.05, textstr, transform=ax4.transAxes, fontsize=8,
+             verticalalignment='bottom', horizontalalignment='right', bbox=props)
+    xlim4 = ax4.get_xlim()
+    ylim4 = ax4.get_ylim()
+    aspect_ratio4 = (xlim4[1] - xlim4[0]) / (ylim4[1] - ylim4[0])
+    ax4.set_aspect(aspect_ratio4)
+
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figure4.png', dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_si_figures(figure_data, path):
+    """SI Figures S5a-d as figureS5a.png ... figureS5d.png in path."""
+    plt = _pyplot()
+    df_food_reg_urbrur_cap_FeH_all_SI = figure_data['FigS5a']
+    df_food_reg_urbrur_FeHint_cap_all_SI = figure_data['FigS5b']
+    df_food_reg_urbrur_cap_live_all_SI = figure_data['FigS5c']
+    df_food_reg_urbrur_cap_plant_all_SI = figure_data['FigS5d']
+
+    # Custom color mapping for income groups
+    color_map = dict(zip(INCOME_GROUPS_SI, COLORS_FIG4))
+    plt.figure(figsize=(12, 7))
+    for group in INCOME_GROUPS_SI:
+        df_group = df_food_reg_urbrur_cap_FeH_all_SI.reset_index()
+        df_group = df_group[df_group['income_group'] == group]
+        # Urban: solid line
+        plt.plot(df_group['Year'], df_group['urban_FeH_cap'],
+                 label=f"{group} - Urban",
+                 color=color_map[group], linestyle='-')
+        # Rural: dashed line
+        plt.plot(df_group['Year'], df_group['rural_FeH_cap'],
+                 label=f"{group} - Rural",
+                 color=color_map[group], linestyle='--')
+    plt.title("Urban vs. Rural Food-eHANPP per capita by income group (1990-2020)", fontsize = 14)
+    plt.ylabel("Food-eHANPP in t dm/cap/yr'", fontsize = 12)
+    plt.xlim(1990,2020)
+    plt.xticks(fontsize = 12)
+    plt.yticks(fontsize = 12)
+    plt.grid()
+    plt.legend(ncol=2, fontsize=9, frameon=False)  # 2-column legend for readability
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figureS5a.png', dpi=300, bbox_inches='tight')
+
+    plt.figure(figsize=(12, 7))
+    for group in INCOME_GROUPS_SI:
+        df_group = df_food_reg_urbrur_FeHint_cap_all_SI.reset_index()
+        df_group = df_group[df_group['income_group'] == group]
+        # Urban: solid line
+        plt.plot(df_group['Year'], df_group['urban_FeHint_cap'],
+                 label=f"{group} - Urban",
+                 color=color_map[group], linestyle='-')
+        # Rural: dashed line
+        plt.plot(df_group['Year'], df_group['rural_FeHint_cap'],
+                 label=f"{group} - Rural",
+                 color=color_map[group], linestyle='--')
+    plt.title("Urban vs. Rural Food-eHANPP intensity (1990-2020)", fontsize = 14)
+    plt.ylabel("Food-eHANPP intensity in  g dm/kcal/yr", fontsize = 12)
+    plt.xlim(1990,2020)
+    plt.xticks(fontsize = 12)
+    plt.yticks(fontsize = 12)
+    plt.grid()
+    plt.legend(ncol=2, fontsize=9, frameon=False)  # 2-column legend for readability
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figureS5b.png', dpi=300, bbox_inches='tight')
+
+    plt.figure(figsize=(12, 7))
+    for group in INCOME_GROUPS_SI:
+        df_group = df_food_reg_urbrur_cap_live_all_SI.reset_index()
+        df_group = df_group[df_group['income_group'] == group]
+        # Urban: solid line
+        plt.plot(df_group['Year'], df_group['urban_live_cap'],
+                 label=f"{group} - Urban",
+                 color=color_map[group], linestyle='-')
+        # Rural: dashed line
+        plt.plot(df_group['Year'], df_group['rural_live_cap'],
+                 label=f"{group} - Rural",
+                 color=color_map[group], linestyle='--')
+    plt.title("Urban vs. Rural livestock supply (1990-2020)", fontsize = 14)
+    plt.ylabel("livestock products supply in kcal/cap/day", fontsize = 12)
+    plt.xlim(1990,2020)
+    plt.xticks(fontsize = 12)
+    plt.yticks(fontsize = 12)
+    plt.grid()
+    plt.legend(ncol=2, fontsize=9, frameon=False, loc='lower center', bbox_to_anchor=(0.22, 0.65))  # 2-column legend for readability
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figureS5c.png', dpi=300, bbox_inches='tight')
+
+    plt.figure(figsize=(12, 7))
+    for group in INCOME_GROUPS_SI:
+        df_group = df_food_reg_urbrur_cap_plant_all_SI.reset_index()
+        df_group = df_group[df_group['income_group'] == group]
+        # Urban: solid line
+        plt.plot(df_group['Year'], df_group['urban_plant_cap'],
+                 label=f"{group} - Urban",
+                 color=color_map[group], linestyle='-')
+        # Rural: dashed line
+        plt.plot(df_group['Year'], df_group['rural_plant_cap'],
+                 label=f"{group} - Rural",
+                 color=color_map[group], linestyle='--')
+    plt.title("Urban vs. Rural plant supply (1990-2020)", fontsize = 14)
+    plt.ylabel("plant products supply in kcal/cap/day", fontsize = 12)
+    plt.xlim(1990,2020)
+    plt.xticks(fontsize = 12)
+    plt.yticks(fontsize = 12)
+    plt.grid()
+    plt.legend(ncol=2, fontsize=9, frameon=False, loc='lower center', bbox_to_anchor=(0.22, 0.3))  # 2-column legend for readability
+    plt.tight_layout()
+    plt.show()
+    plt.savefig(path +'/figureS5d.png', dpi=300, bbox_inches='tight')
+    plt.close('all')
+
+
+def plot_figures(figure_data, path):
+    """All figures as png files in path."""
+    plot_figure3(figure_data, path)
+    plot_figure4(figure_data, path)
+    plot_si_figures(figure_data, path)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Title: GDD data extraction
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: the extraction of the GDD_data_collection_* scripts as a function. From the
+GDD country files (vXX_cnty.csv) the urban and rural intake of the whole population
+(age, female and edu = 999) is summed up to the GDD items of the calculation, interpolated
+between the GDD years and extended to 2019 and 2020 with the values of 2018. As in the
+scripts, 2020 is dropped from v10 and v35 (DROP_YEARS); any other year after 2018 is
+replaced by the extension, so (Year, Country, GDD_item_code) is unique.
+
+extract returns the table of the scripts with typed columns (Year int, intakes float), and
+gdd_tables the three estimates in the format of pipeline.load_gdd, so that they can be
+passed to the pipeline without writing and parsing csv files. For persistence the tables
+are stored as uncompressed Arrow IPC files (GDD_<estimate>.arrow), which are read by memory
+mapping.
+
+Milk: the scripts add v13 twice (v13 merged with itself) and v14 not at all. The published
+GDD tables are reproduced with PUBLISHED_ITEMS (default); ITEMS has v13 + v14 + v57.
+
+Usage:
+    GDD = gdd_tables(gdd_path)                       # estimate -> data frame
+    inputs = load('.', GDD=GDD)
+    write_gdd_tables('gdd', GDD); GDD = read_gdd_tables('gdd')
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+# GDD items of the calculation -> GDD variables summed up
+ITEMS = {'v01_v16': ['v01', 'v16'], 'v02': ['v02'], 'v03': ['v03'], 'v04': ['v04'], 'v05': ['v05'],
+         'v06': ['v06'], 'v07_v08': ['v07', 'v08'], 'v09_v10': ['v09', 'v10'], 'v12': ['v12'],
+         'v13_v14_v57': ['v13', 'v14', 'v57'], 'v17': ['v17'], 'v18': ['v18'], 'v27': ['v27'],
+         'v28': ['v28'], 'v29': ['v29'], 'v31': ['v31'], 'v35': ['v35']}
+
+# items as summed up by the GDD_data_collection_* scripts (published GDD tables)
+PUBLISHED_ITEMS = dict(ITEMS, v13_v14_v57=['v13', 'v13', 'v57'])
+
+# estimate of the pipeline -> column of the GDD country files
+ESTIMATES = {'median': 'median', 'upper': 'upperci_95', 'lower': 'lowerci_95'}
+
+STRATA = ['urban', 'age', 'female', 'edu'] # urban: 1 urban, 0 rural
+TOTAL = 999 # GDD code of "all" in a stratum column
+LAST_YEAR = 2018 # last year of the GDD
+EXTEND_YEARS = [2019, 2020] # years without GDD data, values of LAST_YEAR
+DROP_YEARS = {'v10': [2020], 'v35': [2020]} # years removed from a variable by the scripts
+
+
+def drop_years(df, variable):
+    """Rows of a GDD country file (column year) without the DROP_YEARS of the variable."""
+    return df.loc[~df['year'].isin(DROP_YEARS.get(variable, []))]
+
+
+def read_variable(path, variable, column='median'):
+    """Urban/rural intake of one GDD variable (whole population), index (Country, Year), columns urban, rural."""
+    df = pd.read_csv(os.path.join(path, f'{variable}_cnty.csv'), usecols=['iso3', 'year'] + STRATA + [column])
+    df = df.loc[(df['age'] == TOTAL) & (df['female'] == TOTAL) & (df['edu'] == TOTAL) & (df['urban'] != TOTAL)]
+    df = drop_years(df, variable)
+    df = df.pivot(index=['iso3', 'year'], columns='urban', values=column)
+    df = df.rename(columns={0: 'rural', 1: 'urban'}).rename_axis(index=['Country', 'Year'], columns=None)
+    return df[['urban', 'rural']]
+
+
+def interpolate_years(df):
+    """df (index: country, item, Year) on all years from the first year of df to LAST_YEAR, gaps
+    interpolated linearly per country and item, plus EXTEND_YEARS with the values of LAST_YEAR.
+    Years after LAST_YEAR are dropped, so that the extension does not duplicate them."""
+    country, item, year = df.index.names
+    df = df.loc[df.index.get_level_values(year) <= LAST_YEAR]
+    years = df.index.get_level_values(year)
+    index = pd.MultiIndex.from_product([df.index.get_level_values(country).unique(), df.index.get_level_values(item).unique(),
+                                        range(years.min(), years.max() + 1)], names=df.index.names)
+    df = df.reindex(index).groupby(level=[country, item]).transform(lambda x: x.interpolate())
+    extension = [df.xs(LAST_YEAR, level=year, drop_level=False).rename(index={LAST_YEAR: extend}, level=year)
+                 for extend in EXTEND_YEARS]
+    return pd.concat([df] + extension).sort_index()
+
+
+def extract(path, estimate='median', items=PUBLISHED_ITEMS):
+    """GDD table of one estimate as written by the GDD_data_collection_* scripts:
+    columns Year, Country, GDD_item_code, GDD_urban, GDD_rural."""
+    column = ESTIMATES[estimate]
+    variables = {}
+    frames = []
+    for item, item_variables in items.items():
+        df_item = None
+        for variable in item_variables:
+            if variable not in variables:
+                variables[variable] = read_variable(path, variable, column)
+            df_item = variables[variable] if df_item is None else df_item.add(variables[variable]) # missing if one is missing
+        frames.append(df_item.assign(GDD_item_code=item).set_index('GDD_item_code', append=True))
+    df = pd.concat(frames).reorder_levels(['Country', 'GDD_item_code', 'Year'])
+    df = interpolate_years(df).rename(columns={'urban': 'GDD_urban', 'rural': 'GDD_rural'}).reset_index()
+    return df.astype({'Year': 'int64', 'GDD_urban': 'float64', 'GDD_rural': 'float64'})[
+        ['Year', 'Country', 'GDD_item_code', 'GDD_urban', 'GDD_rural']]
+
+
+def pipeline_table(df, estimate):
+    """Extracted table in the format of pipeline.load_gdd (GDD_code, GDD_urban_<estimate>, GDD_rural_<estimate>)."""
+    return df.rename(columns={'Country': 'GDD_code', 'GDD_urban': f'GDD_urban_{estimate}', 'GDD_rural': f'GDD_rural_{estimate}'})
+
+
+def gdd_tables(path, items=PUBLISHED_ITEMS):
+    """GDD data of the three estimates (estimate -> data frame, as pipeline.load_gdd): read from the
+    Arrow files of write_gdd_tables if path contains them, otherwise extracted from the country files."""
+    if all(os.path.exists(os.path.join(path, f'GDD_{estimate}.arrow')) for estimate in ESTIMATES):
+        return read_gdd_tables(path)
+    return {estimate: pipeline_table(extract(path, estimate, items), estimate) for estimate in ESTIMATES}
+
+
+def write_gdd_tables(directory, GDD):
+    """Store GDD tables (estimate -> data frame) as uncompressed Arrow IPC files GDD_<estimate>.arrow."""
+    os.makedirs(directory, exist_ok=True)
+    for estimate, df in GDD.items():
+        feather.write_feather(df.reset_index(drop=True), os.path.join(directory, f'GDD_{estimate}.arrow'),
+                              compression='uncompressed')
+
+
+def read_gdd_tables(directory):
+    """GDD tables of write_gdd_tables; the files are memory mapped."""
+    GDD = {}
+    for estimate in ESTIMATES:
+        with pa.memory_map(os.path.join(directory, f'GDD_{estimate}.arrow')) as source:
+            GDD[estimate] = pa.ipc.open_file(source).read_all().to_pandas()
+    return GDD
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Synthetic GDD country files and extraction benchmark
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: the GDD download requires a login, so the GDD extraction (food_ehanpp.gdd) is
+benchmarked on synthetic country files with the schema of the GDD (vXX_cnty.csv):
+
+    iso3, age, female, urban, edu, year, median, lowerci_95, upperci_95
+
+with all strata: AGES x female (0, 1) x urban (0, 1) x edu (1, 2, 3), each stratum column
+also with the GDD code 999 (all), i.e. every combination of single strata and totals. The
+intakes are lognormal per country and variable with a trend over the years and factors for
+urban, sex, age and education; totals (999) are the means over the stratum, and the 95%
+intervals are lognormal around the median. The values are random, only the structure
+(columns, strata, row counts, file sizes) is realistic.
+
+benchmark writes files of several scales (countries, years, variables) and measures the
+extraction of the three estimates (gdd.gdd_tables): time, and peak memory of the Python
+allocations (tracemalloc, incl. pandas/NumPy buffers). Years should include 2018, the year
+extended to 2019 and 2020.
+
+Usage:
+    write_synthetic_gdd('gdd_synthetic', countries=185, years=7, variables=22)
+    benchmark([(20, 7, 22), (185, 7, 22), (185, 29, 22)])
+
+    python -m food_ehanpp gdd-benchmark --scale 20x7x22 185x7x22 --output gdd_benchmark.csv
+"""
+
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.gdd import ESTIMATES, ITEMS, PUBLISHED_ITEMS, TOTAL, gdd_tables
+
+
+GDD_YEARS = [1990, 1995, 2000, 2005, 2010, 2015, 2018]
+AGES = [0.5, 1.5, 3.5, 7.5] + [12.5 + 5 * i for i in range(18)] # GDD age groups (midpoints)
+FEMALE = [0, 1]
+URBAN = [0, 1]
+EDU = [1, 2, 3] # low, medium, high
+# variables of the calculation (gdd.ITEMS), in the order of their numbers
+VARIABLES = sorted({variable for variables in ITEMS.values() for variable in variables})
+
+COLUMNS = ['iso3', 'age', 'female', 'urban', 'edu', 'year'] + list(ESTIMATES.values())
+
+
+def country_codes(countries):
+    """countries synthetic three-letter codes (AAA, AAB, ...) or the codes given."""
+    if isinstance(countries, int):
+        return [''.join(code) for code in itertools.islice(itertools.product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3), countries)]
+    return list(countries)
+
+
+def gdd_years(years):
+    """GDD years: the list given, or years years from 1990 to 2018 (GDD_YEARS for 7)."""
+    if not isinstance(years, int):
+        return list(years)
+    if years == len(GDD_YEARS):
+        return GDD_YEARS
+    return sorted(set(np.linspace(GDD_YEARS[0], GDD_YEARS[-1], years).round().astype(int).tolist()))
+
+
+def gdd_variables(variables):
+    """Variable names: the list given, or the first variables of VARIABLES (then v58, v59, ...)."""
+    if not isinstance(variables, int):
+        return list(variables)
+    extra = [f'v{number}' for number in range(58, 58 + max(0, variables - len(VARIABLES)))]
+    return (VARIABLES + extra)[:variables]
+
+
+def _with_totals(values, axes):
+    """values with the mean over each stratum axis appended as the last level (GDD code 999)."""
+    for axis in axes:
+        values = np.concatenate([values, values.mean(axis=axis, keepdims=True)], axis=axis)
+    return values
+
+
+def synthetic_variable(codes, years, rng):
+    """Data frame of one synthetic GDD variable (columns COLUMNS)."""
+    n_countries, n_years = len(codes), len(years)
+    shape = (n_countries, n_years, len(AGES), len(FEMALE), len(URBAN), len(EDU))
+    level = rng.lognormal(mean=3.5, sigma=1.0, size=(n_countries, 1, 1, 1, 1, 1))
+    trend = (1 + rng.normal(0, 0.01, size=(n_countries, 1, 1, 1, 1, 1))) ** (np.asarray(years) - years[0]).reshape(1, -1, 1, 1, 1, 1)
+    urban = np.stack([np.ones(n_countries), rng.lognormal(0.1, 0.2, n_countries)], axis=1).reshape(n_countries, 1, 1, 1, 2, 1)
+    age = rng.lognormal(0, 0.3, len(AGES)).reshape(1, 1, -1, 1, 1, 1)
+    female = np.array([1.0, rng.lognormal(-0.1, 0.1)]).reshape(1, 1, 1, 2, 1, 1)
+    edu = rng.lognormal(0, 0.15, len(EDU)).reshape(1, 1, 1, 1, 1, -1)
+    median = level * trend * urban * age * female * edu * rng.lognormal(0, 0.05, size=shape)
+    median = _with_totals(median, axes=[2, 3, 4, 5])
+    sigma = rng.uniform(0.1, 0.4, size=median.shape)
+
+    index = np.indices(median.shape).reshape(len(median.shape), -1)
+    def codes_of(levels, position):
+        return np.asarray(list(levels) + [TOTAL])[index[position]]
+    median = median.ravel()
+    sigma = sigma.ravel()
+    return pd.DataFrame({'iso3': np.asarray(codes)[index[0]], 'age': codes_of(AGES, 2), 'female': codes_of(FEMALE, 3),
+                         'urban': codes_of(URBAN, 4), 'edu': codes_of(EDU, 5), 'year': np.asarray(years)[index[1]],
+                         'median': median, 'lowerci_95': median * np.exp(-1.96 * sigma),
+                         'upperci_95': median * np.exp(1.96 * sigma)})[COLUMNS]
+
+
+def write_synthetic_gdd(directory, countries=185, years=GDD_YEARS, variables=VARIABLES, seed=0):
+    """Write synthetic GDD country files <variable>_cnty.csv (see module description); returns the number of rows per file."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    codes, years = country_codes(countries), gdd_years(years)
+    rows = 0
+    for variable in gdd_variables(variables):
+        df = synthetic_variable(codes, years, rng)
+        df.to_csv(os.path.join(directory, f'{variable}_cnty.csv'), index=False)
+        rows = len(df)
+    return rows
+
+
+def _items(variables):
+    """Items of PUBLISHED_ITEMS whose variables are all written."""
+    return {item: item_variables for item, item_variables in PUBLISHED_ITEMS.items() if set(item_variables) <= set(variables)}
+
+
+def benchmark(scales, directory=None, repeat=1, seed=0):
+    """Time and peak memory of the GDD extraction (three estimates) on synthetic files of each
+    scale (countries, years, variables); files are written to directory (default: a temporary
+    folder, removed afterwards). Returns one row per scale: best time of repeat runs, peak
+    memory of one further run."""
+    rows = []
+    for countries, years, variables in scales:
+        folder = os.path.join(directory, f'{countries}x{years}x{variables}') if directory else tempfile.mkdtemp(prefix='gdd_')
+        try:
+            start = time.perf_counter()
+            rows_per_file = write_synthetic_gdd(folder, countries, years, variables, seed)
+            write_s = time.perf_counter() - start
+            names = gdd_variables(variables)
+            size = sum(os.path.getsize(os.path.join(folder, f'{variable}_cnty.csv')) for variable in names)
+            items = _items(names)
+
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                GDD = gdd_tables(folder, items)
+                times.append(time.perf_counter() - start)
+            #memory in a separate run, tracing slows down the extraction
+            tracemalloc.start()
+            gdd_tables(folder, items)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append({'countries': countries, 'years': years, 'variables': variables, 'items': len(items),
+                         'rows_per_file': rows_per_file, 'csv_mb': size / 1e6, 'write_s': write_s,
+                         'extract_s': min(times), 'peak_mb': peak / 1e6,
+                         'rows_per_s': rows_per_file * len(names) * len(ESTIMATES) / min(times),
+                         'output_rows': len(GDD['median'])})
+        finally:
+            if not directory:
+                shutil.rmtree(folder, ignore_errors=True)
+    return pd.DataFrame(rows)
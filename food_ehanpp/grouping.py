@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Country groupings
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: classification of countries into groups by several schemes (income groups,
+world regions, GDD regions and superregions) and aggregation of national tables to all
+schemes at once.
+
+Income groups can change over time: every year column of the country_groups sheet
+(e.g. 2020) is a classification vintage and each year is classified with the latest
+vintage up to that year (years before the first vintage with the first vintage).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# columns of the country_groups sheet used as grouping schemes
+SCHEMES = ['income_group', 'world_region', 'GDD_region', 'GDD_superregion']
+
+
+def income_group_vintages(df0_countries):
+    """Income groups per country (index code_FAO) and vintage (one column per year)."""
+    vintages = sorted(column for column in df0_countries.columns if isinstance(column, (int, np.integer)))
+    return df0_countries.set_index('code_FAO')[vintages]
+
+
+def _vintage(vintages, year):
+    earlier = [vintage for vintage in vintages if vintage <= year]
+    return max(earlier) if earlier else min(vintages)
+
+
+def country_classification(df0_countries, years, schemes=SCHEMES, income_vintage=None):
+    """Long table Destination_code_FAO, Year, scheme, group of all countries, years and schemes.
+
+    With income_vintage (e.g. 2020) all years are classified with this income group vintage.
+    """
+    frames = []
+    for scheme in schemes:
+        if scheme == 'income_group':
+            vintages = income_group_vintages(df0_countries)
+            chosen = [income_vintage if income_vintage is not None else _vintage(vintages.columns, year) for year in years]
+            table = vintages[chosen]
+        else:
+            table = pd.DataFrame({year: df0_countries[scheme].to_numpy() for year in years},
+                                 index=df0_countries['code_FAO'])
+        table.columns = list(years)
+        long = table.stack().reset_index() # countries without group are dropped
+        long.columns = ['Destination_code_FAO', 'Year', 'group']
+        long['scheme'] = scheme
+        frames.append(long)
+    classification = pd.concat(frames, ignore_index=True)
+    classification['Year'] = classification['Year'].astype(int)
+    return classification[['Destination_code_FAO', 'Year', 'scheme', 'group']]
+
+
+def aggregate_groups(df, classification, keys=('Final_use', 'food_group'), columns=None, sum_by=None):
+    """Sum a national table (one row per country, year and keys) to the groups of all schemes.
+
+    The national rows are joined once with the classification of all schemes and summed
+    in a single groupby, instead of one groupby per scheme. columns defaults to all
+    numeric columns except Destination_code_FAO. sum_by(df, keys) replaces the groupby
+    sum (food_ehanpp.summation.sum_by: exact sums).
+    """
+    if columns is None:
+        columns = [column for column in df.select_dtypes('number').columns
+                   if column not in ['Destination_code_FAO', 'Year']]
+    df = df[['Destination_code_FAO', 'Year'] + list(keys) + list(columns)].merge(
+        classification, how='inner', on=['Destination_code_FAO', 'Year'])
+    by = ['scheme', 'group', 'Year'] + list(keys)
+    if sum_by is not None:
+        return sum_by(df[by + list(columns)], by)
+    return df.groupby(by, observed=True)[list(columns)].sum().reset_index()
+
+
+def select_scheme(df, scheme, name=None):
+    """Rows of one scheme of an aggregated table, with the group column renamed to name (default: scheme)."""
+    df = df.loc[df['scheme'] == scheme].drop('scheme', axis=1)
+    return df.rename(columns={'group': name or scheme}).reset_index(drop=True)
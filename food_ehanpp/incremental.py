@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Incremental update with new data years
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: appends the years of a new eHANPP/FAOSTAT vintage (e.g. 2021) to the results
+written by a previous run (results/national.parquet, groups.parquet, regional.parquet)
+instead of recomputing all years:
+
+    - only the rows of the new years go through joins, allocation and national aggregation
+      and are summed up to the country groupings; stored rows of these years are replaced
+    - GDD data end with 2020 (2019 and 2020 are the values of 2018): new years get the GDD
+      values of the last GDD year, only these cells are added
+    - the regional 3-year average is centered, so only the years whose window contains a
+      new year (the new years and the year before) are recomputed, from the groupings of
+      their windows
+
+The results cube, scenario engine and figures are not updated (full run). A new GDD release
+changes the interpolation of all years and needs a full run as well.
+
+Usage:
+    results = update('.')                    # years of the eHANPP csv that are not stored yet
+    results = update('.', years=[2021])
+"""
+
+import os
+
+import pandas as pd
+
+from food_ehanpp.export import export_results, read_results
+from food_ehanpp.grouping import aggregate_groups, country_classification
+from food_ehanpp.joins import prepare
+from food_ehanpp.keys import decode
+from food_ehanpp.pipeline import (LINK, Inputs, Results, aggregate_national, allocate, group_population, load,
+                                  national_population, regional_table)
+
+
+TABLES = {'df_food_national': 'national', 'df_food_groups': 'groups', 'df_food_regional': 'regional'}
+GROUP_KEYS = ['scheme', 'group', 'Year', 'Final_use', 'food_group'] # row order of aggregate_groups
+WINDOW = 3 # years of the regional rolling average
+
+
+def read_stored(directory):
+    """Stored national, groups and regional results (name -> data frame, plain keys)."""
+    stored = {}
+    for name, file in TABLES.items():
+        df = decode(read_results(os.path.join(directory, f'{file}.parquet')))
+        stored[name] = df.astype({'Year': int})
+    return stored
+
+
+def affected_years(new_years, years, window=WINDOW):
+    """Years of years whose centered rolling window contains one of new_years."""
+    half = window // 2
+    return sorted(year for year in years if any(abs(year - new) <= half for new in new_years))
+
+
+def extend_gdd(df_GDD, years):
+    """GDD rows of years; years after the last GDD year get the values of the last year."""
+    last = df_GDD['Year'].max()
+    extension = [df_GDD.loc[df_GDD['Year'] == last].assign(Year=year) for year in years if year > last]
+    df_GDD = pd.concat([df_GDD] + extension, ignore_index=True)
+    return df_GDD.loc[df_GDD['Year'].isin(years)].reset_index(drop=True)
+
+
+def select_years(inputs, years):
+    """Inputs with the eHANPP, food supply and GDD rows of years (look-up tables unchanged)."""
+    return Inputs(df_food=inputs.df_food.loc[inputs.df_food['Year'].isin(years)],
+                  look_up=dict(inputs.look_up),
+                  GDD={estimate: extend_gdd(df, years) for estimate, df in inputs.GDD.items()},
+                  df0_food_supply=inputs.df0_food_supply.loc[inputs.df0_food_supply['Year'].isin(years)],
+                  keys=getattr(inputs, 'keys', None))
+
+
+def _append(df_stored, df_new, years):
+    """Stored rows of other years plus the new rows."""
+    df_stored = df_stored.loc[~df_stored['Year'].isin(years)]
+    return pd.concat([df_stored, df_new[df_stored.columns.intersection(df_new.columns)]], ignore_index=True)
+
+
+def update(path='.', link=LINK, years=None, directory=None, inputs=None):
+    """Append the years (default: all years of the eHANPP data that are not stored) to the results
+    in directory (default: path/results) and write them again. Returns Results with the appended
+    national, groups and regional tables, the master table of the new years (df_food_6),
+    results.years and results.recomputed_years (regional years that were recomputed)."""
+    directory = directory or os.path.join(path, 'results')
+    stored = read_stored(directory)
+    if inputs is None:
+        inputs = load(path, link)
+    if years is None:
+        stored_years = set(stored['df_food_national']['Year'])
+        years = sorted(int(year) for year in inputs.df_food['Year'].unique() if int(year) not in stored_years)
+    if not years:
+        return Results(years=[], recomputed_years=[], **stored)
+
+    #new years: joins, allocation, national aggregation and country groupings
+    results = prepare(select_years(inputs, years))
+    results.df_food_6 = allocate(results.df_food_5)
+    df_national_new = aggregate_national(results.df_food_6, results.df_pop_nat)
+    df_food_national = _append(stored['df_food_national'], df_national_new, years)
+    df_food_groups = _append(stored['df_food_groups'], aggregate_groups(df_national_new, results.df_classification), years)
+    df_food_groups = df_food_groups.sort_values(GROUP_KEYS, kind='stable').reset_index(drop=True)
+
+    #regional: years whose 3-year window touches the new years, computed from the groupings of their windows
+    recomputed = affected_years(years, sorted(df_food_groups['Year'].unique()))
+    window = affected_years(recomputed, sorted(df_food_groups['Year'].unique()))
+    df_country_years = df_food_national.loc[df_food_national['Year'].isin(window), ['Year','Destination_code_FAO']].drop_duplicates()
+    df_country_years = df_country_years.astype({'Destination_code_FAO': 'float64'})
+    df0_countries = inputs.look_up['country_groups']
+    df_pop_nat = national_population(inputs.look_up['total_population'], inputs.look_up['urban_population'], df_country_years)
+    df_pop_groups = group_population(df_pop_nat, country_classification(df0_countries, window))
+    df_regional_new = regional_table(df_food_groups.loc[df_food_groups['Year'].isin(window)], df_pop_groups)
+    df_food_regional = _append(stored['df_food_regional'], df_regional_new.loc[df_regional_new['Year'].isin(recomputed)], recomputed)
+
+    export_results(directory, df_food_national, df_food_regional, df_food_groups=df_food_groups)
+    results.df_food_national, results.df_food_groups, results.df_food_regional = df_food_national, df_food_groups, df_food_regional
+    results.years, results.recomputed_years = years, recomputed
+    return results
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Inequality and convergence of Food-eHANPP per capita
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: population-weighted inequality of Food-eHANPP per capita between countries and
+between urban and rural areas, per year, from the national urban/rural results:
+
+    gini, theil               countries, national FeH per capita (weights: population)
+    sigma                     weighted standard deviation of ln(national FeH per capita), sigma-convergence
+    gini_urban, gini_rural    countries, urban (rural) FeH per capita (weights: urban (rural) population)
+    theil_urban_rural         country x area units (weights: urban/rural population)
+    theil_within              theil_urban_rural - theil: part of the inequality within countries (urban/rural gaps)
+    urban_rural_ratio         weighted geometric mean over countries of urban / rural FeH per capita
+
+Confidence bands come from resampling within the GDD intervals: a draw moves the urban
+(and rural) FeH of every country from the median towards the high (hoch) or low (niedrig)
+estimate by a uniform u in [-1, 1] (u < 0: hoch, u > 0: niedrig), the same u for all years
+of a country (by_year: one u per country and year). Since every estimate splits the same
+national FeH, the national metrics (gini, theil, sigma) do not change between draws.
+Draws are evaluated in batches of arrays (draws x years x countries).
+
+urban_rural_gaps gives the urban/rural ratio of every country and year with the bounds of
+the estimates.
+
+Usage:
+    df = inequality(results.df_food_national, results.df_pop_nat, draws=1000)
+    gaps = urban_rural_gaps(results.df_food_national, results.df_pop_nat)
+
+    python -m food_ehanpp inequality --draws 1000
+"""
+
+import numpy as np
+import pandas as pd
+
+
+METRICS = ['gini', 'theil', 'sigma', 'gini_urban', 'gini_rural', 'theil_urban_rural', 'theil_within', 'urban_rural_ratio']
+FEH_COLUMNS = [f'FeH_{area}_{scenario}' for area in ['urban', 'rural'] for scenario in ['median', 'hoch', 'niedrig']]
+BATCH = 100 # draws per batch
+LEVELS = (2.5, 97.5) # percentiles of the confidence band
+
+
+###############################################################################
+#                                 Data                                        #
+###############################################################################
+
+def national_table(df_food_national, df_pop_nat):
+    """Urban/rural FeH (all estimates) and population per country and year."""
+    df = df_food_national.astype({'Year': int}).groupby(['Destination_code_FAO', 'Year'])[FEH_COLUMNS].sum().reset_index()
+    df_pop = df_pop_nat.astype({'Year': int})[['Destination_code_FAO', 'Year', 'urban population', 'rural population']]
+    return df.merge(df_pop, how='inner', on=['Destination_code_FAO', 'Year'])
+
+
+def _arrays(df):
+    """Columns of national_table as arrays years x countries (missing: NaN), and the years."""
+    wide = df.set_index(['Year', 'Destination_code_FAO']).unstack('Destination_code_FAO').sort_index()
+    return {column: wide[column].to_numpy(dtype='float64') for column in df.columns.drop(['Destination_code_FAO', 'Year'])}, wide.index.to_numpy()
+
+
+def _per_capita(FeH, population):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(population > 0, FeH / population, np.nan)
+
+
+def urban_rural_gaps(df_food_national, df_pop_nat):
+    """Urban / rural FeH per capita of every country and year: median and the range of the estimates."""
+    df = national_table(df_food_national, df_pop_nat)
+    for scenario in ['median', 'hoch', 'niedrig']:
+        urban = _per_capita(df[f'FeH_urban_{scenario}'].to_numpy(), df['urban population'].to_numpy())
+        rural = _per_capita(df[f'FeH_rural_{scenario}'].to_numpy(), df['rural population'].to_numpy())
+        df[f'ratio_{scenario}'] = _per_capita(urban, rural)
+    df['ratio_lower'] = df[['ratio_hoch', 'ratio_niedrig']].min(axis=1)
+    df['ratio_upper'] = df[['ratio_hoch', 'ratio_niedrig']].max(axis=1)
+    return df[['Destination_code_FAO', 'Year', 'ratio_median', 'ratio_lower', 'ratio_upper']].rename(
+        columns={'ratio_median': 'urban_rural_ratio'})
+
+
+###############################################################################
+#                                Metrics                                      #
+###############################################################################
+
+def _valid(x, w):
+    """x and w with excluded values (missing or without weight) as 0."""
+    valid = np.isfinite(x) & np.isfinite(w) & (w > 0)
+    return np.where(valid, x, 0.0), np.where(valid, w, 0.0)
+
+
+def weighted_gini(x, w):
+    """Gini coefficient of x with weights w over the last axis."""
+    x, w = _valid(x, w)
+    order = np.argsort(x, axis=-1)
+    x, w = np.take_along_axis(x, order, axis=-1), np.take_along_axis(w, order, axis=-1)
+    amounts = w * x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cumulative = np.cumsum(amounts, axis=-1) / amounts.sum(axis=-1, keepdims=True)
+        share = w / w.sum(axis=-1, keepdims=True)
+    return 1 - (share * (2 * cumulative - amounts / amounts.sum(axis=-1, keepdims=True))).sum(axis=-1)
+
+
+def weighted_theil(x, w):
+    """Theil T index of x with weights w over the last axis (units with x = 0 add 0)."""
+    x, w = _valid(x, w)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = w / w.sum(axis=-1, keepdims=True)
+        ratio = x / (share * x).sum(axis=-1, keepdims=True)
+        terms = np.where(ratio > 0, ratio * np.log(ratio), 0.0)
+    return (share * terms).sum(axis=-1)
+
+
+def weighted_mean_log(x, w):
+    """Weighted mean and standard deviation of ln(x) over the last axis (x > 0)."""
+    x, w = _valid(x, w)
+    w = np.where(x > 0, w, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log = np.where(x > 0, np.log(np.where(x > 0, x, 1.0)), 0.0)
+        share = w / w.sum(axis=-1, keepdims=True)
+        mean = (share * log).sum(axis=-1)
+        std = np.sqrt((share * (log - mean[..., None]) ** 2).sum(axis=-1))
+    return mean, std
+
+
+def metrics(FeH_urban, FeH_rural, urban_population, rural_population):
+    """METRICS of arrays (..., countries) -> arrays (...)."""
+    population = urban_population + rural_population
+    national = _per_capita(FeH_urban + FeH_rural, population)
+    urban = _per_capita(FeH_urban, urban_population)
+    rural = _per_capita(FeH_rural, rural_population)
+    theil = weighted_theil(national, population)
+    #country x area units: urban and rural next to each other on the last axis
+    theil_units = weighted_theil(np.concatenate([urban, rural], axis=-1), np.concatenate([urban_population, rural_population], axis=-1))
+    ratio, _ = weighted_mean_log(_per_capita(urban, rural), population)
+    return {'gini': weighted_gini(national, population), 'theil': theil, 'sigma': weighted_mean_log(national, population)[1],
+            'gini_urban': weighted_gini(urban, urban_population), 'gini_rural': weighted_gini(rural, rural_population),
+            'theil_urban_rural': theil_units, 'theil_within': theil_units - theil, 'urban_rural_ratio': np.exp(ratio)}
+
+
+###############################################################################
+#                               Resampling                                    #
+###############################################################################
+
+def _draw(median, hoch, niedrig, u):
+    """FeH between the estimates: u < 0 towards hoch, u > 0 towards niedrig."""
+    return median + np.where(u < 0, -u * (hoch - median), u * (niedrig - median))
+
+
+def inequality(df_food_national, df_pop_nat, draws=1000, batch=BATCH, seed=0, by_year=False, levels=LEVELS):
+    """METRICS per year: estimate (median GDD) and confidence band (percentiles levels of draws,
+    see module description). One row per year and metric."""
+    arrays, years = _arrays(national_table(df_food_national, df_pop_nat))
+    urban_population, rural_population = arrays['urban population'], arrays['rural population']
+    estimate = metrics(arrays['FeH_urban_median'], arrays['FeH_rural_median'], urban_population, rural_population)
+
+    rng = np.random.default_rng(seed)
+    n_years, n_countries = urban_population.shape
+    samples = {metric: [] for metric in METRICS}
+    for start in range(0, draws, batch):
+        size = min(batch, draws - start)
+        u = rng.uniform(-1, 1, size=(size, n_years if by_year else 1, n_countries))
+        FeH = {area: _draw(arrays[f'FeH_{area}_median'], arrays[f'FeH_{area}_hoch'], arrays[f'FeH_{area}_niedrig'], u)
+               for area in ['urban', 'rural']}
+        for metric, values in metrics(FeH['urban'], FeH['rural'], urban_population, rural_population).items():
+            samples[metric].append(values)
+
+    frames = []
+    for metric in METRICS:
+        lower, upper = np.nanpercentile(np.concatenate(samples[metric]), levels, axis=0) if draws else (np.nan, np.nan)
+        frames.append(pd.DataFrame({'Year': years, 'metric': metric, 'estimate': estimate[metric],
+                                    'lower': lower, 'upper': upper}))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Dense-index joins
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: builds the master table df_food_5 without pandas merges. The side tables are
+compiled once into dense arrays indexed by the positions of their keys:
+
+    countries       Destination_code_FAO                  -> income_group, GDD_code
+    products        product code                          -> food_group, GDD_item_code, GDD_item
+    GDD             GDD_code x Year x GDD_item_code       -> urban/rural median, upper, lower
+    Ethiopia        Year x GDD_item_code                  -> the same (gaps of Somalia)
+    population      Destination_code_FAO x Year           -> total, urban share, urban, rural
+    food supply     Destination_code_FAO x Year x code    -> tonnes_traded_dm
+    kcal factors    product code                          -> dm_content, kcal/g
+
+and the eHANPP table gains the columns by gathering from these arrays (one position lookup
+per key and row, for categorical keys one per category). Rows of countries that are not
+considered and the food rows of North Korea are dropped once at the start; infrastructure
+rows stay in the table and get their values by masks instead of being cut out and
+concatenated again.
+
+Side-table keys have to be unique (a merge would duplicate rows, DenseTable raises a
+ValueError). The food supply is looked up by country code, year and product code; its
+Destination, GDD_code and primary_product are not compared as in the merge of
+pipeline.add_food_supply. The result is the df_food_5 of pipeline.prepare with the
+rows in eHANPP order and tonnes_traded_dm of infrastructure as NaN.
+
+check_against_merges runs both master tables through allocation and national aggregation and
+raises a ValidationError if the national results differ.
+
+Usage:
+    results = prepare(inputs)       # as pipeline.prepare
+    check_against_merges(inputs)
+"""
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.grouping import country_classification, select_scheme
+from food_ehanpp.keys import encode
+from food_ehanpp.pipeline import (FOOD_4_COLUMNS, GDD_COLUMNS, NATIONAL_COLUMNS, NATIONAL_KEYS, SOMALIA_SELECTION, Results,
+                                  aggregate_national, allocate, country_table, group_population, national_population)
+from food_ehanpp.validation import check_no_nans, check_same_results, report_nans
+
+
+# keys compared as numbers (codes and years are floats or ints depending on the table)
+NUMERIC_KEYS = ['Destination_code_FAO', 'Year', 'code']
+
+
+def _key(values, key):
+    return pd.to_numeric(values, errors='coerce').astype('float64') if key in NUMERIC_KEYS else values
+
+
+def positions(index, values):
+    """Positions of values in index (-1 if missing); categoricals are looked up once per category."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = index.get_indexer(values.cat.categories)
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, lookup[codes], -1)
+    return index.get_indexer(values)
+
+
+class DenseTable:
+    """Columns of a side table as flat arrays over all combinations of its key values.
+
+    Numeric columns are float arrays of dtype (NaN for missing combinations), other columns
+    categoricals (code -1 for missing combinations).
+    """
+
+    def __init__(self, df, keys, columns, dtype='float64'):
+        df = df.assign(**{key: _key(df[key], key) for key in keys}).dropna(subset=keys)
+        self.keys = list(keys)
+        self.indexes = [pd.Index(pd.unique(np.asarray(df[key]))) for key in keys]
+        self.shape = tuple(len(index) for index in self.indexes)
+        cells = np.ravel_multi_index([index.get_indexer(df[key]) for index, key in zip(self.indexes, keys)], self.shape)
+        if len(np.unique(cells)) < len(cells):
+            raise ValueError(f'keys {keys} of the side table are not unique')
+        size = int(np.prod(self.shape))
+        self.columns = {}
+        for column in columns:
+            values = df[column]
+            if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+                array = np.full(size, np.nan, dtype=dtype)
+                array[cells] = values.to_numpy(dtype=dtype)
+            else:
+                values = pd.Categorical(values)
+                array = pd.Categorical.from_codes(np.full(size, -1, dtype=values.codes.dtype), values.categories)
+                array[cells] = values
+            self.columns[column] = array
+
+    def gather(self, df, columns=None):
+        """Columns (name -> array or categorical) for the rows of df, looked up by the key columns of df."""
+        found = np.ones(len(df), dtype=bool)
+        cells = []
+        for index, key in zip(self.indexes, self.keys):
+            position = positions(index, _key(df[key], key))
+            found &= position >= 0
+            cells.append(position)
+        cells = np.ravel_multi_index([np.where(found, position, 0) for position in cells], self.shape)
+        gathered = {}
+        for column in columns or self.columns:
+            array = self.columns[column]
+            if isinstance(array, pd.Categorical):
+                codes = np.where(found, array.codes[cells], -1)
+                gathered[column] = pd.Categorical.from_codes(codes, array.categories)
+            else:
+                gathered[column] = np.where(found, array[cells], np.nan)
+        return gathered
+
+
+def _set(values, mask, value):
+    """values (array or categorical) with value where mask."""
+    if isinstance(values, pd.Categorical):
+        values = values.copy() if value in values.categories else values.add_categories([value])
+        values[mask] = value
+        return values
+    return np.where(mask, value, values)
+
+
+def _isna(values):
+    return pd.isna(values) if isinstance(values, pd.Categorical) else np.isnan(values)
+
+
+def compile_tables(inputs, dtype='float64'):
+    """Dense side tables of the loaded inputs (see module description), numbers as dtype."""
+    look_up, GDD = inputs.look_up, inputs.GDD
+    df_products = look_up['products'][['primary_product_Code','food_group','GDD_item_code','GDD_item']].drop_duplicates()
+    df_kcal = look_up['factors'][['primary_product_Code','dm_content','kcal/g']].drop_duplicates()
+
+    df_GDD = None
+    for estimate, df in GDD.items():
+        df = df[['GDD_code','Year','GDD_item_code',f'GDD_urban_{estimate}',f'GDD_rural_{estimate}']]
+        df_GDD = df if df_GDD is None else df_GDD.merge(df, how='outer', on=['GDD_code','Year','GDD_item_code'])
+
+    df_pop = national_population(look_up['total_population'], look_up['urban_population'])
+    return {'countries': DenseTable(country_table(look_up['country_groups']).dropna(subset=['income_group']),
+                                    ['Destination_code_FAO'], ['income_group','GDD_code']),
+            'products': DenseTable(df_products.rename(columns={'primary_product_Code': 'code'}),
+                                   ['code'], ['food_group','GDD_item_code','GDD_item']),
+            'GDD': DenseTable(df_GDD, ['GDD_code','Year','GDD_item_code'], GDD_COLUMNS, dtype),
+            'eth': DenseTable(df_GDD.loc[df_GDD['GDD_code'] == 'ETH'], ['Year','GDD_item_code'], GDD_COLUMNS, dtype),
+            'pop': DenseTable(df_pop, ['Destination_code_FAO','Year'],
+                              ['pop_national','pop_urb_share','urban population','rural population'], dtype),
+            'supply': DenseTable(inputs.df0_food_supply.rename(columns={'primary_product_Code': 'code'}),
+                                 ['Destination_code_FAO','Year','code'], ['tonnes_traded_dm'], dtype),
+            'kcal': DenseTable(df_kcal.rename(columns={'primary_product_Code': 'code'}), ['code'], ['dm_content','kcal/g'], dtype)}
+
+
+def master_table(df_food, tables, dtype='float64'):
+    """df_food_5 of the eHANPP data (summed up by Destination) by gathers from the compiled tables,
+    and the considered country-years (incl. North Korea, for the population tables). The float
+    columns are built as dtype (the gathered columns have the dtype of the compiled tables)."""
+    #Add regions and dismiss countries that are not considered, no GDD for North Korea (infrastructure is kept)
+    countries = tables['countries'].gather(df_food)
+    infra = (df_food['primary_product_Code'] == 'Infrastructure').to_numpy()
+    considered = ~_isna(countries['income_group'])
+    df_country_years = df_food.loc[considered, ['Year','Destination_code_FAO']].drop_duplicates()
+    rows = considered & ((countries['GDD_code'] != 'PRK') | infra)
+    df = df_food.loc[rows, ['Destination_code_FAO','Destination','Year','Final_use','primary_product','HANPP_embodied_in_trade']]
+    df = df.reset_index(drop=True)
+    df['HANPP_embodied_in_trade'] = df['HANPP_embodied_in_trade'].astype(dtype)
+    infra = infra[rows]
+    df['income_group'] = countries['income_group'][rows]
+    df['GDD_code'] = countries['GDD_code'][rows]
+    df['code'] = pd.to_numeric(df_food['primary_product_Code'].to_numpy()[rows], errors='coerce')
+
+    #food groups and GDD items, infrastructure: 'Infra'
+    products = tables['products'].gather(df)
+    for column in ['food_group','GDD_item_code','GDD_item']:
+        df[column] = _set(products[column], infra, 'Infra')
+    report_nans(df, 'df_food_2', ['food_group'])
+
+    #add GDD data
+    gdd = tables['GDD'].gather(df)
+
+    #correct nans:
+        #1 city states: 0 rural population
+        #2 Stimulants and Spices are seperated equally between urban and urual due to missing GDD values
+    city_state = (df['GDD_code'] == 'SGP').to_numpy()
+    stimulants = (df['food_group'] == 'Sugars and stimulants').to_numpy()
+    for column in GDD_COLUMNS:
+        if '_rural_' in column:
+            gdd[column] = np.where(city_state & np.isnan(gdd[column]), 0, gdd[column])
+        gdd[column] = np.where(stimulants & np.isnan(gdd[column]), 1, gdd[column])
+    df['GDD_item'] = _set(df['GDD_item'].array, stimulants & df['GDD_item'].isna().to_numpy(), 'XX')
+
+        #4 Somalia has no urban/rural for livestock products: values of Ethiopia (rows selected by the gaps before filling)
+    somalia = (df['GDD_code'] == 'SOM').to_numpy()
+    if somalia.any():
+        eth = tables['eth'].gather(df)
+        gaps = {column: somalia & np.isnan(gdd[column]) for column in GDD_COLUMNS}
+        for column, selection in SOMALIA_SELECTION.items():
+            gdd[column] = np.where(gaps[selection], eth[column], gdd[column])
+
+        #infrastructure: same intake in urban and rural areas
+    for column in GDD_COLUMNS:
+        df[column] = np.where(infra, 1.0, gdd[column]).astype(dtype, copy=False)
+
+    #primary_product_Code as in the pipeline: number or 'Infrastructure'
+    df['primary_product_Code'] = pd.Series(df['code'].to_numpy(), dtype=object).where(~infra, 'Infrastructure')
+    check_no_nans(df, 'df_food_4', FOOD_4_COLUMNS) #! should be 0 rows
+
+    #add population, supply (not for infrastructure) and kcal
+    for name in ['pop', 'supply', 'kcal']:
+        for column, values in tables[name].gather(df).items():
+            df[column] = values
+    return df.drop(columns='code'), df_country_years
+
+
+def prepare(inputs, dtype='float64'):
+    """Master table df_food_5 plus country and population tables of the loaded inputs, as pipeline.prepare.
+    The float columns of df_food_5 are built as dtype (float32: food_ehanpp.precision)."""
+    df0_countries = inputs.look_up['country_groups']
+    df_food_5, df_country_years = master_table(inputs.df_food, compile_tables(inputs, dtype), dtype)
+    df_food_5 = encode(inputs, df_food_5)
+
+    #country groupings and population of the considered countries
+    df_countries = country_table(df0_countries)
+    df_classification = country_classification(df0_countries, sorted(df_country_years['Year'].unique()))
+    df_pop_nat = national_population(inputs.look_up['total_population'], inputs.look_up['urban_population'], df_country_years)
+    df_pop_groups = group_population(df_pop_nat, df_classification)
+
+    return Results(df_food_5=df_food_5, df_countries=df_countries, df_classification=df_classification,
+                   df_pop_nat=df_pop_nat, df_pop_groups=df_pop_groups,
+                   df_pop_reg=select_scheme(df_pop_groups, 'income_group')) #regional = income groups
+
+
+def check_against_merges(inputs):
+    """Raise a ValidationError if the national results of the dense joins differ from those of the
+    merges of pipeline.prepare (same inputs); returns both national tables (dense, merges)."""
+    from food_ehanpp import pipeline
+
+    national = []
+    for results in (prepare(inputs), pipeline.prepare(inputs)):
+        national.append(aggregate_national(allocate(results.df_food_5), results.df_pop_nat))
+    check_same_results(national[0], national[1], NATIONAL_KEYS, NATIONAL_COLUMNS, 'df_food_national (dense joins)')
+    return national[0], national[1]
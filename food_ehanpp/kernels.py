@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Fused allocation kernels
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: allocation (pipeline.allocate) and national summation (pipeline.aggregate_national)
+in one pass over the rows of the master table. Every column of df_food_6 is written into a
+pre-sized output array and added to the national sums of its row in the same pass, instead
+of one full-length temporary per pandas expression:
+
+    kcal_traded = tonnes_traded_dm / dm_content * 10^6 * kcal/g,  kcal/cap/day
+    FeH and kcal urban/rural of the three estimates (see pipeline.urban_rural), per capita
+    values (rural population 0: missing), derivatives (see food_ehanpp.sensitivity)
+    national sums by NATIONAL_KEYS (missing values count as 0)
+
+With numba installed, the row loop is compiled (numba is optional, it is not part of
+ENVIRONMENT.YML). Without numba, the same formulas as pipeline.allocate are evaluated with
+NumPy in blocks of BLOCK_ROWS rows, so the temporaries have the size of a block.
+
+Usage:
+    results = run(inputs=inputs)                 # as pipeline.run
+    df_food_6, df_food_national = allocate_national(results.df_food_5, results.df_pop_nat)
+"""
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.pipeline import LINK, NATIONAL_COLUMNS, NATIONAL_KEYS, aggregate_regional, load, national_table, urban_rural
+from food_ehanpp.scenarios import BOUNDS
+from food_ehanpp.sensitivity import derivative_expressions
+from food_ehanpp.validation import RTOL, check_master_table
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# columns of df_food_6 written by the kernel (national columns without HANPP_embodied_in_trade)
+OUTPUT_COLUMNS = NATIONAL_COLUMNS[1:]
+# summed columns: HANPP_embodied_in_trade and all output columns
+SUM_COLUMNS = NATIONAL_COLUMNS
+
+# outputs of every estimate ({} = scenario of BOUNDS) and outputs computed once per row
+ESTIMATE_OUTPUTS = ['FeH_urban_{}', 'FeH_rural_{}', 'FeH_urban_cap_{}', 'FeH_rural_cap_{}',
+                    'dFeH_urban_dshare_{}', 'dFeH_rural_dshare_{}', 'dFeH_urban_dlnratio_{}', 'dFeH_rural_dlnratio_{}',
+                    'kcal_urban_{}', 'kcal_rural_{}']
+SINGLE_OUTPUTS = ['kcal_traded', 'kcal/cap/day', 'kcal_urb_cap_median', 'kcal_rur_cap_median']
+MEDIAN = list(BOUNDS).index('median') # estimate with kcal per capita
+
+BLOCK_ROWS = 1 << 16
+
+
+def output_positions():
+    """Rows of the output array by column name, for the compiled kernel: per estimate (order of
+    BOUNDS) the positions of ESTIMATE_OUTPUTS, and the positions of the kcal columns of SINGLE_OUTPUTS."""
+    position = {column: k for k, column in enumerate(OUTPUT_COLUMNS)}
+    per_estimate = np.array([[position[column.format(scenario)] for column in ESTIMATE_OUTPUTS] for scenario in BOUNDS],
+                            dtype=np.int64)
+    single = np.array([position[column] for column in SINGLE_OUTPUTS], dtype=np.int64)
+    return per_estimate, single
+
+
+def _fused_rows(HANPP, tonnes, dm_content, kcal_g, pop_national, share, urban_pop, rural_pop,
+                gdd_urban, gdd_rural, groups, per_estimate, single, median, out, sums):
+    """Row loop (compiled by numba): out[column, row] at the positions of output_positions
+    (per_estimate, single), sums[group, column] in the order of SUM_COLUMNS (HANPP, then the
+    output rows). gdd_urban/gdd_rural are tuples of the GDD columns of the estimates in the
+    order of BOUNDS; rows with group -1 are not summed."""
+    n_scenarios = len(gdd_urban)
+    for i in range(HANPP.shape[0]):
+        H = HANPP[i]
+        s = share[i]
+        urban = urban_pop[i]
+        rural = rural_pop[i]
+        rural_nonzero = rural if rural != 0 else np.nan
+        H_nonzero = H if H != 0 else np.nan
+
+        kcal = tonnes[i] / dm_content[i] * 1000 * 1000 * kcal_g[i]
+        out[single[0], i] = kcal
+        out[single[1], i] = (kcal / pop_national[i]) / 365
+
+        for j in range(n_scenarios):
+            p = per_estimate[j]
+            gu = gdd_urban[j][i]
+            gr = gdd_rural[j][i]
+            weight_urban = gu * urban
+            weight_rural = gr * rural
+            FeH_urban = (weight_urban / (weight_urban + weight_rural)) * H
+            FeH_rural = (weight_rural / (weight_urban + weight_rural)) * H
+            out[p[0], i] = FeH_urban
+            out[p[1], i] = FeH_rural
+            out[p[2], i] = FeH_urban / urban
+            out[p[3], i] = FeH_rural / rural_nonzero
+
+            weight = gu * s + gr * (1 - s)
+            weight_nonzero = weight if weight != 0 else np.nan
+            dshare = H * gu * gr / weight_nonzero ** 2
+            dlnratio = FeH_urban * FeH_rural / H_nonzero
+            out[p[4], i] = dshare
+            out[p[5], i] = -dshare
+            out[p[6], i] = dlnratio
+            out[p[7], i] = -dlnratio
+
+            kcal_urban = (weight_urban / (weight_urban + weight_rural)) * kcal
+            kcal_rural = (weight_rural / (weight_urban + weight_rural)) * kcal
+            out[p[8], i] = kcal_urban
+            out[p[9], i] = kcal_rural
+            if j == median:
+                out[single[2], i] = (kcal_urban / urban) / 365
+                out[single[3], i] = kcal_rural / rural_nonzero / 365
+
+        g = groups[i]
+        if g >= 0:
+            if H == H:
+                sums[g, 0] += H
+            for k in range(out.shape[0]):
+                value = out[k, i]
+                if value == value:
+                    sums[g, k + 1] += value
+
+
+_fused_rows_compiled = numba.njit(cache=True, nogil=True, error_model='numpy')(_fused_rows) if numba is not None else None
+
+
+def _nonzero(x):
+    return np.where(x != 0, x, np.nan)
+
+
+def _fused_blocks(columns, groups, out, sums, block_rows=BLOCK_ROWS):
+    """NumPy fallback of _fused_rows: the formulas of pipeline.allocate on blocks of rows."""
+    n_groups = sums.shape[0]
+    for start in range(0, len(groups), block_rows):
+        block = {name: values[start:start + block_rows] for name, values in columns.items()}
+        c = block.__getitem__
+        kcal = c('tonnes_traded_dm') / c('dm_content') * 1000 * 1000 * c('kcal/g')
+        values = {'kcal_traded': kcal, 'kcal/cap/day': (kcal / c('pop_national')) / 365}
+        rural_nonzero = _nonzero(c('rural population'))
+        for scenario, (gdd_urban, gdd_rural) in BOUNDS.items():
+            urban, rural = urban_rural(c, gdd_urban, gdd_rural, 'HANPP_embodied_in_trade')
+            block[f'FeH_urban_{scenario}'], block[f'FeH_rural_{scenario}'] = urban, rural
+            values.update({f'FeH_urban_{scenario}': urban, f'FeH_rural_{scenario}': rural,
+                           f'FeH_urban_cap_{scenario}': urban / c('urban population'),
+                           f'FeH_rural_cap_{scenario}': rural / rural_nonzero})
+        values.update(derivative_expressions(c, _nonzero))
+        block['kcal_traded'] = kcal
+        for scenario, (gdd_urban, gdd_rural) in BOUNDS.items():
+            values[f'kcal_urban_{scenario}'], values[f'kcal_rural_{scenario}'] = urban_rural(c, gdd_urban, gdd_rural, 'kcal_traded')
+        values['kcal_urb_cap_median'] = (values['kcal_urban_median'] / c('urban population')) / 365
+        values['kcal_rur_cap_median'] = values['kcal_rural_median'] / rural_nonzero / 365
+
+        stop = start + len(kcal)
+        group = groups[start:stop]
+        counted = group >= 0
+        for k, column in enumerate(SUM_COLUMNS):
+            value = block[column] if k == 0 else values[column]
+            if k:
+                out[k - 1, start:stop] = value
+            value = np.where(np.isnan(value), 0, value)[counted]
+            sums[:, k] += np.bincount(group[counted], weights=value, minlength=n_groups)
+
+
+def allocate_national(df_food_5, df_pop_nat, rtol=RTOL, compiled=None):
+    """df_food_6 and df_food_national of the master table df_food_5 in one pass (see module description).
+
+    compiled: numba kernel (True), NumPy blocks (False) or numba if installed (None).
+    """
+    if compiled is None:
+        compiled = numba is not None
+    if compiled and numba is None:
+        raise ImportError('the compiled kernel needs numba')
+
+    def numbers(column):
+        values = pd.to_numeric(df_food_5[column], errors='coerce').to_numpy(dtype='float64')
+        return np.ascontiguousarray(values) # no copy for float64 columns
+
+    columns = {column: numbers(column) for column in ['HANPP_embodied_in_trade', 'tonnes_traded_dm', 'dm_content', 'kcal/g',
+                                                      'pop_national', 'pop_urb_share', 'urban population', 'rural population']}
+    columns.update({column: numbers(column) for bounds in BOUNDS.values() for column in bounds})
+    groupby = df_food_5.groupby(NATIONAL_KEYS, sort=True, observed=True)
+    groups = groupby.ngroup().fillna(-1).to_numpy(dtype='int64') # -1: missing key (NaN of ngroup), not summed as in groupby
+    index = groupby.size().index
+
+    out = np.empty((len(OUTPUT_COLUMNS), len(df_food_5)))
+    sums = np.zeros((len(index), len(SUM_COLUMNS)))
+    if compiled:
+        _fused_rows_compiled(columns['HANPP_embodied_in_trade'], columns['tonnes_traded_dm'], columns['dm_content'],
+                             columns['kcal/g'], columns['pop_national'], columns['pop_urb_share'],
+                             columns['urban population'], columns['rural population'],
+                             tuple(columns[urban] for urban, _ in BOUNDS.values()),
+                             tuple(columns[rural] for _, rural in BOUNDS.values()), groups,
+                             *output_positions(), MEDIAN, out, sums)
+    else:
+        _fused_blocks(columns, groups, out, sums)
+
+    df_food_6 = df_food_5.drop(['dm_content','kcal/g'], axis=1)
+    df_food_6 = pd.concat([df_food_6.reset_index(drop=True),
+                           pd.DataFrame(dict(zip(OUTPUT_COLUMNS, out)))], axis=1)
+    check_master_table(df_food_6, rtol=rtol)
+
+    df_food_national = pd.DataFrame(sums, index=index, columns=SUM_COLUMNS).reset_index()
+    return df_food_6, national_table(df_food_national, df_pop_nat)
+
+
+def run(path='.', link=LINK, inputs=None, compiled=None):
+    """All calculation stages with the fused allocation and national summation; returns Results like pipeline.run."""
+    from food_ehanpp import joins
+
+    if inputs is None:
+        inputs = load(path, link)
+    results = joins.prepare(inputs)
+    results.df_food_6, results.df_food_national = allocate_national(results.df_food_5, results.df_pop_nat, compiled=compiled)
+    results.df_food_groups, results.df_food_regional = aggregate_regional(
+        results.df_food_national, results.df_classification, results.df_pop_groups)
+    return results
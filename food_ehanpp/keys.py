@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Categorical key columns
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: one dictionary of the values of every join and group-by key (Destination,
+Final_use, primary_product, food_group, income_group, GDD_code, GDD_item_code, GDD_item),
+built once from the loaded inputs. All tables of a run store these columns as categoricals
+with the same categories, so merges and group-bys work on small integer codes instead of
+hashing Python strings, and the columns take 1-2 bytes per row instead of a pointer to a
+string object.
+
+The values the stages write into key columns ('Infrastructure', 'Infra', 'XX') are part of
+the dictionary. Results from national level on are decoded to plain strings again.
+
+The code columns are not part of the dictionary. primary_product_Code (product codes and the
+string 'Infrastructure') is converted to numbers by the stages for the merges with products,
+factors and food supply (add_food_groups, add_food_supply), and infrastructure rows are
+selected by comparing it with 'Infrastructure'; categorical codes would break both. The dense
+joins (default) convert it to numbers once per run. Destination_code_FAO is a float column,
+so it is already hashed as numbers and not as Python objects.
+
+Usage:
+    inputs = pipeline.load('.')                       # categorical keys (default)
+    inputs.keys.dtypes['food_group'].categories
+"""
+
+import pandas as pd
+
+from food_ehanpp.grouping import income_group_vintages
+
+
+KEY_COLUMNS = ['Destination', 'Final_use', 'primary_product', 'food_group', 'income_group',
+               'GDD_code', 'GDD_item_code', 'GDD_item']
+
+# values written by the stages (infrastructure, stimulants without GDD item)
+STAGE_VALUES = {'primary_product': ['Infrastructure'], 'food_group': ['Infrastructure', 'Infra'],
+                'GDD_item_code': ['Infra'], 'GDD_item': ['Infra', 'XX']}
+
+
+class KeyDictionary:
+    """Categories of all key columns, shared by all tables of a run."""
+
+    def __init__(self, values):
+        self.dtypes = {column: pd.CategoricalDtype(sorted(values[column], key=str)) for column in KEY_COLUMNS}
+
+    @classmethod
+    def from_tables(cls, tables, extra=None):
+        """Dictionary of the key values of the tables plus extra (column -> values) and the stage values."""
+        values = {column: set(STAGE_VALUES.get(column, [])) for column in KEY_COLUMNS}
+        for column, column_values in (extra or {}).items():
+            values[column].update(column_values)
+        for df in tables:
+            for column in KEY_COLUMNS:
+                if column in df.columns:
+                    values[column].update(df[column].dropna().unique())
+        return cls(values)
+
+    @classmethod
+    def from_inputs(cls, inputs):
+        """Dictionary of loaded Inputs (eHANPP, food supply, GDD, products and country groups)."""
+        df0_countries = inputs.look_up['country_groups']
+        extra = {'income_group': income_group_vintages(df0_countries).stack().unique(),
+                 'GDD_code': df0_countries['GDD_code'].dropna().unique()}
+        return cls.from_tables([inputs.df_food, inputs.df0_food_supply, inputs.look_up['products']] + list(inputs.GDD.values()),
+                               extra)
+
+    def encode(self, df):
+        """df with its key columns as categoricals of the dictionary."""
+        types = {column: dtype for column, dtype in self.dtypes.items()
+                 if column in df.columns and df[column].dtype != dtype}
+        return df.astype(types) if types else df
+
+    def encode_inputs(self, inputs):
+        """Inputs with encoded eHANPP, food supply, GDD and products tables; the dictionary is inputs.keys."""
+        look_up = dict(inputs.look_up, products=self.encode(inputs.look_up['products']))
+        return type(inputs)(df_food=self.encode(inputs.df_food), look_up=look_up,
+                            GDD={estimate: self.encode(df) for estimate, df in inputs.GDD.items()},
+                            df0_food_supply=self.encode(inputs.df0_food_supply), keys=self)
+
+
+def encode(inputs, df):
+    """df with categorical keys if the inputs were loaded with a key dictionary, otherwise df."""
+    keys = getattr(inputs, 'keys', None)
+    return df if keys is None else keys.encode(df)
+
+
+def decode(df):
+    """df with categorical columns as plain (object) columns."""
+    types = {column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    return df.astype(types) if types else df
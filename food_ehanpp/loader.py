@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Prefetching input loader
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: starts all reads of the pipeline inputs at once instead of one after the other:
+
+    eHANPP csv (read and summed up by Destination)   process   (CPU: csv parser and group-by)
+    look_up.xlsx, all sheets in one task             process   (CPU: openpyxl is pure Python)
+    GDD csv of the three estimates                   thread    (I/O: download / disk)
+    food supply csv                                  thread    (I/O)
+
+The reads return futures; prefetch returns Inputs whose tables are these futures and are
+waited for when a stage first uses them (inputs.df_food, inputs.look_up['products'],
+inputs.GDD['median'], ...), so the small tables are ready while the eHANPP csv is still
+being summed up. The workbook is parsed once (pipeline.load_look_up); every sheet has its own
+future, which is done when the workbook has been read. With categorical keys, the key dictionary (food_ehanpp.keys) needs the
+values of all tables: it is built in a background thread once all reads have finished, and
+the tables with key columns (eHANPP, food supply, GDD, products) are futures of their encoded
+versions. prefetch still returns at once, and the sheets without key columns (country groups,
+population, factors) are used as soon as they are read.
+
+Processes are started with forkserver (spawn on Windows), never by forking the calling
+process: a fork copies the locks of threads that may be running (e.g. of an earlier load or
+of pandas/NumPy), and the worker can then block forever. Scripts that call load have to be
+guarded by if __name__ == '__main__'.
+
+Usage:
+    inputs = prefetch('.')              # returns at once, reads run in the background
+    results = run(inputs=inputs)
+"""
+
+import multiprocessing
+import os
+from collections.abc import Mapping
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from food_ehanpp.keys import KeyDictionary
+from food_ehanpp.pipeline import (EHANPP_FILE, FOOD_SUPPLY_FILE, GDD_FILES, LINK, LOOK_UP_SHEETS, Inputs,
+                                  load_ehanpp, load_look_up, read_food_supply, read_gdd)
+
+
+THREADS = len(GDD_FILES) + 1
+PROCESSES = min(2, os.cpu_count() or 1) # eHANPP csv and look_up.xlsx
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class FutureMapping(Mapping):
+    """Mapping of names to futures: a value is the result of its future (waited for on first access)."""
+
+    def __init__(self, futures):
+        self._futures = futures
+
+    def __getitem__(self, key):
+        return self._futures[key].result()
+
+    def __iter__(self):
+        return iter(self._futures)
+
+    def __len__(self):
+        return len(self._futures)
+
+    def done(self):
+        return all(future.done() for future in self._futures.values())
+
+    def futures(self):
+        """Names -> futures (without waiting)."""
+        return dict(self._futures)
+
+
+def item_futures(future, keys):
+    """Futures of the values of the mapping returned by future (done when future is done)."""
+    items = {key: Future() for key in keys}
+
+    def done(future):
+        for key, item in items.items():
+            if future.exception() is not None:
+                item.set_exception(future.exception())
+            else:
+                item.set_result(future.result()[key])
+
+    future.add_done_callback(done)
+    return items
+
+
+class PrefetchedInputs(Inputs):
+    """Inputs whose tables may be futures of the loader: df_food and df0_food_supply are
+    waited for on first access, look_up and GDD are FutureMappings."""
+
+    def __init__(self, futures=None, **tables):
+        super().__init__(**tables)
+        self._futures = dict(futures or {})
+
+    def __getattr__(self, name):
+        futures = self.__dict__.get('_futures', {})
+        if name not in futures:
+            raise AttributeError(name)
+        value = futures[name].result() # the future is kept: other threads may wait for it at the same time
+        setattr(self, name, value) # wait only once
+        return value
+
+    def result(self):
+        """Plain Inputs with all tables (waits for all reads)."""
+        return Inputs(df_food=self.df_food, look_up=dict(self.look_up), GDD=dict(self.GDD),
+                      df0_food_supply=self.df0_food_supply)
+
+
+def prefetch(path='.', link=LINK, threads=THREADS, processes=PROCESSES, GDD=None, categorical=False):
+    """Start all input reads (see module description); returns PrefetchedInputs at once.
+    GDD tables that are passed (estimate -> data frame) are not read. With categorical, the
+    tables with key columns are encoded with a key dictionary of all tables (encode_prefetched)."""
+    process_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(START_METHOD))
+    thread_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='food_ehanpp_loader')
+
+    #largest read first; the workbook is read once in the other process
+    df_food = process_pool.submit(load_ehanpp, os.path.join(path, EHANPP_FILE))
+    look_up = item_futures(process_pool.submit(load_look_up, link), LOOK_UP_SHEETS)
+    if GDD is None:
+        GDD = FutureMapping({estimate: thread_pool.submit(read_gdd, link + '/' + file, estimate) for estimate, file in GDD_FILES.items()})
+    df0_food_supply = thread_pool.submit(read_food_supply, os.path.join(path, FOOD_SUPPLY_FILE))
+
+    #no new tasks: the pools finish the submitted reads and then stop their workers
+    process_pool.shutdown(wait=False)
+    thread_pool.shutdown(wait=False)
+    inputs = PrefetchedInputs(futures={'df_food': df_food, 'df0_food_supply': df0_food_supply},
+                              look_up=FutureMapping(look_up), GDD=GDD)
+    return encode_prefetched(inputs, threads) if categorical else inputs
+
+
+def encode_prefetched(inputs, threads=THREADS):
+    """PrefetchedInputs with a key dictionary of all tables (future inputs.keys, built when all
+    reads have finished) and futures of the encoded eHANPP, food supply, GDD and products tables;
+    the other sheets of look_up.xlsx are the futures of their reads."""
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='food_ehanpp_keys')
+    #submitted first, so it has a worker while the encodings wait for it
+    keys = pool.submit(lambda: KeyDictionary.from_inputs(inputs.result()))
+
+    def encoded(table):
+        return pool.submit(lambda: keys.result().encode(table()))
+
+    look_up = inputs.look_up.futures()
+    look_up['products'] = encoded(lambda: inputs.look_up['products'])
+    GDD = {estimate: encoded(lambda estimate=estimate: inputs.GDD[estimate]) for estimate in inputs.GDD}
+    futures = {'df_food': encoded(lambda: inputs.df_food), 'df0_food_supply': encoded(lambda: inputs.df0_food_supply),
+               'keys': keys}
+    pool.shutdown(wait=False)
+    return PrefetchedInputs(futures=futures, look_up=FutureMapping(look_up), GDD=FutureMapping(GDD))
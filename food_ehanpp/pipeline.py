@@ -0,0 +1,585 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Food-eHANPP calculation pipeline
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: the calculation of MAIN_CALCULATION_AND_FIGURES.PY as one function per stage,
+so that it can be called (and loaded data reused) from other code:
+
+    load            read eHANPP, look_up.xlsx, GDD and food supply data     -> Inputs (concurrent reads)
+    prepare         countries, food groups, population, GDD and kcal data  -> df_food_5 (master table)
+    allocate        urban/rural Food-eHANPP and kcal (median, high, low)   -> df_food_6
+    aggregate_national / aggregate_regional                                -> df_food_national, df_food_regional
+    run             all stages                                             -> Results
+
+dask is only imported when the eHANPP csv is read, figures are in food_ehanpp.figures.
+
+Usage:
+    inputs = load('.')
+    results = run(inputs=inputs)
+    results.df_food_regional
+"""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.grouping import aggregate_groups, country_classification, select_scheme
+from food_ehanpp.keys import KeyDictionary, decode, encode
+from food_ehanpp.scenarios import BOUNDS
+from food_ehanpp.sensitivity import add_derivatives, add_elasticities, derivative_columns, elasticity_columns
+from food_ehanpp.validation import RTOL, check_master_table, check_no_nans, report_nans
+
+
+LINK = r'https://raw.githubusercontent.com/lisakaufmannsec/Food-eHANPP/main'
+
+EHANPP_FILE = 'embodied_HANPP_all_uses_incl_ap_all_cl_gl_resid_infra_by_animal_products_zenodo.csv'
+FOOD_SUPPLY_FILE = 'food_supply.csv'
+
+# sheets of look_up.xlsx used by the calculation
+LOOK_UP_SHEETS = ['country_groups', 'products', 'total_population', 'urban_population', 'factors']
+
+# GDD urban/rural intakes: estimate -> file
+GDD_FILES = {'median': 'GDD_data_collection_median_random.csv',
+             'upper': 'GDD_data_collection_upperci_95_random.csv',
+             'lower': 'GDD_data_collection_lowerci_95_random.csv'}
+
+GDD_COLUMNS = ['GDD_urban_median','GDD_rural_median','GDD_urban_upper','GDD_rural_upper','GDD_urban_lower','GDD_rural_lower']
+
+# Somalia: column filled from Ethiopia -> column whose gaps select the rows (as in add_gdd)
+SOMALIA_SELECTION = {'GDD_urban_median': 'GDD_urban_lower', 'GDD_rural_median': 'GDD_rural_median',
+                     'GDD_urban_upper': 'GDD_rural_median', 'GDD_rural_upper': 'GDD_rural_upper',
+                     'GDD_urban_lower': 'GDD_rural_upper', 'GDD_rural_lower': 'GDD_rural_lower'}
+
+# columns of df_food_3/df_food_4 used by the calculation, checked for NaNs (other columns of the
+# GDD csv, e.g. its index column 'Unnamed: 0', are missing on stimulant and infrastructure rows)
+FOOD_4_COLUMNS = (['Destination_code_FAO','Destination','income_group','GDD_code','Year','Final_use','food_group',
+                   'primary_product','primary_product_Code','GDD_item_code','GDD_item','HANPP_embodied_in_trade'] + GDD_COLUMNS)
+
+
+class Inputs(SimpleNamespace):
+    """Loaded input tables: df_food (eHANPP by country of consumption), look_up (sheet name -> data frame),
+    GDD (estimate -> data frame) and df0_food_supply. Can be reused for several runs."""
+
+
+class Results(SimpleNamespace):
+    """Tables of a run: df_food_5/df_food_6 (master table before/after allocation), df_food_national,
+    df_food_groups (all country groupings), df_food_regional (income groups), population tables
+    (df_pop_nat, df_pop_groups, df_pop_reg), df_countries and df_classification."""
+
+
+###############################################################################
+##                    Load and organise eHANPP dataset                       ##
+###############################################################################
+
+def load_ehanpp(file):
+    """Read the eHANPP csv with dask and sum it up by Destination (country of consumption)."""
+    import dask.dataframe as dd
+
+    ddf = dd.read_csv(file, dtype={'Destination_code_FAO': 'float64','primary_product_Code': 'object', 'Origin_code_FAO': 'float64'})
+
+    df_all = ddf.compute()# Convert the Dask DataFrame to a pandas DataFrame
+
+    # Undo specification that has been done for Zenodo:
+    df_all['primary_product'] = df_all['primary_product'].replace('Agri. Infrastructure', 'Infrastructure')
+
+    df_all['primary_product_Code'] = df_all['primary_product_Code'].replace('Agri.Infra', 'Infrastructure')
+
+    #Select only Food Items = drop Unknown and other uses
+    df_food = df_all.loc[~df_all['Final_use'].isin(['Unknown', 'Other uses'])]
+
+    #reduce dataframe volume by summing up by Destination = Country of consumption:
+    df_food = df_food.groupby(['Destination','Destination_code_FAO','Year','Final_use',
+                               'primary_product','primary_product_Code']).sum(
+                                   'HANPP_embodied_in_trade').reset_index().drop(
+                                       'Origin_code_FAO', axis=1)
+    return df_food
+
+
+def load_look_up(link=LINK):
+    """Sheets of look_up.xlsx (sheet name -> data frame), the workbook is read once."""
+    return pd.read_excel(link + '/look_up.xlsx', sheet_name=LOOK_UP_SHEETS)
+
+
+def read_gdd(file, estimate):
+    """GDD urban/rural data of one estimate with columns GDD_urban_<estimate>/GDD_rural_<estimate>."""
+    df0_GDD_data = pd.read_csv(file, encoding='latin-1')
+    return df0_GDD_data.rename(columns={'Country': 'GDD_code','GDD_urban': f'GDD_urban_{estimate}','GDD_rural': f'GDD_rural_{estimate}'})
+
+
+def load_gdd(link=LINK):
+    """GDD urban/rural data of the three estimates (median, upper, lower)."""
+    return {estimate: read_gdd(link + '/' + file, estimate) for estimate, file in GDD_FILES.items()}
+
+
+def read_food_supply(file):
+    """Food supply (t dm) per country, year and product."""
+    return pd.read_csv(file, encoding='latin-1')
+
+
+def load(path='.', link=LINK, categorical=True, prefetch=True, GDD=None):
+    """Load all inputs; the eHANPP and food supply csv are read from path, look_up.xlsx and GDD data from link.
+
+    GDD (estimate -> data frame, e.g. from food_ehanpp.gdd.gdd_tables) replaces the GDD csv.
+    With prefetch, all reads run at the same time (food_ehanpp.loader) and the tables are
+    waited for when they are used. With categorical, the key columns of all tables are
+    categoricals of one key dictionary (inputs.keys, see food_ehanpp.keys); the tables with
+    key columns are then ready only when all reads have finished.
+    """
+    if prefetch:
+        from food_ehanpp.loader import prefetch as start_reads
+        return start_reads(path, link, GDD=GDD, categorical=categorical)
+    inputs = Inputs(df_food=load_ehanpp(os.path.join(path, EHANPP_FILE)),
+                    look_up=load_look_up(link),
+                    GDD=GDD if GDD is not None else load_gdd(link),
+                    df0_food_supply=read_food_supply(os.path.join(path, FOOD_SUPPLY_FILE)))
+    if categorical:
+        inputs = KeyDictionary.from_inputs(inputs).encode_inputs(inputs)
+    return inputs
+
+
+###############################################################################
+##                            Master table                                   ##
+###############################################################################
+
+def country_table(df0_countries):
+    """Income group (2020) and GDD code per Destination_code_FAO."""
+    return df0_countries[['code_FAO',2020,'GDD_code']].rename(columns={'code_FAO': 'Destination_code_FAO', 2020: 'income_group'})
+
+
+def add_countries(df_food, df0_countries):
+    """Add income groups and GDD codes and dismiss countries that are not considered --> df_food_1.
+
+    Reduces n countries from 217 to 191 (later removal North Korea: 190).
+    """
+    df_countries = country_table(df0_countries)
+
+    df_food_1 = df_food.merge(df_countries, how='left', on=['Destination_code_FAO'])
+    df_food_1 = df_food_1.dropna(subset=['income_group'])
+
+    #Reorder columns:
+    df_food_1 = df_food_1[['Destination_code_FAO','Destination','GDD_code','income_group','Year',
+                           'Final_use','primary_product_Code','primary_product','HANPP_embodied_in_trade']]
+    return df_food_1, df_countries
+
+
+def add_food_groups(df_food_1, df0_products):
+    """Add food groups --> df_food_2 and the infrastructure rows df_infra.
+
+    This requires a separation of infrastructure data, an addition of the food-group infra column and then back with infra data.
+    """
+    #infra extra and add food group infra
+    df_infra = df_food_1.loc[df_food_1['primary_product_Code'] == 'Infrastructure']
+    df_infra = df_infra.assign(food_group='Infrastructure')
+
+    #removing infra
+    df_food_2 = df_food_1.loc[df_food_1['primary_product_Code'] != 'Infrastructure'].copy()
+    df_food_2['primary_product_Code'] = pd.to_numeric(df_food_2['primary_product_Code'])
+
+    # join food groups
+    df_food_groups = df0_products[['primary_product_Code','food_group']].drop_duplicates()
+
+    df_food_2 = df_food_2.merge(df_food_groups, how = 'left', on='primary_product_Code')
+
+    #concat infra
+    df_food_2 = pd.concat([df_food_2,df_infra])
+
+    #check nans:
+    report_nans(df_food_2, 'df_food_2')
+    return df_food_2, df_infra
+
+
+def national_population(df0_pop_tot, df0_pop_urb, df_food_1=None):
+    """Total, urban and rural population per considered country and year (of df_food_1, all if None)."""
+    df_pop_tot_nat = df0_pop_tot.drop(['Unnamed: 0','Unnamed: 1','Country','world_region','GDD_code'], axis=1)
+    df_pop_tot_nat = df_pop_tot_nat.set_index(['code_FAO'])
+    df_pop_tot_nat = df_pop_tot_nat.stack().reset_index()
+    df_pop_tot_nat = df_pop_tot_nat.rename(columns={'code_FAO': 'Destination_code_FAO','level_1': 'Year', 0: 'pop_national'})
+    df_pop_tot_nat['pop_national'] = df_pop_tot_nat['pop_national'] * 1000 # Umrechnung von 1000 cap zu cap
+    df_pop_tot_nat = df_pop_tot_nat.drop(df_pop_tot_nat[df_pop_tot_nat['Year'] == 'GDD_superregion'].index)
+    df_pop_tot_nat['pop_national'] = df_pop_tot_nat['pop_national'].astype(float)
+
+    #merge with considered countries so that countries like Russia/USSR not counted twice
+    if df_food_1 is not None:
+        df_countries_pop = df_food_1[['Year','Destination_code_FAO']].drop_duplicates()
+        df_pop_tot_nat = df_countries_pop.merge(df_pop_tot_nat, how='left', on=['Destination_code_FAO','Year'])
+
+    #Urban population
+    df_pop_urb = df0_pop_urb.drop(['SHARE','Unnamed: 1','Country','world_region','GDD_code'], axis=1)
+    df_pop_urb= df_pop_urb.set_index(['code_FAO'])
+    df_pop_urb = df_pop_urb.stack().reset_index()
+    df_pop_urb = df_pop_urb.rename(columns={'code_FAO': 'Destination_code_FAO','level_1': 'Year', 0: 'pop_urb_share'})
+    df_pop_urb['pop_urb_share'] = df_pop_urb['pop_urb_share'] / 100 # Conversion from % to decimal number
+
+    #add to total national population
+    df_pop_nat = df_pop_tot_nat.merge(df_pop_urb, how = 'left', on=['Destination_code_FAO','Year'] )
+    df_pop_nat['urban population'] = df_pop_nat['pop_national'] * df_pop_nat['pop_urb_share']
+    df_pop_nat['rural population'] = df_pop_nat['pop_national'] - df_pop_nat['urban population']
+    return df_pop_nat
+
+
+def group_population(df_pop_nat, df_classification):
+    """Population of all country groupings including urban population and urban share."""
+    df_pop_groups = aggregate_groups(df_pop_nat, df_classification, keys=[], columns=['pop_national','urban population','rural population'])
+    df_pop_groups = df_pop_groups.rename(columns={'pop_national': 'pop_regional'})
+    df_pop_groups['pop_urb_share'] = df_pop_groups['urban population'] / df_pop_groups['pop_regional']
+    return df_pop_groups
+
+
+def _fill_from_ethiopia(df_food_3, nan_indices, column, df_eth):
+    # Iterate over the nan indices and fill NaN values with corresponding values from 'ETH'
+    for idx in nan_indices:
+        year = df_food_3.loc[idx, 'Year']
+        product = df_food_3.loc[idx, 'GDD_item_code']
+
+        # Find the corresponding value in 'ETH'
+        eth_value = df_eth[(df_eth['Year'] == year) & (df_eth['GDD_item_code'] == product)][column].values[0]
+
+        # Replace NaN with the 'ETH' value
+        df_food_3.at[idx, column] = eth_value
+
+
+def add_gdd(df_food_2, df_infra, df0_products, GDD, df_eth=None):
+    """Add GDD urban/rural data (median, upper, lower) and correct gaps --> df_food_4 (incl. infrastructure).
+
+    df_eth are the GDD values of Ethiopia (columns Year, GDD_item_code, GDD_*) used for the gaps of
+    Somalia; by default the Ethiopia rows of the table itself, i.e. Ethiopia has to be part of df_food_2.
+    """
+    #load Global Dietary Database (GDD) lookup
+    df_GDD_FAO = df0_products.drop(['primary_product','food_group'], axis=1).drop_duplicates()
+
+    #extract infrastructure for merge (and add it later again)
+    df_food_3 = df_food_2.loc[df_food_2['primary_product_Code'] != 'Infrastructure']
+
+    #now GDD codes can be added
+    df_food_3 = df_food_3.merge(df_GDD_FAO, how='left', on=['primary_product_Code'])
+    #Reorder columns:
+    df_food_3 = df_food_3[['Destination_code_FAO','Destination','income_group','GDD_code','Year','Final_use','food_group','primary_product','primary_product_Code','GDD_item_code','GDD_item','HANPP_embodied_in_trade']]
+    #add GDD data
+    df_food_3 = df_food_3.merge(GDD['median'], how='left', on=['GDD_code','Year','GDD_item_code'])
+    df_food_3 = df_food_3.merge(GDD['upper'], how='left', on=['GDD_code','Year','GDD_item_code'])
+    df_food_3 = df_food_3.merge(GDD['lower'], how='left', on=['GDD_code','Year','GDD_item_code'])
+
+    #correct nans:
+        #1 city states: 0 rural population
+    condition_Stadtsaaten = df_food_3['GDD_code'] == 'SGP'
+    df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_median'] = df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_median'].fillna(0)
+    df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_upper'] = df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_upper'].fillna(0)
+    df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_lower'] = df_food_3.loc[condition_Stadtsaaten, 'GDD_rural_lower'].fillna(0)
+
+        #2 Stimulants and Spices are seperated equally between urban and urual due to missing GDD values
+    condition_stimulants = df_food_3['food_group'] == 'Sugars and stimulants'
+    df_food_3.loc[condition_stimulants, 'GDD_rural_median'] = df_food_3.loc[condition_stimulants, 'GDD_rural_median'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_rural_upper'] = df_food_3.loc[condition_stimulants, 'GDD_rural_upper'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_rural_lower'] = df_food_3.loc[condition_stimulants, 'GDD_rural_lower'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_urban_median'] = df_food_3.loc[condition_stimulants, 'GDD_urban_median'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_urban_upper'] = df_food_3.loc[condition_stimulants, 'GDD_urban_upper'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_urban_lower'] = df_food_3.loc[condition_stimulants, 'GDD_urban_lower'].fillna(1)
+    df_food_3.loc[condition_stimulants, 'GDD_item'] = df_food_3.loc[condition_stimulants, 'GDD_item'].fillna('XX')
+
+        #3 no GDD for North Korea: removed
+    df_food_3 = df_food_3.query('GDD_code != "PRK"')
+
+        #4 Somalia has no urban/rural for livestock products. We apply the difference from Ethopia
+        #  (the urban columns are filled on the rows of the preceding NaN selection)
+    if df_eth is None:
+        df_eth = df_food_3[df_food_3['GDD_code'] == 'ETH']
+    nan_indices = df_food_3[(df_food_3['GDD_code'] == 'SOM') & (df_food_3['GDD_urban_lower'].isna())].index
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_urban_median', df_eth)
+    nan_indices = df_food_3[(df_food_3['GDD_code'] == 'SOM') & (df_food_3['GDD_rural_median'].isna())].index
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_rural_median', df_eth)
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_urban_upper', df_eth)
+    nan_indices = df_food_3[(df_food_3['GDD_code'] == 'SOM') & (df_food_3['GDD_rural_upper'].isna())].index
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_rural_upper', df_eth)
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_urban_lower', df_eth)
+    nan_indices = df_food_3[(df_food_3['GDD_code'] == 'SOM') & (df_food_3['GDD_rural_lower'].isna())].index
+    _fill_from_ethiopia(df_food_3, nan_indices, 'GDD_rural_lower', df_eth)
+
+    check_no_nans(df_food_3, 'df_food_3', FOOD_4_COLUMNS) #! should be 0 rows
+
+    #df-food 4 = df_food_3 + Food_infra:
+    #add infrastrcuture again
+    df_infra = df_infra.copy()
+    df_infra[['GDD_item_code','GDD_item','food_group']] = 'Infra'
+    df_infra[['GDD_urban_median','GDD_rural_median','GDD_urban_upper','GDD_rural_upper','GDD_urban_lower','GDD_rural_lower']] = 1
+
+    df_food_4 = pd.concat([df_food_3, df_infra])
+    check_no_nans(df_food_4, 'df_food_4', FOOD_4_COLUMNS) #! should be 0 rows
+    return df_food_4
+
+
+def add_food_supply(df_food_4, df_pop_nat, df0_food_supply, df0_kcal):
+    """Add population, food supply and kcal factors --> df_food_5 = "Master-Table"."""
+    df_food_supply = df0_food_supply.drop(['Unnamed: 0','food_group','GDD_superregion'], axis=1)
+
+    #kcal
+    df_kcal = df0_kcal[['primary_product_Code','dm_content','kcal/g']]
+
+    #add population
+    df_food_5 = df_food_4.merge(df_pop_nat, how ='left',on=['Destination_code_FAO','Year'])
+
+    #add supply (again Infrastructure needs to cut and add)
+    df_infra_5 = df_food_5.loc[df_food_5['primary_product'] == 'Infrastructure']
+    df_food_5 = df_food_5.loc[df_food_5['primary_product'] != 'Infrastructure'].copy()
+    df_food_5['primary_product_Code'] = df_food_5['primary_product_Code'].astype(float)
+    df_food_5 = df_food_5.merge(df_food_supply, how = 'left', on= ['Destination_code_FAO','Destination',
+                                                                   'GDD_code','Year','primary_product','primary_product_Code'])
+    #add kcal
+    df_food_5 = df_food_5.merge(df_kcal, how = 'left', on= ['primary_product_Code'])
+    #add infra again
+    df_infra_5 = df_infra_5.assign(tonnes_traded_dm=np.nan) #float, so that the kcal columns derived from it stay numeric
+    return pd.concat([df_food_5,df_infra_5])
+
+
+def prepare(inputs):
+    """Master table df_food_5 plus country and population tables of the loaded inputs."""
+    #Add regions and dismiss countries that are not considered --> Food_1
+    df0_countries = inputs.look_up['country_groups']
+    df_food_1, df_countries = add_countries(inputs.df_food, df0_countries)
+    df_food_1 = encode(inputs, df_food_1)
+
+    #country groupings for all aggregations: income groups (classification vintage by year), world regions, GDD (super)regions
+    df_classification = country_classification(df0_countries, sorted(df_food_1['Year'].unique()))
+
+    #Add food groups --> Food2
+    df_food_2, df_infra = add_food_groups(df_food_1, inputs.look_up['products'])
+    df_food_2 = encode(inputs, df_food_2) #infrastructure rows come back as strings
+
+    #add population data
+    df_pop_nat = national_population(inputs.look_up['total_population'], inputs.look_up['urban_population'], df_food_1)
+    df_pop_groups = group_population(df_pop_nat, df_classification)
+
+    #Urban and rural Food-eHANPP: add GDD data --> Food4
+    df_food_4 = encode(inputs, add_gdd(df_food_2, df_infra, inputs.look_up['products'], inputs.GDD))
+
+    #Food supply in kcal --> Food5
+    df_food_5 = add_food_supply(df_food_4, df_pop_nat, inputs.df0_food_supply, inputs.look_up['factors'])
+
+    return Results(df_food_5=df_food_5, df_countries=df_countries, df_classification=df_classification,
+                   df_pop_nat=df_pop_nat, df_pop_groups=df_pop_groups,
+                   df_pop_reg=select_scheme(df_pop_groups, 'income_group')) #regional = income groups
+
+
+###############################################################################
+#                              Calculations                                   #
+###############################################################################
+
+def urban_rural(c, weight_urban, weight_rural, total):
+    """Urban and rural part of total, split by GDD intake x population.
+
+    c is a column accessor (column name -> pandas Series or polars expression), so the same
+    formula is used by allocate and by the backends of food_ehanpp.backends.
+    """
+    urban = c(weight_urban) * c('urban population')
+    rural = c(weight_rural) * c('rural population')
+    return (urban / (urban + rural)) * c(total), (rural / (urban + rural)) * c(total)
+
+
+def allocate(df_food_5, rtol=RTOL):
+    """Urban/rural Food-eHANPP and kcal of the median, high and low estimate --> df_food_6.
+
+    rtol is the relative tolerance of the checks (larger for float32 tables, see food_ehanpp.precision).
+    """
+    df_food_6 = df_food_5.copy()
+    #Supply in kcal
+    df_food_6['tonnes_traded_fw'] = df_food_6['tonnes_traded_dm'] / df_food_6['dm_content']
+    df_food_6['kcal_traded'] = df_food_6['tonnes_traded_fw'] * 1000 * 1000 * df_food_6['kcal/g']
+    df_food_6['kcal/cap/day'] = (df_food_6['kcal_traded'] / df_food_6['pop_national']) /365
+    df_food_6 = df_food_6.drop(['dm_content','tonnes_traded_fw','kcal/g'], axis=1)
+
+    rural_population = df_food_6['rural population'].where(df_food_6['rural population'] != 0, np.nan)
+
+    #urban/rural median, high estimate (urban lower, rural upper), low estimate (urban upper, rural lower)
+    for scenario, (gdd_urban, gdd_rural) in [('median', ('GDD_urban_median', 'GDD_rural_median')),
+                                             ('hoch', ('GDD_urban_lower', 'GDD_rural_upper')),
+                                             ('niedrig', ('GDD_urban_upper', 'GDD_rural_lower'))]:
+        df_food_6[f'FeH_urban_{scenario}'], df_food_6[f'FeH_rural_{scenario}'] = urban_rural(df_food_6.__getitem__, gdd_urban, gdd_rural, 'HANPP_embodied_in_trade')
+        df_food_6[f'FeH_urban_cap_{scenario}'] =  df_food_6[f'FeH_urban_{scenario}'] / df_food_6['urban population']
+        df_food_6[f'FeH_rural_cap_{scenario}'] = df_food_6[f'FeH_rural_{scenario}'].div(rural_population)
+        columns = [f'FeH_urban_{scenario}', f'FeH_rural_{scenario}', f'FeH_urban_cap_{scenario}', f'FeH_rural_cap_{scenario}']
+        df_food_6[columns] = df_food_6[columns].apply(pd.to_numeric)
+
+    #sensitivity: derivatives of urban/rural FeH (median,high,low) with respect to pop_urb_share and GDD_urban/GDD_rural
+    add_derivatives(df_food_6)
+
+    #urban/rural kcal median,high,low
+    df_food_6['kcal_urban_median'], df_food_6['kcal_rural_median'] = urban_rural(df_food_6.__getitem__, 'GDD_urban_median', 'GDD_rural_median', 'kcal_traded')
+    df_food_6['kcal_urb_cap_median'] =  (df_food_6['kcal_urban_median'] / df_food_6['urban population']) / 365
+    df_food_6['kcal_rur_cap_median'] = df_food_6.kcal_rural_median.div(rural_population)
+    df_food_6['kcal_rur_cap_median'] = df_food_6['kcal_rur_cap_median'] / 365
+
+    #low: urban upper, rural lower
+    df_food_6['kcal_urban_niedrig'], df_food_6['kcal_rural_niedrig'] = urban_rural(df_food_6.__getitem__, 'GDD_urban_upper', 'GDD_rural_lower', 'kcal_traded')
+
+    #high: urban lower, rural upper
+    df_food_6['kcal_urban_hoch'], df_food_6['kcal_rural_hoch'] = urban_rural(df_food_6.__getitem__, 'GDD_urban_lower', 'GDD_rural_upper', 'kcal_traded')
+
+    #check: urban + rural = national (FeH, kcal) and lower <= median <= upper
+    check_master_table(df_food_6, rtol=rtol)
+    return df_food_6
+
+
+###############################################################################
+#                              Aggregation                                    #
+###############################################################################
+
+# keys of the national results
+NATIONAL_KEYS = ['Destination_code_FAO','Destination','income_group','Year','Final_use','food_group']
+
+# summed columns of the national results (compared by the checks of joins, backends and distributed)
+NATIONAL_COLUMNS = (['HANPP_embodied_in_trade','kcal_traded','kcal/cap/day'] +
+                    [f'FeH_{column}_{scenario}' for scenario in BOUNDS for column in ['urban','rural','urban_cap','rural_cap']] +
+                    derivative_columns() +
+                    ['kcal_urban_median','kcal_rural_median','kcal_urb_cap_median','kcal_rur_cap_median',
+                     'kcal_urban_niedrig','kcal_rural_niedrig','kcal_urban_hoch','kcal_rural_hoch'])
+
+
+def sum_by(df, keys):
+    """Sum of the numeric columns of df by keys (keys as columns)."""
+    return df.groupby(keys, observed=True).sum(numeric_only=True).reset_index()
+
+
+def aggregate_national(df_food_6, df_pop_nat, sum_by=sum_by):
+    """Sum the master table up to country, year, final use and food group --> df_food_national.
+
+    sum_by(df, keys) does the summation (food_ehanpp.precision sums float32 tables in float64).
+    """
+    ##for summing up nans should be 0 (numeric columns, the keys have no NaNs and may be categorical):
+    df_food_national = df_food_6.fillna({column: 0 for column in df_food_6.select_dtypes('number').columns})
+    return national_table(sum_by(df_food_national, NATIONAL_KEYS), df_pop_nat)
+
+
+def national_table(df_food_national, df_pop_nat):
+    """National sums of the master table without the columns that are not summable, plus elasticities."""
+    df_food_national = df_food_national.drop(['GDD_urban_median','GDD_rural_median',
+                                              'GDD_urban_upper','GDD_rural_upper',
+                                              'GDD_urban_lower','GDD_rural_lower',
+                                              'pop_urb_share','pop_national','urban population','rural population'],
+                                             axis=1, errors='ignore')
+    #tonnes_traded_dm is not summed up (missing for infrastructure)
+    df_food_national = df_food_national.drop(columns=['tonnes_traded_dm'], errors='ignore')
+
+    #elasticities of national urban/rural FeH with respect to pop_urb_share and GDD_urban/GDD_rural
+    df_share_nat = df_food_national[['Destination_code_FAO','Year']].merge(df_pop_nat[['Destination_code_FAO','Year','pop_urb_share']],
+                                                                           how='left', on=['Destination_code_FAO','Year'])
+    add_elasticities(df_food_national, df_share_nat['pop_urb_share'].to_numpy())
+    return decode(df_food_national) #national results and all further tables with plain string keys
+
+
+def aggregate_regional(df_food_national, df_classification, df_pop_groups, scheme='income_group', sum_by=None):
+    """Sum national results up to all country groupings (df_food_groups) and derive the 3-year averaged
+    per-capita table of one scheme, by default income groups (df_food_regional).
+
+    sum_by(df, keys) replaces the groupby sum of the country groupings (see aggregate_national).
+    """
+    #all country groupings are summed up in one pass
+    df_food_groups = aggregate_groups(df_food_national, df_classification, sum_by=sum_by)
+    return df_food_groups, regional_table(df_food_groups, df_pop_groups, scheme)
+
+
+def regional_table(df_food_groups, df_pop_groups, scheme='income_group'):
+    """3-year averaged per-capita table of one scheme of the country groupings --> df_food_regional.
+
+    The average of a year is centered (previous, same and next year of the table).
+    """
+    df_food_regional = select_scheme(df_food_groups, scheme)
+
+    df_food_regional = df_food_regional.drop(['FeH_urban_cap_median','FeH_rural_cap_median',
+                                              'FeH_urban_cap_hoch','FeH_rural_cap_hoch',
+                                              'FeH_urban_cap_niedrig','FeH_rural_cap_niedrig',
+                                              'kcal/cap/day','kcal_rur_cap_median','kcal_urb_cap_median'] + elasticity_columns(), axis=1)
+
+    #3-year-average:
+    columns_to_average = ['kcal_traded','HANPP_embodied_in_trade','FeH_urban_median','FeH_rural_median',
+                          'FeH_urban_niedrig','FeH_rural_niedrig','FeH_urban_hoch','FeH_rural_hoch',
+                          'kcal_urban_median', 'kcal_rural_median','kcal_urban_niedrig','kcal_rural_niedrig',
+                          'kcal_urban_hoch','kcal_rural_hoch'] + derivative_columns()
+
+    # Calculate the rolling mean and differentiate between groups
+    for column in columns_to_average:
+        df_food_regional[f'{column}_avg'] = df_food_regional.groupby([scheme, 'Final_use', 'food_group'], observed=True)[column].transform(
+            lambda x: x.rolling(window=3, center=True, min_periods=1).mean()
+        )
+    # Fill NaN values with original column values for boundary years (first and last)
+    for column in columns_to_average:
+        df_food_regional[f'{column}_avg'] = df_food_regional[f'{column}_avg'].fillna(df_food_regional[column])
+    df_food_regional = df_food_regional.drop(columns=columns_to_average)
+    # Rename the new columns back to their original names
+    df_food_regional = df_food_regional.rename(columns={f'{column}_avg': column for column in columns_to_average})
+
+    #add population to calculate per capita values
+    df_pop_reg = select_scheme(df_pop_groups, scheme)
+    df_food_regional = df_food_regional.merge(df_pop_reg, how='left', on=[scheme,'Year'])
+
+    #elasticities of regional urban/rural FeH
+    add_elasticities(df_food_regional, df_food_regional['pop_urb_share'])
+
+    for scenario in ['median', 'hoch', 'niedrig']:
+        df_food_regional[f'FeH_urban_cap_{scenario}'] = df_food_regional[f'FeH_urban_{scenario}'] / df_food_regional['urban population']
+        df_food_regional[f'FeH_rural_cap_{scenario}'] = df_food_regional[f'FeH_rural_{scenario}'] / df_food_regional['rural population']
+
+    df_food_regional['kcal/cap/day'] = df_food_regional['kcal_traded'] / df_food_regional['pop_regional'] /365
+
+    for scenario in ['median', 'niedrig', 'hoch']:
+        df_food_regional[f'kcal_urban_cap_{scenario}'] = df_food_regional[f'kcal_urban_{scenario}'] / df_food_regional['urban population'] /365
+        df_food_regional[f'kcal_rural_cap_{scenario}'] = df_food_regional[f'kcal_rural_{scenario}'] / df_food_regional['rural population'] / 365
+    return df_food_regional
+
+
+###############################################################################
+#                                  Run                                        #
+###############################################################################
+
+def run(path='.', link=LINK, inputs=None, dense_joins=True, exact_sums=False):
+    """All calculation stages; pass inputs (from load) to reuse loaded data. Returns Results.
+
+    With dense_joins, the master table is built by food_ehanpp.joins (gathers from dense side
+    tables) instead of the merges of prepare. With exact_sums, national and country group sums
+    are exact and independent of the row order (food_ehanpp.summation).
+    """
+    if inputs is None:
+        inputs = load(path, link)
+    if dense_joins:
+        from food_ehanpp import joins
+        results = joins.prepare(inputs)
+    else:
+        results = prepare(inputs)
+    national_sum_by, group_sum_by = sum_by, None
+    if exact_sums:
+        from food_ehanpp.summation import sum_by as exact_sum_by
+        national_sum_by = group_sum_by = exact_sum_by
+    results.df_food_6 = allocate(results.df_food_5)
+    results.df_food_national = aggregate_national(results.df_food_6, results.df_pop_nat, sum_by=national_sum_by)
+    results.df_food_groups, results.df_food_regional = aggregate_regional(
+        results.df_food_national, results.df_classification, results.df_pop_groups, sum_by=group_sum_by)
+    return results
+
+
+def write_outputs(results, path, figure_data=None, products=False):
+    """Scenario engine, results cube, parquet results, (with figure_data) the SI workbook and
+    (with products) the product-level national results."""
+    from food_ehanpp.export import export_results, write_si_workbook
+    from food_ehanpp.results_cube import write_results_cube
+    from food_ehanpp.scenarios import ScenarioEngine
+
+    #store scenario-invariant parts for what-if scenarios (see food_ehanpp.scenarios)
+    df_food_6 = results.df_food_6
+    if hasattr(df_food_6, 'compute'): # master table of food_ehanpp.distributed stays a dask frame until here
+        df_food_6 = df_food_6.compute()
+    engine = ScenarioEngine.from_master_table(df_food_6, results.df_pop_nat, results.df_classification)
+    engine.save(os.path.join(path, 'scenario_engine.npz'))
+
+    #non-zero product-level national results (see food_ehanpp.product_results)
+    if products:
+        from food_ehanpp.product_results import ProductResults
+        ProductResults.from_master_table(df_food_6).save(os.path.join(path, 'product_results.npz'))
+
+    #store national results as memory-mapped cube (query via food_ehanpp.results_cube)
+    write_results_cube(os.path.join(path, 'results_cube'), results.df_food_national, results.df_pop_nat, results.df_countries)
+
+    #national and regional results plus figure data as parquet, figure data for SI as xlsx
+    export_results(os.path.join(path, 'results'), results.df_food_national, results.df_food_regional,
+                   figure_data, results.df_food_groups)
+    if figure_data:
+        write_si_workbook(os.path.join(path, 'figure_data_SI.xlsx'), figure_data)
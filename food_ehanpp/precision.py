@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Compact (float32) calculation mode
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: opt-in run of the pipeline with reduced precision and the error it causes.
+
+    - the master table (inputs and derived FeH/kcal columns, populations) is built as float32
+      by the dense joins (joins.prepare(inputs, dtype)) and allocated in float32, country codes
+      and years are int16: about half the memory of the float64 tables, without a float64 copy
+    - sums (national, country groupings, global) are accumulated in float64 and stored as float32
+    - opt-in (reference=True): the regional (income groups) and global results are compared with
+      a float64 reference run of the same inputs, maximum relative deviation per column
+
+primary_product_Code stays an object column (numbers and 'Infrastructure'), so that the
+national sums contain the same columns as in the float64 run.
+
+Usage:
+    results = run_compact('.')
+    results = run_compact('.', reference=True)   # results.precision: deviation from float64
+    results.precision.sort_values('max_rel_deviation').tail()
+"""
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp import joins
+from food_ehanpp.pipeline import LINK, aggregate_national, aggregate_regional, allocate, load, run
+
+
+FLOAT = 'float32' # storage of all float columns
+CODES = {'Destination_code_FAO': 'int16', 'Year': 'int16'} # FAO codes < 400, years < 32768
+
+# tolerance of the conservation and bound checks of float32 tables (float32 resolution ~6e-8)
+RTOL = 1e-5
+
+REGIONAL_KEYS = ['income_group','Year','Final_use','food_group']
+GLOBAL_KEYS = ['Year','Final_use','food_group']
+
+
+def compact(df):
+    """df with float64 columns as float32 and codes as small integers (codes with gaps stay float32)."""
+    types = {column: FLOAT for column in df.columns[df.dtypes == 'float64']}
+    for column, dtype in CODES.items():
+        if column in df.columns and pd.api.types.is_numeric_dtype(df[column]) and df[column].notna().all():
+            types[column] = dtype
+    return df.astype(types)
+
+
+def narrow_codes(df):
+    """df with the codes as small integers, converted column by column (codes with gaps stay as they are)."""
+    for column, dtype in CODES.items():
+        if column in df.columns and pd.api.types.is_numeric_dtype(df[column]) and df[column].notna().all():
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def widen(df):
+    """df with float32 columns as float64 (for small tables that are summed up further)."""
+    return df.astype({column: 'float64' for column in df.columns[df.dtypes == FLOAT]})
+
+
+def memory(df):
+    """Memory of df in bytes (incl. object columns)."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def sum_by(df, keys):
+    """Sum of the numeric columns of df by keys like pipeline.sum_by, accumulated in float64.
+
+    Each column is summed with np.bincount over the group numbers, so only one column at a
+    time is held in float64.
+    """
+    groups = df.groupby(keys, sort=True, observed=True)
+    numbers = groups.ngroup().fillna(-1).to_numpy(dtype='int64') # missing key: NaN of ngroup -> -1
+    index = groups.size().index
+    rows = numbers >= 0 # rows with missing keys are dropped as in groupby
+    sums = {}
+    for column in df.columns.drop(keys):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            sums[column] = np.bincount(numbers[rows], weights=values.to_numpy(dtype='float64')[rows], minlength=len(index))
+    return pd.DataFrame(sums, index=index).reset_index()
+
+
+def global_totals(df_food_national):
+    """Sum of all countries by year, final use and food group (float64), without per-capita values and elasticities."""
+    columns = [column for column in df_food_national.select_dtypes('number').columns
+               if column not in ['Destination_code_FAO', 'Year'] and 'cap' not in column and not column.startswith('e_FeH_')]
+    return sum_by(df_food_national[GLOBAL_KEYS + columns], GLOBAL_KEYS)
+
+
+def max_relative_deviation(df, reference, keys):
+    """Maximum relative deviation |df - reference| / |reference| per numeric column, rows matched by keys.
+
+    Rows where the reference is 0 or missing are not counted.
+    """
+    columns = [column for column in reference.select_dtypes('number').columns
+               if column in df.columns and column not in keys]
+    merged = reference[keys + columns].merge(widen(df[keys + columns]), how='inner', on=keys, suffixes=('', '_compact'))
+    deviations = {}
+    for column in columns:
+        values = merged[column].to_numpy(dtype='float64')
+        compact_values = merged[column + '_compact'].to_numpy(dtype='float64')
+        counted = np.isfinite(values) & (values != 0)
+        deviation = np.abs(compact_values[counted] - values[counted]) / np.abs(values[counted])
+        deviations[column] = float(np.nanmax(deviation)) if deviation.size else 0.0
+    return pd.Series(deviations, name='max_rel_deviation')
+
+
+def precision_report(results, reference):
+    """Maximum relative deviation of the compact from the float64 results: rows (output, column), regional and global."""
+    frames = []
+    for output, df, df_reference, keys in [
+            ('regional', results.df_food_regional, reference.df_food_regional, REGIONAL_KEYS),
+            ('global', global_totals(results.df_food_national), global_totals(reference.df_food_national), GLOBAL_KEYS)]:
+        deviation = max_relative_deviation(df, df_reference, keys).rename_axis('column').reset_index()
+        deviation.insert(0, 'output', output)
+        frames.append(deviation)
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_compact(path='.', link=LINK, inputs=None, reference=False):
+    """All calculation stages with float32 tables; returns Results like pipeline.run.
+
+    With reference, the same inputs are also run in float64: results.precision is the
+    precision_report and results.memory the memory of the master table (bytes) in both runs.
+    """
+    if inputs is None:
+        inputs = load(path, link)
+    #master table gathered as float32, the allocation of float32 columns stays float32
+    results = joins.prepare(inputs, dtype=FLOAT)
+    results.df_food_5 = narrow_codes(results.df_food_5)
+    results.df_food_6 = allocate(results.df_food_5, rtol=RTOL)
+
+    #sums in float64, stored in float32
+    results.df_food_national = compact(aggregate_national(results.df_food_6, results.df_pop_nat, sum_by=sum_by))
+    df_food_groups, df_food_regional = aggregate_regional(widen(results.df_food_national), results.df_classification,
+                                                          results.df_pop_groups)
+    results.df_food_groups, results.df_food_regional = compact(df_food_groups), compact(df_food_regional)
+
+    if reference:
+        results_float64 = run(inputs=inputs)
+        results.precision = precision_report(results, results_float64)
+        results.memory = {'float64': memory(results_float64.df_food_6), 'compact': memory(results.df_food_6)}
+    return results
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Preview mode for figure work
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: approximate figures from a coarsened copy of the master table, for iterating on
+the layout of Figures 3, 4 and S5 without the full calculation.
+
+The copy (preview/master.parquet, with population and classification tables) has one row per
+country, year, final use and food group instead of per primary product:
+
+    HANPP_embodied_in_trade, kcal      sums over the products of the food group
+    GDD urban/rural (all estimates)    means over the products, weighted by HANPP
+    population                         as in the master table
+
+so allocation, aggregation and figure data run unchanged on a table about 20 times smaller.
+The urban/rural split of a food group with the mean intake of its products is not the sum of
+the splits of the products (and kcal are split with the HANPP-weighted intakes), so the
+preview is approximate. Countries can be sampled (regional totals then cover only the sampled
+countries, per-capita values their population) and years thinned (the 3-year average then
+spans the kept years). deviation_report compares the figure data with the last full run.
+
+Usage:
+    build_preview_inputs('preview', results)     # after a full run, or: python -m food_ehanpp preview --build
+    results, data = run_preview('preview', countries=0.5, year_step=2)
+    deviation_report(data, 'results')
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.export import _flat
+from food_ehanpp.figures import FIGURE_INDEX, figure_data
+from food_ehanpp.grouping import select_scheme
+from food_ehanpp.keys import decode
+from food_ehanpp.pipeline import Results, aggregate_national, aggregate_regional, allocate, group_population
+from food_ehanpp.scenarios import BOUNDS
+
+
+COARSE_KEYS = ['Destination_code_FAO', 'Destination', 'GDD_code', 'income_group', 'Year', 'Final_use', 'food_group']
+GDD_COLUMNS = [column for bounds in BOUNDS.values() for column in bounds]
+POPULATION_COLUMNS = ['pop_national', 'pop_urb_share', 'urban population', 'rural population']
+
+TABLES = {'master': 'master.parquet', 'pop_nat': 'pop_nat.parquet', 'classification': 'classification.parquet'}
+
+
+###############################################################################
+#                              Coarse inputs                                  #
+###############################################################################
+
+def coarsen(df_food_5):
+    """Master table by food group instead of primary product (see module description); kcal are
+    stored as tonnes_traded_dm with dm_content = kcal/g = 1, so allocate gives kcal_traded = kcal."""
+    df = decode(df_food_5)
+    def numbers(column):
+        return pd.to_numeric(df[column], errors='coerce')
+    weight = numbers('HANPP_embodied_in_trade').fillna(0).abs()
+    columns = {'HANPP_embodied_in_trade': numbers('HANPP_embodied_in_trade'),
+               'kcal': numbers('tonnes_traded_dm') / numbers('dm_content') * 1000 * 1000 * numbers('kcal/g'),
+               'weight': weight}
+    for column in GDD_COLUMNS:
+        columns[f'weighted {column}'] = weight * numbers(column)
+        columns[column] = numbers(column)
+    df_sums = pd.DataFrame(columns, index=df.index).join(df[COARSE_KEYS + POPULATION_COLUMNS])
+
+    groups = df_sums.groupby(COARSE_KEYS, observed=True, dropna=False)
+    df_coarse = groups[['HANPP_embodied_in_trade', 'kcal', 'weight'] + [f'weighted {column}' for column in GDD_COLUMNS]].sum()
+    means = groups[GDD_COLUMNS].mean()
+    for column in GDD_COLUMNS:
+        #groups without HANPP: unweighted mean
+        df_coarse[column] = (df_coarse[f'weighted {column}'] / df_coarse['weight'].where(df_coarse['weight'] != 0)).fillna(means[column])
+    df_coarse = df_coarse.join(groups[POPULATION_COLUMNS].first()).reset_index()
+    df_coarse['tonnes_traded_dm'] = df_coarse['kcal'] / 1000 / 1000
+    df_coarse['dm_content'] = 1.0
+    df_coarse['kcal/g'] = 1.0
+    return df_coarse[COARSE_KEYS + ['HANPP_embodied_in_trade'] + GDD_COLUMNS + POPULATION_COLUMNS +
+                     ['tonnes_traded_dm', 'dm_content', 'kcal/g']]
+
+
+def build_preview_inputs(directory, results):
+    """Store the coarsened master table, national population and classification of results (pipeline.prepare or run)."""
+    os.makedirs(directory, exist_ok=True)
+    tables = {'master': coarsen(results.df_food_5), 'pop_nat': results.df_pop_nat, 'classification': results.df_classification}
+    for name, df in tables.items():
+        decode(df).reset_index(drop=True).to_parquet(os.path.join(directory, TABLES[name]), index=False)
+
+
+def read_preview_inputs(directory):
+    """Tables of build_preview_inputs (name -> data frame)."""
+    return {name: pd.read_parquet(os.path.join(directory, file)) for name, file in TABLES.items()}
+
+
+def subsample(tables, countries=None, year_step=1, seed=0):
+    """Preview tables with a sample of countries (share 0-1 or list of FAO codes, None: all)
+    and every year_step-th year."""
+    years = np.sort(tables['master']['Year'].unique())[::year_step]
+    codes = np.sort(tables['master']['Destination_code_FAO'].unique())
+    if isinstance(countries, float):
+        size = max(1, int(round(countries * len(codes))))
+        codes = np.sort(np.random.default_rng(seed).choice(codes, size=size, replace=False))
+    elif countries is not None:
+        codes = np.asarray(countries)
+    return {name: df.loc[df['Year'].isin(years) & df['Destination_code_FAO'].isin(codes)].reset_index(drop=True)
+            for name, df in tables.items()}
+
+
+###############################################################################
+#                                 Preview                                     #
+###############################################################################
+
+def run_preview(directory='preview', countries=None, year_step=1, seed=0):
+    """Allocation, aggregation and figure data of the coarsened tables in directory; returns Results and figure data."""
+    tables = subsample(read_preview_inputs(directory), countries, year_step, seed)
+    df_pop_groups = group_population(tables['pop_nat'], tables['classification'])
+    results = Results(df_food_5=tables['master'], df_pop_nat=tables['pop_nat'], df_classification=tables['classification'],
+                      df_pop_groups=df_pop_groups, df_pop_reg=select_scheme(df_pop_groups, 'income_group'))
+    results.df_food_6 = allocate(results.df_food_5)
+    results.df_food_national = aggregate_national(results.df_food_6, results.df_pop_nat)
+    results.df_food_groups, results.df_food_regional = aggregate_regional(
+        results.df_food_national, results.df_classification, results.df_pop_groups)
+    return results, figure_data(results.df_food_regional, results.df_pop_reg)
+
+
+def deviation_report(data, directory='results'):
+    """Deviation of preview figure data from the figure data of the last full run (directory of
+    figure_data_<name>.parquet): per figure the number of compared cells, maximum and median
+    relative deviation (cells where the full run is 0 or missing are not counted)."""
+    rows = []
+    for name, df in data.items():
+        file = os.path.join(directory, f'figure_data_{name}.parquet')
+        if not os.path.exists(file):
+            continue
+        index = FIGURE_INDEX[name.split('_')[0].rstrip('abcdefghi')]
+        full = pd.read_parquet(file).set_index(index)
+        preview = _flat(df).set_index(index)
+        preview, full = preview.align(full, join='inner')
+        values = full.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+        approx = preview.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+        counted = np.isfinite(values) & np.isfinite(approx) & (values != 0)
+        deviation = np.abs(approx[counted] - values[counted]) / np.abs(values[counted])
+        rows.append({'figure': name, 'cells': int(counted.sum()),
+                     'max_rel_deviation': float(deviation.max()) if deviation.size else np.nan,
+                     'median_rel_deviation': float(np.median(deviation)) if deviation.size else np.nan})
+    return pd.DataFrame(rows, columns=['figure', 'cells', 'max_rel_deviation', 'median_rel_deviation'])
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Product-level national results
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: urban/rural FeH and kcal of all scenarios per country, year, final use and
+primary product, as the master table has them before df_food_national sums them up to
+food groups. Most country x product x year combinations are zero, so only the non-zero
+cells are stored, in a compressed sparse row layout:
+
+    values          cells x metrics, sorted by product, country, year, final use
+    country, year, final_use    small integer codes of every cell
+    product_ptr     cells of product i are product_ptr[i]:product_ptr[i+1] (contiguous)
+    country_order, country_ptr  cells of country j are country_order[country_ptr[j]:country_ptr[j+1]]
+
+so that a product or a country is sliced without scanning all cells. Stored as npz file.
+
+Usage:
+    products = ProductResults.from_master_table(results.df_food_6)
+    products.save('product_results.npz')
+    products = ProductResults.load('product_results.npz')
+    products.sel(product='Wheat', year=slice(2000, 2010))
+    products.sel(country='India', metric=['FeH_urban_median', 'FeH_rural_median'])
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.scenarios import BOUNDS
+from food_ehanpp.sensitivity import derivative_columns
+
+
+# summable columns of the master table (t dm/yr, kcal/yr and their derivatives)
+METRICS = (['HANPP_embodied_in_trade', 'kcal_traded'] +
+           [f'{quantity}_{area}_{scenario}' for quantity in ['FeH', 'kcal'] for scenario in BOUNDS for area in ['urban', 'rural']] +
+           derivative_columns())
+
+KEYS = ['primary_product', 'Destination_code_FAO', 'Year', 'Final_use']
+
+
+class ProductResults:
+    """Non-zero product-level national results with slicing by product and country."""
+
+    def __init__(self, arrays, labels):
+        self.arrays = arrays
+        self.labels = labels
+        self.metrics = labels['metric']
+        self._products = {str(product): i for i, product in enumerate(labels['product'])}
+        self._countries = {}
+        for j, (code, name) in enumerate(zip(labels['country'], labels['country_name'])):
+            self._countries[str(code)] = self._countries[name] = j
+
+    @classmethod
+    def from_master_table(cls, df_food_6, metrics=METRICS):
+        """Product-level sums of the master table (df_food_6), cells where all metrics are 0 are dropped."""
+        df = df_food_6[KEYS + ['Destination'] + list(metrics)]
+        df = df.astype({key: str for key in ['primary_product', 'Final_use', 'Destination']})
+        df = df.fillna({metric: 0 for metric in metrics})
+        df = df.groupby(KEYS + ['Destination'])[list(metrics)].sum().reset_index() # sorted by product, country, year, final use
+
+        values = df[list(metrics)].to_numpy(dtype='float64')
+        nonzero = (values != 0).any(axis=1)
+        df, values = df.loc[nonzero].reset_index(drop=True), values[nonzero]
+
+        countries = df[['Destination_code_FAO', 'Destination']].drop_duplicates('Destination_code_FAO').sort_values('Destination_code_FAO')
+        labels = {'product': sorted(df['primary_product'].unique()),
+                  'country': [int(code) for code in countries['Destination_code_FAO']],
+                  'country_name': list(countries['Destination']),
+                  'year': sorted(int(year) for year in df['Year'].unique()),
+                  'final_use': sorted(df['Final_use'].unique()),
+                  'metric': list(metrics)}
+
+        product = pd.Categorical(df['primary_product'], categories=labels['product']).codes
+        country = pd.Categorical(df['Destination_code_FAO'].astype(int), categories=labels['country']).codes
+        arrays = {'values': values,
+                  'country': country.astype('int16'),
+                  'year': pd.Categorical(df['Year'].astype(int), categories=labels['year']).codes.astype('int16'),
+                  'final_use': pd.Categorical(df['Final_use'], categories=labels['final_use']).codes.astype('int8'),
+                  'product_ptr': np.searchsorted(product, np.arange(len(labels['product']) + 1)).astype('int64'),
+                  'country_order': np.argsort(country, kind='stable').astype('int64'),
+                  'country_ptr': np.searchsorted(np.sort(country), np.arange(len(labels['country']) + 1)).astype('int64')}
+        return cls(arrays, labels)
+
+    def save(self, file):
+        """Store the arrays as npz file."""
+        np.savez_compressed(file, labels=np.array(json.dumps(self.labels)), **self.arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            labels = json.loads(str(data['labels']))
+            arrays = {key: data[key] for key in data.files if key != 'labels'}
+        return cls(arrays, labels)
+
+    @property
+    def density(self):
+        """Share of stored cells in all product x country x year x final use combinations."""
+        return len(self.arrays['values']) / np.prod([len(self.labels[axis]) for axis in ['product', 'country', 'year', 'final_use']])
+
+    ###########################################################################
+    #slicing
+
+    def _product_cells(self, product):
+        i = self._products[str(product)]
+        return np.arange(self.arrays['product_ptr'][i], self.arrays['product_ptr'][i + 1])
+
+    def _country_cells(self, country):
+        j = self._countries[str(country)]
+        return self.arrays['country_order'][self.arrays['country_ptr'][j]:self.arrays['country_ptr'][j + 1]] # ascending (stable sort)
+
+    def _cells(self, products, countries):
+        """Cell positions of the products and countries (None = all)."""
+        if products is None and countries is None:
+            return np.arange(len(self.arrays['values']))
+        by_product = None if products is None else np.concatenate([self._product_cells(p) for p in products])
+        by_country = None if countries is None else np.concatenate([self._country_cells(c) for c in countries])
+        if by_product is None:
+            return np.sort(by_country)
+        if by_country is None:
+            return by_product
+        return np.intersect1d(by_product, by_country)
+
+    def sel(self, product=None, country=None, year=None, final_use=None, metric=None):
+        """Long data frame of the non-zero cells of products/countries (name, FAO code or list of them),
+        years (year, list or inclusive slice), final uses and metrics (None = all)."""
+        def as_list(value):
+            return None if value is None else list(value) if isinstance(value, (list, tuple)) else [value]
+
+        cells = self._cells(as_list(product), as_list(country))
+        if year is not None:
+            years = np.array(self.labels['year'])
+            if isinstance(year, slice):
+                keep = ((years >= (years[0] if year.start is None else year.start)) &
+                        (years <= (years[-1] if year.stop is None else year.stop)))
+            else:
+                keep = np.isin(years, as_list(year))
+            cells = cells[keep[self.arrays['year'][cells]]]
+        if final_use is not None:
+            keep = np.isin(self.labels['final_use'], as_list(final_use))
+            cells = cells[keep[self.arrays['final_use'][cells]]]
+        year_codes = self.arrays['year'][cells]
+
+        metrics = as_list(metric) or self.metrics
+        columns = [self.metrics.index(m) for m in metrics]
+        product_codes = np.searchsorted(self.arrays['product_ptr'], cells, side='right') - 1
+        df = pd.DataFrame({'primary_product': np.array(self.labels['product'], dtype=object)[product_codes],
+                           'Destination_code_FAO': np.array(self.labels['country'])[self.arrays['country'][cells]],
+                           'Destination': np.array(self.labels['country_name'], dtype=object)[self.arrays['country'][cells]],
+                           'Year': np.array(self.labels['year'])[year_codes],
+                           'Final_use': np.array(self.labels['final_use'], dtype=object)[self.arrays['final_use'][cells]]})
+        return pd.concat([df, pd.DataFrame(self.arrays['values'][np.ix_(cells, columns)], columns=metrics)], axis=1)
+
+    def to_frame(self):
+        """All stored cells as long data frame."""
+        return self.sel()
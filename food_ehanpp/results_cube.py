@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Results cube
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: stores the national urban/rural results as a memory-mapped array
+(country x year x final_use x food_group x metric x scenario) and serves slices of it
+via a small Python API and a local HTTP query server, so that results can be looked up
+without rerunning the main calculation.
+
+Usage:
+    cube = ResultsCube('results_cube')
+    cube.sel('IND', year=slice(1990, 2020), metric='FeH_urban_cap')
+
+    python -m food_ehanpp.results_cube results_cube --port 8050
+    --> http://127.0.0.1:8050/slice?country=IND&year=1990:2020&metric=FeH_urban_cap
+"""
+
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+# axes of the cube in storage order
+AXES = ['country', 'year', 'final_use', 'food_group', 'metric', 'scenario']
+
+# median = GDD median, hoch = urban lower/rural upper, niedrig = urban upper/rural lower
+SCENARIOS = ['median', 'hoch', 'niedrig']
+
+# FeH in t dm/yr and t dm/cap/yr, kcal in kcal/yr and kcal/cap/day
+METRICS = ['FeH_urban', 'FeH_rural', 'FeH_urban_cap', 'FeH_rural_cap',
+           'kcal_urban', 'kcal_rural', 'kcal_urban_cap', 'kcal_rural_cap']
+
+MANIFEST = 'cube.json'
+CHUNK_FILE = 'chunk_{:03d}.npy'
+CHUNK_COUNTRIES = 16 # countries per chunk file
+
+
+###############################################################################
+#                                  Write                                      #
+###############################################################################
+
+def write_results_cube(directory, df_food_national, df_pop_nat, df_countries, chunk_countries=CHUNK_COUNTRIES):
+    """Write the national results (df_food_national) as chunked .npy files plus manifest to directory.
+
+    df_pop_nat provides urban/rural population for the per capita metrics and
+    df_countries the GDD codes by which countries can be queried as well.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    df = df_food_national.merge(df_pop_nat[['Destination_code_FAO','Year','urban population','rural population']],
+                                how='left', on=['Destination_code_FAO','Year'])
+
+    countries = df[['Destination_code_FAO','Destination']].drop_duplicates('Destination_code_FAO')
+    countries = countries.sort_values('Destination_code_FAO')
+    gdd_codes = df_countries.drop_duplicates('Destination_code_FAO').set_index('Destination_code_FAO')['GDD_code']
+
+    labels = {'country': [int(code) for code in countries['Destination_code_FAO']],
+              'year': sorted(int(year) for year in df['Year'].unique()),
+              'final_use': sorted(df['Final_use'].unique()),
+              'food_group': sorted(df['food_group'].unique()),
+              'metric': METRICS,
+              'scenario': SCENARIOS}
+    shape = tuple(len(labels[axis]) for axis in AXES)
+
+    #position of every national row on the first four axes
+    country_idx = pd.Categorical(df['Destination_code_FAO'].astype(int), categories=labels['country']).codes
+    year_idx = pd.Categorical(df['Year'].astype(int), categories=labels['year']).codes
+    final_use_idx = pd.Categorical(df['Final_use'], categories=labels['final_use']).codes
+    food_group_idx = pd.Categorical(df['food_group'], categories=labels['food_group']).codes
+
+    #metric x scenario block of every national row
+    urban_pop = df['urban population'].to_numpy(dtype=float)
+    rural_pop = df['rural population'].to_numpy(dtype=float)
+    urban_pop = np.where(urban_pop != 0, urban_pop, np.nan) # no per capita values without population
+    rural_pop = np.where(rural_pop != 0, rural_pop, np.nan)
+    values = np.empty((len(df), len(METRICS), len(SCENARIOS)))
+    for j, scenario in enumerate(SCENARIOS):
+        FeH_urban = df[f'FeH_urban_{scenario}'].to_numpy(dtype=float)
+        FeH_rural = df[f'FeH_rural_{scenario}'].to_numpy(dtype=float)
+        kcal_urban = df[f'kcal_urban_{scenario}'].to_numpy(dtype=float)
+        kcal_rural = df[f'kcal_rural_{scenario}'].to_numpy(dtype=float)
+        values[:, :, j] = np.column_stack([FeH_urban, FeH_rural, FeH_urban / urban_pop, FeH_rural / rural_pop,
+                                           kcal_urban, kcal_rural, kcal_urban / urban_pop / 365, kcal_rural / rural_pop / 365])
+
+    #one file per block of countries, combinations without data are 0
+    n_chunks = -(-shape[0] // chunk_countries)
+    for k in range(n_chunks):
+        start = k * chunk_countries
+        stop = min(start + chunk_countries, shape[0])
+        chunk = np.lib.format.open_memmap(os.path.join(directory, CHUNK_FILE.format(k)), mode='w+',
+                                          dtype='float64', shape=(stop - start,) + shape[1:])
+        chunk[:] = 0
+        rows = (country_idx >= start) & (country_idx < stop)
+        chunk[country_idx[rows] - start, year_idx[rows], final_use_idx[rows], food_group_idx[rows]] = values[rows]
+        chunk.flush()
+        del chunk
+
+    manifest = {'axes': AXES,
+                'shape': shape,
+                'labels': labels,
+                'country_names': [str(name) for name in countries['Destination']],
+                'country_GDD_codes': [str(gdd_codes.get(code, '')) for code in labels['country']],
+                'chunk_countries': chunk_countries,
+                'n_chunks': n_chunks,
+                'dtype': 'float64'}
+    #the manifest is written last so that readers never see a half written cube
+    with open(os.path.join(directory, MANIFEST + '.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(directory, MANIFEST + '.tmp'), os.path.join(directory, MANIFEST))
+
+
+###############################################################################
+#                                  Read                                       #
+###############################################################################
+
+class ResultsCube:
+    """Read-only, memory-mapped view on a cube written by write_results_cube."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.labels = self.manifest['labels']
+        self.chunk_countries = self.manifest['chunk_countries']
+        self._chunks = [np.load(os.path.join(directory, CHUNK_FILE.format(k)), mmap_mode='r')
+                        for k in range(self.manifest['n_chunks'])]
+        self._positions = {axis: {label: i for i, label in enumerate(self.labels[axis])} for axis in AXES}
+
+        #countries can be addressed by FAO code, FAO name or GDD code (several FAO countries share one GDD code)
+        self._country_positions = {}
+        for i, (code, name, gdd_code) in enumerate(zip(self.labels['country'], self.manifest['country_names'],
+                                                       self.manifest['country_GDD_codes'])):
+            for key in {str(code), name, gdd_code}:
+                self._country_positions.setdefault(key, []).append(i)
+
+    def _select(self, axis, value):
+        """Positions on axis for a label, a list of labels, a (inclusive) slice of labels or None (= all)."""
+        labels = self.labels[axis]
+        if value is None:
+            return list(range(len(labels)))
+        if isinstance(value, slice):
+            return [i for i, label in enumerate(labels)
+                    if (value.start is None or label >= value.start) and (value.stop is None or label <= value.stop)]
+        if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+            return [i for v in value for i in self._select(axis, v)]
+        if axis == 'country':
+            if str(value) not in self._country_positions:
+                raise KeyError(f'unknown country: {value}')
+            return self._country_positions[str(value)]
+        if value not in self._positions[axis]:
+            raise KeyError(f'unknown {axis}: {value}')
+        return [self._positions[axis][value]]
+
+    def array(self, country=None, year=None, final_use=None, food_group=None, metric=None, scenario=None):
+        """Slice of the cube as ndarray plus the labels of its axes.
+
+        final_use and food_group that are not given are summed up (all food/ all uses),
+        all other axes that are not given are returned in full.
+        """
+        country_idx = self._select('country', country)
+        year_idx = self._select('year', year)
+        final_use_idx = self._select('final_use', final_use)
+        food_group_idx = self._select('food_group', food_group)
+        metric_idx = self._select('metric', metric)
+        scenario_idx = self._select('scenario', scenario)
+
+        index = np.ix_(year_idx, final_use_idx, food_group_idx, metric_idx, scenario_idx)
+        data = np.stack([self._chunks[c // self.chunk_countries][c % self.chunk_countries][index]
+                         for c in country_idx])
+
+        axes = list(AXES)
+        if food_group is None:
+            data = data.sum(axis=3)
+            axes.remove('food_group')
+        if final_use is None:
+            data = data.sum(axis=2)
+            axes.remove('final_use')
+
+        positions = {'country': country_idx, 'year': year_idx, 'final_use': final_use_idx,
+                     'food_group': food_group_idx, 'metric': metric_idx, 'scenario': scenario_idx}
+        labels = {axis: [self.labels[axis][i] for i in positions[axis]] for axis in axes}
+        labels['country'] = [self.manifest['country_names'][i] for i in country_idx]
+        return data, labels
+
+    def sel(self, country=None, year=None, final_use=None, food_group=None, metric=None, scenario=None):
+        """Slice of the cube as long data frame with one column per axis and a value column."""
+        data, labels = self.array(country, year, final_use, food_group, metric, scenario)
+        index = pd.MultiIndex.from_product(list(labels.values()), names=list(labels.keys()))
+        return pd.DataFrame({'value': data.ravel()}, index=index).reset_index()
+
+
+###############################################################################
+#                               Query server                                  #
+###############################################################################
+
+def _parse_query(query):
+    """Selection keywords for ResultsCube.sel from an url query (lists with ',', years with ':')."""
+    selection = {}
+    for axis in ['country', 'year', 'final_use', 'food_group', 'metric', 'scenario']:
+        if axis not in query:
+            continue
+        values = [v for value in query[axis] for v in value.split(',')]
+        if axis == 'year':
+            years = []
+            for value in values:
+                if ':' in value:
+                    start, stop = value.split(':')
+                    years.append(slice(int(start) if start else None, int(stop) if stop else None))
+                else:
+                    years.append(int(value))
+            values = years
+        selection[axis] = values[0] if len(values) == 1 else values
+    return selection
+
+
+def serve_results_cube(directory, host='127.0.0.1', port=8050):
+    """Serve slices of the cube in directory as json on http://host:port/slice and /axes."""
+    cube = ResultsCube(directory)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == '/axes':
+                    body = {'labels': cube.labels, 'country_names': cube.manifest['country_names'],
+                            'country_GDD_codes': cube.manifest['country_GDD_codes']}
+                elif url.path == '/slice':
+                    frame = cube.sel(**_parse_query(parse_qs(url.query)))
+                    frame = frame.astype(object).where(frame.notna(), None) # NaN is no valid json
+                    body = frame.to_dict(orient='records')
+                else:
+                    self.send_error(404, 'use /axes or /slice')
+                    return
+            except (KeyError, ValueError) as error: # unknown labels, values that are no numbers (e.g. year=abc)
+                self.send_error(400, str(error))
+                return
+            content = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'serving {directory} on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a Food-eHANPP results cube')
+    parser.add_argument('directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args()
+    serve_results_cube(args.directory, args.host, args.port)
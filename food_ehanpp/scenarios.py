@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Title: What-if scenarios for urbanization and diets
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: urban/rural Food-eHANPP is fully determined by the national product-level
+HANPP (and kcal), the GDD urban/rural intakes and pop_urb_share. The engine collects the
+scenario-invariant parts of the master table once (HANPP and kcal summed per country,
+year and GDD intake cell) and then evaluates batches of urbanization and intake scenarios
+as array operations, aggregated to income groups (or countries) and globally. Countries
+are assigned to the group of the classification vintage of every year
+(grouping.country_classification), as in the regional results.
+
+Usage:
+    engine = ScenarioEngine.load('scenario_engine.npz')
+    #2019 urbanization with 1990 diets and rural diets converging to urban diets
+    result = engine.evaluate(share_year=2019, diet_year=1990)
+    result = engine.evaluate(convergence=np.linspace(0, 1, 1001))
+    result.to_frame()
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.grouping import SCHEMES, select_scheme
+
+
+# GDD intake columns (urban, rural) used for the three allocation variants of the main script
+BOUNDS = {'median': ('GDD_urban_median', 'GDD_rural_median'),
+          'hoch': ('GDD_urban_lower', 'GDD_rural_upper'), # high estimate: urban lower, rural upper
+          'niedrig': ('GDD_urban_upper', 'GDD_rural_lower')} # low estimate: urban upper, rural lower
+
+METRICS = ['FeH_urban', 'FeH_rural', 'kcal_urban', 'kcal_rural', 'urban population', 'rural population']
+
+CHUNK_SIZE = 64 # scenarios evaluated at once, limits memory to CHUNK_SIZE x n_cells
+
+
+class ScenarioResult:
+    """Aggregated results of a batch of scenarios: arrays of shape (scenario, group, year) per metric."""
+
+    def __init__(self, values, groups, years, parameters):
+        self.values = values
+        self.groups = groups
+        self.years = years
+        self.parameters = parameters
+
+    def __getitem__(self, metric):
+        return self.values[metric]
+
+    def per_capita(self, area='urban'):
+        """FeH per capita (t dm/cap/yr) of the urban or rural population."""
+        population = self.values[f'{area} population']
+        return np.divide(self.values[f'FeH_{area}'], population,
+                         out=np.full(population.shape, np.nan), where=population != 0)
+
+    def to_frame(self):
+        """Long data frame with one row per scenario, group and year."""
+        index = pd.MultiIndex.from_product([range(len(self.parameters)), self.groups, self.years],
+                                           names=['scenario', 'group', 'Year'])
+        df = pd.DataFrame({metric: values.ravel() for metric, values in self.values.items()}, index=index)
+        df['FeH_urban_cap'] = self.per_capita('urban').ravel()
+        df['FeH_rural_cap'] = self.per_capita('rural').ravel()
+        df = df.reset_index()
+        return self.parameters.merge(df, how='right', left_index=True, right_on='scenario')
+
+
+class ScenarioEngine:
+    """Batched urban/rural allocation of national FeH and kcal for what-if scenarios."""
+
+    def __init__(self, arrays, labels):
+        self.arrays = arrays
+        self.labels = labels
+        self.years = labels['year']
+        self.groups = labels['group'] + ['Global']
+
+    ###########################################################################
+    #precompute scenario-invariant parts
+
+    @classmethod
+    def from_master_table(cls, df_food_6, df_pop_nat, df_classification=None, group='income_group'):
+        """Collect the invariant parts from the master table (df_food_6) and national population.
+
+        group is a scheme of df_classification (grouping.country_classification), e.g. income_group,
+        with the group of every country and year, or a column of df_food_6 such as 'Destination'
+        for results by country. The income_group column of df_food_6 is the 2020 vintage only,
+        so scheme groups are always taken from df_classification.
+        """
+        gdd_columns = sorted({column for columns in BOUNDS.values() for column in columns})
+        df = df_food_6[['Destination_code_FAO', 'Year', 'food_group', 'GDD_item_code'] + gdd_columns +
+                       ['HANPP_embodied_in_trade', 'kcal_traded']].copy()
+        df['kcal_traded'] = pd.to_numeric(df['kcal_traded'], errors='coerce').fillna(0)
+
+        #one cell per country, year and GDD intake (rows in a cell share the same allocation key)
+        df = df.groupby(['Destination_code_FAO', 'Year', 'food_group', 'GDD_item_code'] + gdd_columns,
+                        dropna=False, observed=True)[['HANPP_embodied_in_trade', 'kcal_traded']].sum().reset_index()
+
+        countries = np.sort(df['Destination_code_FAO'].unique())
+        years = sorted(int(year) for year in df['Year'].unique())
+        items = sorted(df[['food_group', 'GDD_item_code']].astype(str).drop_duplicates().itertuples(index=False, name=None))
+
+        #group of every country and year
+        if group in SCHEMES:
+            if df_classification is None:
+                raise ValueError(f'group {group} needs df_classification (groups change over years)')
+            df_groups = select_scheme(df_classification, group).astype({'Year': int})
+        else:
+            df_groups = df_food_6[['Destination_code_FAO', 'Year', group]].drop_duplicates(['Destination_code_FAO', 'Year'])
+        df_groups = df_groups.set_index(['Destination_code_FAO', 'Year'])[group]
+        full_index = pd.MultiIndex.from_product([countries, years])
+        country_groups = df_groups.reindex(full_index)
+        groups = sorted(str(g) for g in country_groups.dropna().unique())
+        country_group = pd.Categorical(country_groups.astype(str).where(country_groups.notna()),
+                                       categories=groups).codes.reshape(len(countries), len(years)) # -1: no group
+
+        country_idx = pd.Categorical(df['Destination_code_FAO'], categories=countries).codes
+        year_idx = pd.Categorical(df['Year'].astype(int), categories=years).codes
+        item_idx = pd.MultiIndex.from_frame(df[['food_group', 'GDD_item_code']].astype(str)).map(
+            {item: i for i, item in enumerate(items)}).to_numpy(dtype=np.int64)
+
+        #intake tables country x year x item, so that intakes of other years can be looked up
+        arrays = {}
+        for column in gdd_columns:
+            table = np.full((len(countries), len(years), len(items)), np.nan)
+            table[country_idx, year_idx, item_idx] = df[column].to_numpy(dtype=float)
+            arrays[column] = table
+
+        #population tables country x year
+        pop = df_pop_nat.loc[df_pop_nat['Destination_code_FAO'].isin(countries)]
+        pop = pop.set_index(['Destination_code_FAO', 'Year'])
+        arrays['pop_national'] = pop['pop_national'].reindex(full_index).to_numpy(dtype=float).reshape(len(countries), len(years))
+        arrays['pop_urb_share'] = pop['pop_urb_share'].reindex(full_index).to_numpy(dtype=float).reshape(len(countries), len(years))
+
+        #cells sorted by group and year so that group sums are contiguous slices (cells without group dropped)
+        cell_group = country_group[country_idx, year_idx].astype(np.int64)
+        order = np.flatnonzero(cell_group >= 0)
+        cell_group = cell_group * len(years) + year_idx
+        order = order[np.argsort(cell_group[order], kind='stable')]
+        arrays.update({'HANPP': df['HANPP_embodied_in_trade'].to_numpy(dtype=float)[order],
+                       'kcal': df['kcal_traded'].to_numpy(dtype=float)[order],
+                       'country_idx': country_idx[order].astype(np.int64),
+                       'year_idx': year_idx[order].astype(np.int64),
+                       'item_idx': item_idx[order],
+                       'cell_group': cell_group[order],
+                       'country_group': country_group.astype(np.int64)})
+
+        labels = {'country': [int(code) for code in countries],
+                  'year': years, 'group': groups, 'item': [list(item) for item in items]}
+        return cls(arrays, labels)
+
+    def save(self, file):
+        """Store the precomputed arrays as npz file."""
+        np.savez_compressed(file, labels=np.array(json.dumps(self.labels)), **self.arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            labels = json.loads(str(data['labels']))
+            arrays = {key: data[key] for key in data.files if key != 'labels'}
+        return cls(arrays, labels)
+
+    ###########################################################################
+    #scenarios
+
+    def _year_positions(self, years, n):
+        """Year index per scenario, -1 = year of the cell itself."""
+        years = np.broadcast_to(np.asarray(-1 if years is None else years), (n,))
+        positions = np.array([self.years.index(int(year)) if year is not None and year >= 0 else -1 for year in years])
+        return positions
+
+    def evaluate(self, share_year=None, share_delta=0.0, diet_year=None, convergence=0.0, bound='median',
+                 chunk_size=CHUNK_SIZE):
+        """Evaluate a batch of scenarios; every parameter is a scalar or an array with one value per scenario.
+
+        share_year:  take pop_urb_share of all countries from this year instead of the actual year
+        share_delta: shift pop_urb_share by this value (clipped to 0..1)
+        diet_year:   take GDD urban/rural intakes from this year instead of the actual year
+        convergence: rural intake converges to urban intake (0 = as observed, 1 = rural eats like urban)
+        bound:       GDD estimate used for the intakes ('median', 'hoch' or 'niedrig')
+        """
+        n = max(np.size(p) for p in [share_year, share_delta, diet_year, convergence] if p is not None)
+        share_years = self._year_positions(share_year, n)
+        diet_years = self._year_positions(diet_year, n)
+        share_deltas = np.broadcast_to(np.asarray(share_delta, dtype=float), (n,))
+        convergences = np.broadcast_to(np.asarray(convergence, dtype=float), (n,))
+
+        parameters = pd.DataFrame({'share_year': np.broadcast_to(np.asarray(-1 if share_year is None else share_year), (n,)),
+                                   'share_delta': share_deltas,
+                                   'diet_year': np.broadcast_to(np.asarray(-1 if diet_year is None else diet_year), (n,)),
+                                   'convergence': convergences,
+                                   'bound': bound})
+
+        values = {metric: np.empty((n, len(self.groups), len(self.years))) for metric in METRICS}
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            chunk = self._evaluate_chunk(share_years[start:stop], share_deltas[start:stop],
+                                         diet_years[start:stop], convergences[start:stop], bound)
+            for metric in METRICS:
+                values[metric][start:stop] = chunk[metric]
+        return ScenarioResult(values, self.groups, self.years, parameters)
+
+    def _evaluate_chunk(self, share_years, share_deltas, diet_years, convergences, bound):
+        a = self.arrays
+        c, y, item = a['country_idx'], a['year_idx'], a['item_idx']
+        n_groups, n_years = len(self.labels['group']), len(self.years)
+
+        #urban share per scenario, country and year
+        share = a['pop_urb_share'][None, :, :].repeat(len(share_years), axis=0)
+        fixed = share_years >= 0
+        share[fixed] = a['pop_urb_share'][:, share_years[fixed]].T[:, :, None]
+        share = np.clip(share + share_deltas[:, None, None], 0, 1)
+
+        #intakes per scenario and cell
+        urban_table, rural_table = a[BOUNDS[bound][0]], a[BOUNDS[bound][1]]
+        diet_y = np.where(diet_years[:, None] >= 0, diet_years[:, None], y[None, :])
+        gdd_urban = urban_table[c[None, :], diet_y, item[None, :]]
+        gdd_rural = rural_table[c[None, :], diet_y, item[None, :]]
+        #intakes not available in the diet year: keep the actual intakes
+        gdd_urban = np.where(np.isnan(gdd_urban), urban_table[c, y, item][None, :], gdd_urban)
+        gdd_rural = np.where(np.isnan(gdd_rural), rural_table[c, y, item][None, :], gdd_rural)
+        gdd_rural = gdd_rural + convergences[:, None] * (gdd_urban - gdd_rural)
+
+        #allocation: urban share = GDD_urban*urban pop / (GDD_urban*urban pop + GDD_rural*rural pop)
+        cell_share = share[:, c, y]
+        #(national population cancels out); cells without weights count as 0 like in df_food_national
+        weight_urban = gdd_urban * cell_share
+        weight_rural = gdd_rural * (1 - cell_share)
+        weight_total = weight_urban + weight_rural
+        valid = (weight_total != 0) & ~np.isnan(weight_total)
+        urban_part = np.divide(weight_urban, weight_total, out=np.zeros_like(weight_total), where=valid)
+        rural_part = np.divide(weight_rural, weight_total, out=np.zeros_like(weight_total), where=valid)
+
+        #sum cells per group and year (cells are sorted by group and year)
+        starts = np.flatnonzero(np.r_[True, a['cell_group'][1:] != a['cell_group'][:-1]])
+        present = a['cell_group'][starts]
+
+        def group_sums(cell_values):
+            out = np.zeros((cell_values.shape[0], n_groups * n_years))
+            out[:, present] = np.add.reduceat(cell_values, starts, axis=1)
+            out = out.reshape(-1, n_groups, n_years)
+            return np.concatenate([out, out.sum(axis=1, keepdims=True)], axis=1) # + Global
+
+        result = {'FeH_urban': group_sums(a['HANPP'][None, :] * urban_part),
+                  'FeH_rural': group_sums(a['HANPP'][None, :] * rural_part),
+                  'kcal_urban': group_sums(a['kcal'][None, :] * urban_part),
+                  'kcal_rural': group_sums(a['kcal'][None, :] * rural_part)}
+
+        #population per group under the scenario urban share (group of every country and year)
+        country_group = a['country_group']
+        membership = np.zeros(country_group.shape + (n_groups,))
+        country, year = np.nonzero(country_group >= 0)
+        membership[country, year, country_group[country, year]] = 1
+        pop = np.nan_to_num(a['pop_national'])
+        urban_pop = np.einsum('scy,cyg->sgy', pop[None, :, :] * np.nan_to_num(share), membership)
+        rural_pop = np.einsum('cy,cyg->gy', pop, membership)[None, :, :] - urban_pop
+        result['urban population'] = np.concatenate([urban_pop, urban_pop.sum(axis=1, keepdims=True)], axis=1)
+        result['rural population'] = np.concatenate([rural_pop, rural_pop.sum(axis=1, keepdims=True)], axis=1)
+        return result
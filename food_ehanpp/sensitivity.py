@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Sensitivity of the urban/rural allocation
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: closed-form derivatives and elasticities of FeH_urban and FeH_rural with
+respect to the urban population share (pop_urb_share) and the GDD urban/rural intake
+ratio (GDD_urban/GDD_rural).
+
+With s = pop_urb_share, W = GDD_urban*s + GDD_rural*(1-s) and H = HANPP_embodied_in_trade
+the allocation of the main script is FeH_urban = H*GDD_urban*s/W, FeH_rural = H*GDD_rural*(1-s)/W:
+
+    dFeH_urban/ds        = H*GDD_urban*GDD_rural/W^2      = -dFeH_rural/ds
+    dFeH_urban/dln(ratio) = FeH_urban*FeH_rural/H          = -dFeH_rural/dln(ratio)
+
+Both derivatives are additive over products, so they can be summed up to national and
+regional level like FeH itself. Elasticities are calculated from the sums:
+
+    e_share = dFeH/ds * s / FeH          e_ratio = dFeH/dln(ratio) / FeH
+
+At regional level the share derivative refers to the same absolute change of
+pop_urb_share in all countries, which changes the regional share by the same amount.
+"""
+
+import numpy as np
+
+from food_ehanpp.scenarios import BOUNDS
+
+
+def derivative_columns():
+    return [f'dFeH_{area}_{variable}_{scenario}' for scenario in BOUNDS
+            for variable in ['dshare', 'dlnratio'] for area in ['urban', 'rural']]
+
+
+def elasticity_columns():
+    return [f'e_FeH_{area}_{variable}_{scenario}' for scenario in BOUNDS
+            for variable in ['share', 'ratio'] for area in ['urban', 'rural']]
+
+
+def _nonzero(x):
+    return x.where(x != 0, np.nan)
+
+
+def derivative_expressions(c, nonzero=_nonzero):
+    """Derivatives as expressions of the column accessor c (column name -> pandas Series or polars
+    expression); nonzero(x) replaces 0 by missing values. Returns column name -> expression."""
+    HANPP = nonzero(c('HANPP_embodied_in_trade'))
+    share = c('pop_urb_share')
+    columns = {}
+    for scenario, (gdd_urban, gdd_rural) in BOUNDS.items():
+        weight = c(gdd_urban) * share + c(gdd_rural) * (1 - share)
+        dshare = c('HANPP_embodied_in_trade') * c(gdd_urban) * c(gdd_rural) / nonzero(weight) ** 2
+        dlnratio = c(f'FeH_urban_{scenario}') * c(f'FeH_rural_{scenario}') / HANPP
+        columns[f'dFeH_urban_dshare_{scenario}'] = dshare
+        columns[f'dFeH_rural_dshare_{scenario}'] = -dshare
+        columns[f'dFeH_urban_dlnratio_{scenario}'] = dlnratio
+        columns[f'dFeH_rural_dlnratio_{scenario}'] = -dlnratio
+    return columns
+
+
+def elasticity_expressions(c, share, nonzero=_nonzero):
+    """Elasticities as expressions of the column accessor c, share = pop_urb_share (see derivative_expressions)."""
+    columns = {}
+    for scenario in BOUNDS:
+        for area in ['urban', 'rural']:
+            FeH = nonzero(c(f'FeH_{area}_{scenario}'))
+            columns[f'e_FeH_{area}_share_{scenario}'] = c(f'dFeH_{area}_dshare_{scenario}') * share / FeH
+            columns[f'e_FeH_{area}_ratio_{scenario}'] = c(f'dFeH_{area}_dlnratio_{scenario}') / FeH
+    return columns
+
+
+def add_derivatives(df):
+    """Add derivatives of FeH_urban/FeH_rural of all three estimates to the master table (in place)."""
+    for column, values in derivative_expressions(df.__getitem__).items():
+        df[column] = values
+
+
+def add_elasticities(df, share):
+    """Add elasticities to an aggregated (national or regional) frame, share = pop_urb_share per row (in place)."""
+    for column, values in elasticity_expressions(df.__getitem__, share).items():
+        df[column] = values
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Warm session
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: keeps the parsed inputs and the tables of all stages in memory and recomputes only
+the stages downstream of a change, instead of a cold start of the main script per run.
+
+    stage       computes                                         depends on
+    inputs      eHANPP, food supply, look_up.xlsx, GDD tables     input files, link
+    master      df_food_5, population and classification         inputs, dense_joins
+    national    df_food_6, df_food_national                      master, kernels
+    regional    df_food_groups, df_food_regional                 national
+    outputs     figure data, exported results, figures           regional, export, figures, products
+
+A changed input file is re-read alone (the other inputs stay parsed). The parameters are read
+from a json file (keys of DEFAULTS); files of a remote link (the default GitHub repository)
+are read once and not watched. Sessions are used interactively or as a daemon that polls the
+input files and the parameter file:
+
+Usage:
+    session = Session('.')
+    session.update()                        # all stages
+    session.set(kernels=True)               # national, regional and outputs are recomputed
+    session.results.df_food_regional
+
+    python -m food_ehanpp session --config session.json
+"""
+
+import json
+import os
+import time
+
+from food_ehanpp.keys import KeyDictionary
+from food_ehanpp.pipeline import (EHANPP_FILE, FOOD_SUPPLY_FILE, GDD_FILES, LINK, Inputs, Results, aggregate_national,
+                                  aggregate_regional, allocate, load_ehanpp, load_gdd, load_look_up, prepare,
+                                  read_food_supply, write_outputs)
+
+
+# stages in the order of execution -> stage they depend on
+STAGES = {'inputs': None, 'master': 'inputs', 'national': 'master', 'regional': 'national', 'outputs': 'regional'}
+
+# parameters -> first stage that has to be recomputed when they change
+DEFAULTS = {'link': LINK, 'dense_joins': True, 'kernels': False, 'export': True, 'figures': True, 'products': False}
+PARAMETER_STAGES = {'link': 'inputs', 'dense_joins': 'master', 'kernels': 'national',
+                    'export': 'outputs', 'figures': 'outputs', 'products': 'outputs'}
+
+INTERVAL = 2.0 # seconds between two checks of the watched files
+
+
+def _remote(link):
+    return link.startswith(('http://', 'https://'))
+
+
+class Session:
+    """Inputs and results of the pipeline kept in memory (see module description)."""
+
+    def __init__(self, path='.', config=None, **parameters):
+        self.path = path
+        self.config = config
+        self.parameters = dict(DEFAULTS)
+        self.parameters.update(self._read_config())
+        self.parameters.update(parameters)
+        self.tables = {} # input source -> parsed table(s), before encoding
+        self.inputs = None
+        self.results = Results()
+        self.figure_data = None
+        self.dirty = set(STAGES)
+        self.stamps = self._stamps()
+
+    ###########################################################################
+    #watched files
+
+    def sources(self):
+        """Input source -> local files it is read from (remote files are not listed)."""
+        link = self.parameters['link']
+        files = {'df_food': [os.path.join(self.path, EHANPP_FILE)],
+                 'df0_food_supply': [os.path.join(self.path, FOOD_SUPPLY_FILE)],
+                 'look_up': [] if _remote(link) else [os.path.join(link, 'look_up.xlsx')],
+                 'GDD': [] if _remote(link) else [os.path.join(link, file) for file in GDD_FILES.values()]}
+        if self.config:
+            files['config'] = [self.config]
+        return files
+
+    def _stamps(self):
+        return {source: tuple(os.path.getmtime(file) if os.path.exists(file) else None for file in files)
+                for source, files in self.sources().items()}
+
+    def _read_config(self):
+        if not self.config or not os.path.exists(self.config):
+            return {}
+        with open(self.config) as f:
+            parameters = json.load(f)
+        unknown = set(parameters) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f'unknown parameters in {self.config}: {sorted(unknown)}')
+        return parameters
+
+    def check(self):
+        """Compare the watched files with the last check; changed inputs are re-read and the
+        stages after them (or after changed parameters) are marked for recomputation."""
+        stamps = self._stamps()
+        changed = [source for source, stamp in stamps.items() if self.stamps.get(source) != stamp]
+        self.stamps = stamps
+        for source in changed:
+            if source == 'config':
+                self.set(**{**DEFAULTS, **self._read_config()})
+            else:
+                self.reload(source)
+        return changed
+
+    ###########################################################################
+    #invalidation
+
+    def invalidate(self, stage):
+        """Mark stage and all stages after it for recomputation."""
+        stages = list(STAGES)
+        self.dirty.update(stages[stages.index(stage):])
+
+    def reload(self, *sources):
+        """Re-read input sources (df_food, df0_food_supply, look_up, GDD) at the next update."""
+        for source in sources:
+            self.tables.pop(source, None)
+        self.invalidate('inputs')
+
+    def set(self, **parameters):
+        """Change parameters; the stages that depend on changed parameters are recomputed at the next update."""
+        for name, value in parameters.items():
+            if name not in DEFAULTS:
+                raise ValueError(f'unknown parameter {name!r}')
+            if self.parameters[name] != value:
+                self.parameters[name] = value
+                if name == 'link':
+                    self.reload('look_up', 'GDD')
+                self.invalidate(PARAMETER_STAGES[name])
+
+    ###########################################################################
+    #stages
+
+    def _inputs(self):
+        link = self.parameters['link']
+        if not self.tables:
+            #first load: all reads at once
+            from food_ehanpp.loader import prefetch
+            inputs = prefetch(self.path, link).result()
+            self.tables = {'df_food': inputs.df_food, 'df0_food_supply': inputs.df0_food_supply,
+                           'look_up': inputs.look_up, 'GDD': inputs.GDD}
+        readers = {'df_food': lambda: load_ehanpp(os.path.join(self.path, EHANPP_FILE)),
+                   'df0_food_supply': lambda: read_food_supply(os.path.join(self.path, FOOD_SUPPLY_FILE)),
+                   'look_up': lambda: load_look_up(link), 'GDD': lambda: load_gdd(link)}
+        for source, read in readers.items():
+            if source not in self.tables:
+                self.tables[source] = read()
+        inputs = Inputs(**self.tables)
+        self.inputs = KeyDictionary.from_inputs(inputs).encode_inputs(inputs)
+
+    def _master(self):
+        if self.parameters['dense_joins']:
+            from food_ehanpp import joins
+            self.results = joins.prepare(self.inputs)
+        else:
+            self.results = prepare(self.inputs)
+
+    def _national(self):
+        if self.parameters['kernels']:
+            from food_ehanpp.kernels import allocate_national
+            self.results.df_food_6, self.results.df_food_national = allocate_national(self.results.df_food_5, self.results.df_pop_nat)
+        else:
+            self.results.df_food_6 = allocate(self.results.df_food_5)
+            self.results.df_food_national = aggregate_national(self.results.df_food_6, self.results.df_pop_nat)
+
+    def _regional(self):
+        self.results.df_food_groups, self.results.df_food_regional = aggregate_regional(
+            self.results.df_food_national, self.results.df_classification, self.results.df_pop_groups)
+
+    def _outputs(self):
+        from food_ehanpp.figures import figure_data, plot_figures
+
+        self.figure_data = figure_data(self.results.df_food_regional, self.results.df_pop_reg)
+        if self.parameters['export']:
+            write_outputs(self.results, self.path, self.figure_data, products=self.parameters['products'])
+        if self.parameters['figures']:
+            plot_figures(self.figure_data, self.path)
+
+    def update(self):
+        """Run the stages marked for recomputation; returns stage -> seconds."""
+        times = {}
+        for stage in STAGES:
+            if stage in self.dirty:
+                start = time.perf_counter()
+                getattr(self, f'_{stage}')()
+                self.dirty.discard(stage)
+                times[stage] = time.perf_counter() - start
+        return times
+
+    def watch(self, interval=INTERVAL, report=print):
+        """Update, then check the watched files every interval seconds and update after changes (until interrupted)."""
+        report(self.update())
+        while True:
+            time.sleep(interval)
+            changed = self.check()
+            if changed:
+                report(changed, self.update())
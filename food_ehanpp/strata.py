@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Allocation to demographic strata
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: extended mode that splits national Food-eHANPP and kcal not only into urban and
+rural, but into urban/rural x age x sex x education strata of the Global Dietary Database.
+
+The GDD country files (vXX_cnty.csv) contain the intake of every stratum; the GDD scripts
+keep only the totals (age, female and edu = 999). Here the fully cross-classified rows
+(urban, age, female, edu all != 999) are kept, summed to the GDD items of the main
+calculation and interpolated/extended over years as in food_ehanpp.gdd. By default the
+items and dropped years of the published GDD tables are used (gdd.PUBLISHED_ITEMS,
+gdd.DROP_YEARS), so the strata add up to the GDD values of the main calculation; pass
+items=gdd.ITEMS for milk as v13 + v14 + v57.
+
+The population weights are an input: a csv with the population per GDD country, year and
+stratum (columns GDD_code, Year, urban, age, female, edu, population, with the GDD codes of
+the strata). Analogous to the urban/rural split, stratum s of a country, year and GDD item
+gets the share
+
+    intake_s * population_s / sum over strata (intake * population)
+
+of the national HANPP and kcal of every primary product of the item. The share depends
+only on country, year and item, so the master table is first summed up by country, year,
+final use and primary product (the rows of the urban/rural split without Destination
+duplicates).
+Items without GDD data (infrastructure, stimulants without intake, gaps) are split by
+population, i.e. the same intake in every stratum, like the GDD value 1 in the main
+calculation. Countries are processed in batches; every batch holds at most
+batch_countries x years x products x final uses x strata values, and the key columns of
+the long result are categorical (one code per row instead of a copy of the keys).
+
+Usage:
+    intake = read_strata_intake(gdd_path, 'median')
+    population = read_strata_population('strata_population.csv')
+    write_strata('results/strata', results.df_food_6, intake, population)
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.gdd import ESTIMATES, PUBLISHED_ITEMS, STRATA, TOTAL, drop_years, interpolate_years
+from food_ehanpp.keys import decode
+
+
+CELL_KEYS = ['Destination_code_FAO', 'Destination', 'GDD_code', 'income_group', 'Year', 'Final_use',
+             'food_group', 'GDD_item_code', 'primary_product']
+BATCH_COUNTRIES = 16
+
+
+###############################################################################
+#                                  Inputs                                     #
+###############################################################################
+
+def read_strata_intake(path, estimate='median', items=PUBLISHED_ITEMS):
+    """Intake per GDD country, year and item (rows) and stratum (columns, MultiIndex STRATA)."""
+    column = ESTIMATES[estimate]
+    frames = []
+    for item, variables in items.items():
+        df_item = None
+        for variable in variables:
+            df = pd.read_csv(os.path.join(path, f'{variable}_cnty.csv'), usecols=['iso3', 'year'] + STRATA + [column])
+            df = drop_years(df.loc[(df[STRATA] != TOTAL).all(axis=1)], variable)
+            df = df.set_index(['iso3', 'year'] + STRATA)[column]
+            df_item = df if df_item is None else df_item.add(df) # sum of the variables, missing if one is missing
+        frames.append(df_item.rename('intake').reset_index().assign(GDD_item_code=item))
+    df = pd.concat(frames, ignore_index=True).rename(columns={'iso3': 'GDD_code', 'year': 'Year'})
+    df = df.pivot_table(index=['GDD_code', 'GDD_item_code', 'Year'], columns=STRATA, values='intake', dropna=False)
+
+    #interpolate between years and add 2019 and 2020 with values from 2018 (as food_ehanpp.gdd)
+    df = interpolate_years(df)
+    return df.reorder_levels(['GDD_code', 'Year', 'GDD_item_code']).sort_index()
+
+
+def read_strata_population(file):
+    """Population per GDD country and year (rows) and stratum (columns, MultiIndex STRATA) from a long csv."""
+    df = pd.read_csv(file)
+    return df.pivot_table(index=['GDD_code', 'Year'], columns=STRATA, values='population', aggfunc='sum')
+
+
+###############################################################################
+#                                Allocation                                   #
+###############################################################################
+
+def national_items(df_food_6):
+    """HANPP and kcal of the master table summed up by country, year, final use and primary product."""
+    df = decode(df_food_6[CELL_KEYS + ['HANPP_embodied_in_trade', 'kcal_traded']])
+    df = df.assign(kcal_traded=pd.to_numeric(df['kcal_traded'], errors='coerce').fillna(0),
+                   GDD_item_code=df['GDD_item_code'].fillna('XX'))
+    return df.groupby(CELL_KEYS, observed=True)[['HANPP_embodied_in_trade', 'kcal_traded']].sum().reset_index()
+
+
+def _rows(table, index):
+    """Rows of table for the index tuples (all NaN if missing)."""
+    positions = table.index.get_indexer(index)
+    values = table.to_numpy(dtype='float64')[np.where(positions >= 0, positions, 0)]
+    values[positions < 0] = np.nan
+    return values
+
+
+def allocate_strata(df_items, intake, population):
+    """HANPP and kcal of the cells of df_items (national_items) split into strata: long frame."""
+    strata = population.columns
+    intake = intake.reindex(columns=strata)
+    weights_pop = _rows(population, pd.MultiIndex.from_frame(df_items[['GDD_code', 'Year']]))
+    weights_pop = np.nan_to_num(weights_pop)
+    weights_intake = _rows(intake, pd.MultiIndex.from_frame(df_items[['GDD_code', 'Year', 'GDD_item_code']]))
+
+    #no intake data for a cell: same intake in every stratum
+    no_data = np.isnan(weights_intake).all(axis=1)
+    weights_intake[no_data] = 1
+    weights = np.nan_to_num(weights_intake) * weights_pop
+    total = weights.sum(axis=1, keepdims=True)
+    shares = np.divide(weights, total, out=np.zeros_like(weights), where=total != 0)
+
+    #only the non-zero (cell, stratum) values are built; keys are taken as categorical codes
+    values_feh = df_items['HANPP_embodied_in_trade'].to_numpy()[:, None] * shares
+    values_kcal = df_items['kcal_traded'].to_numpy()[:, None] * shares
+    rows, columns = np.nonzero((values_feh != 0) | (values_kcal != 0))
+    df = df_items[CELL_KEYS].astype('category').iloc[rows].reset_index(drop=True)
+    for i, name in enumerate(STRATA):
+        df[name] = strata.get_level_values(i).to_numpy()[columns]
+    df['population'] = weights_pop[rows, columns]
+    df['FeH'] = values_feh[rows, columns]
+    df['kcal'] = values_kcal[rows, columns]
+    df['no_intake_data'] = no_data[rows]
+    return df
+
+
+def strata_batches(df_food_6, intake, population, batch_countries=BATCH_COUNTRIES):
+    """Stratum results per batch of countries (generator of long frames, see allocate_strata)."""
+    df_items = national_items(df_food_6)
+    countries = np.sort(df_items['Destination_code_FAO'].unique())
+    for start in range(0, len(countries), batch_countries):
+        batch = df_items.loc[df_items['Destination_code_FAO'].isin(countries[start:start + batch_countries])]
+        yield allocate_strata(batch.reset_index(drop=True), intake, population)
+
+
+def write_strata(directory, df_food_6, intake, population, batch_countries=BATCH_COUNTRIES):
+    """Write the stratum results as one parquet file per batch of countries to directory."""
+    os.makedirs(directory, exist_ok=True)
+    for k, df in enumerate(strata_batches(df_food_6, intake, population, batch_countries)):
+        df.to_parquet(os.path.join(directory, f'strata_{k:03d}.parquet'), index=False)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Exact summation
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: group sums that do not depend on the order of the rows, on chunks or on workers.
+
+A float sum rounds after every addition, so a groupby sum of the same rows in another order
+(chunks, partitions, threads) can differ in the last bits. Here every float64 value is split
+into 32-bit pieces on a fixed grid of bit positions (limbs, lowest bit 2^BASE) and the pieces
+are added as int64 integers per group and limb: the limbs hold the exact sum. Partial sums of
+chunks (ExactSums) are merged by adding their limbs, which is exact as well, and only the
+final sum is rounded to float64 (within one unit in the last place of the exact sum, and
+always to the same value for the same rows).
+
+NaN counts as 0 as in pandas sums; +inf/-inf give +inf/-inf (both: NaN).
+
+Usage:
+    df_food_national = aggregate_national(df_food_6, df_pop_nat, sum_by=sum_by)
+    sum_by(df, keys, chunks=8, workers=8)          # same result as sum_by(df, keys)
+    (ExactSums.of(part_1, keys) + ExactSums.of(part_2, keys)).to_frame()
+
+    results = run('.', exact_sums=True)            # national and country group sums
+"""
+
+import functools
+import operator
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+LIMB_BITS = 32
+MASK = (1 << LIMB_BITS) - 1
+# exponent of the lowest bit of limb 0: below the last bit of the smallest subnormal number
+# (frexp gives subnormals a 53-bit mantissa with exponents down to -1126)
+BASE = -36 * LIMB_BITS
+
+
+def _pieces(values):
+    """Limb of the lowest piece and the three signed pieces (< 2^33) of finite, non-zero float64 values:
+    value = piece_0 * 2^(32 limb + BASE) + piece_1 * 2^(32 (limb + 1) + BASE) + piece_2 * 2^(32 (limb + 2) + BASE)."""
+    mantissa, exponent = np.frexp(values)
+    integer = np.abs(np.ldexp(mantissa, 53)).astype(np.int64) # exact, < 2^53
+    sign = np.where(mantissa < 0, -1, 1).astype(np.int64)
+    limb, shift = np.divmod(exponent.astype(np.int64) - 53 - BASE, LIMB_BITS)
+    low = (integer & MASK) << shift # < 2^63
+    high = (integer >> LIMB_BITS) << shift # < 2^52
+    return limb, sign * (low & MASK), sign * ((low >> LIMB_BITS) + (high & MASK)), sign * (high >> LIMB_BITS)
+
+
+def _normalize(limbs):
+    """Limbs (groups x limbs) with carries moved up: all limbs in [0, 2^32) except the highest, which keeps the sign."""
+    limbs = limbs.copy()
+    for k in range(limbs.shape[1] - 1):
+        carry = limbs[:, k] >> LIMB_BITS
+        limbs[:, k] -= carry << LIMB_BITS
+        limbs[:, k + 1] += carry
+    return limbs
+
+
+def _accumulate(groups, values, n_groups):
+    """Exact sums of values by group number (-1: not summed): lowest limb, limbs, counts of +inf and -inf."""
+    counted = groups >= 0
+    infinite = np.isinf(values) & counted
+    posinf = np.bincount(groups[infinite & (values > 0)], minlength=n_groups)
+    neginf = np.bincount(groups[infinite & (values < 0)], minlength=n_groups)
+    summed = counted & np.isfinite(values) & (values != 0)
+    if not summed.any():
+        return 0, np.zeros((n_groups, 1), dtype=np.int64), posinf, neginf
+
+    limb, *pieces = _pieces(values[summed])
+    lowest = int(limb.min())
+    width = int(limb.max()) - lowest + 3
+    limbs = np.zeros(n_groups * width, dtype=np.int64)
+    cells = groups[summed] * width + (limb - lowest)
+    for k, piece in enumerate(pieces):
+        np.add.at(limbs, cells + k, piece)
+    return lowest, _normalize(limbs.reshape(n_groups, width)), posinf, neginf
+
+
+def _to_float(lowest, limbs, posinf, neginf):
+    """float64 of exact sums: the limbs (normalized, non-negative after taking the sign out) are
+    added from the lowest to the highest limb, so equal limbs always give the same float."""
+    negative = limbs[:, -1] < 0
+    limbs = _normalize(np.where(negative[:, None], -limbs, limbs))
+    total = np.zeros(len(limbs))
+    for k in range(limbs.shape[1]):
+        total += np.ldexp(limbs[:, k].astype('float64'), LIMB_BITS * (lowest + k) + BASE)
+    total = np.where(negative, -total, total)
+    total = np.where(posinf > 0, np.inf, total)
+    total = np.where(neginf > 0, -np.inf, total)
+    return np.where((posinf > 0) & (neginf > 0), np.nan, total)
+
+
+def _summable(df, keys):
+    """Numeric columns of df except keys (the columns of pipeline.sum_by)."""
+    return [column for column in df.columns if column not in keys and
+            pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+
+
+class ExactSums:
+    """Exact partial sums of the numeric columns of a table by keys; partial sums of chunks
+    are merged with + (in any order, with the same result)."""
+
+    def __init__(self, keys, index, sums, dtypes):
+        self.keys = keys
+        self.index = index # groups, sorted
+        self.sums = sums # column -> (lowest limb, limbs, +inf counts, -inf counts)
+        self.dtypes = dtypes
+
+    @classmethod
+    def of(cls, df, keys, columns=None):
+        """Partial sums of the rows of df (rows with missing keys are dropped as in groupby)."""
+        keys = list(keys)
+        groups = df.groupby(keys, sort=True, observed=True)
+        numbers = groups.ngroup().fillna(-1).to_numpy(dtype='int64') # missing key: NaN of ngroup -> -1, not summed
+        index = groups.size().index
+        if columns is None:
+            columns = _summable(df, keys)
+        sums = {column: _accumulate(numbers, df[column].to_numpy(dtype='float64', na_value=np.nan), len(index))
+                for column in columns}
+        return cls(keys, index, sums, {column: df[column].dtype for column in columns})
+
+    def __add__(self, other):
+        index = self.index.append(other.index).unique().sort_values()
+        positions = [index.get_indexer(part.index) for part in (self, other)]
+        sums = {}
+        for column in self.sums:
+            parts = [part.sums[column] for part in (self, other)]
+            lowest = min(part[0] for part in parts)
+            width = max(part[0] + part[1].shape[1] for part in parts) - lowest
+            limbs = np.zeros((len(index), width), dtype=np.int64)
+            posinf = np.zeros(len(index), dtype=np.int64)
+            neginf = np.zeros(len(index), dtype=np.int64)
+            for position, (low, part_limbs, part_posinf, part_neginf) in zip(positions, parts):
+                limbs[position, low - lowest:low - lowest + part_limbs.shape[1]] += part_limbs
+                posinf[position] += part_posinf
+                neginf[position] += part_neginf
+            sums[column] = (lowest, _normalize(limbs), posinf, neginf)
+        return ExactSums(self.keys, index, sums, self.dtypes)
+
+    def to_frame(self):
+        """Sums as data frame like pipeline.sum_by (keys as columns; integer columns stay integer)."""
+        columns = {}
+        for column, sums in self.sums.items():
+            values = _to_float(*sums)
+            if pd.api.types.is_integer_dtype(self.dtypes[column]):
+                values = values.astype(self.dtypes[column])
+            columns[column] = values
+        return pd.DataFrame(columns, index=self.index).reset_index()
+
+
+def merge(partials):
+    """One ExactSums of several partial sums (e.g. of chunks or dask partitions)."""
+    return functools.reduce(operator.add, partials)
+
+
+def sum_by(df, keys, chunks=1, workers=None):
+    """Exact sum of the numeric columns of df by keys, like pipeline.sum_by. With chunks > 1 the
+    rows are summed in chunks (in a thread pool of workers threads) and the partial sums
+    merged; the result is the same for any chunks, workers and row order."""
+    if chunks == 1:
+        return ExactSums.of(df, keys).to_frame()
+    bounds = np.linspace(0, len(df), chunks + 1).astype(int)
+    parts = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    columns = _summable(df, list(keys))
+    with ThreadPoolExecutor(workers) as pool:
+        partials = list(pool.map(lambda part: ExactSums.of(part, keys, columns), parts))
+    return merge(partials).to_frame()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Title: Checks of the master table
+Repository: https://github.com/lisakaufmannsec/Food-eHANPP
+Description: cheap invariant checks for the intermediate tables of the main script.
+All checks are column-wise reductions (counts of NaNs, of violated conservation and of
+violated bound orders), no row copies of the tables are made. Failed checks raise a
+ValidationError with a compact report, so data errors stop the run early. Bound orders are
+a property of the GDD input data, not of the calculation: by default their failures (and
+NaNs in tables where they are allowed) are a ValidationWarning, with strict=True an error.
+
+Checks:
+    - NaNs per column (tables that should not contain any)
+    - allocation conservation: FeH_urban + FeH_rural == HANPP_embodied_in_trade and
+      kcal_urban + kcal_rural == kcal_traded for median, high and low estimate
+    - bound order: GDD lower <= median <= upper and therefore
+      FeH_urban_hoch <= FeH_urban_median <= FeH_urban_niedrig (rural the other way round)
+    - same results: a table of another execution path (dense joins, backends, dask) has the
+      rows and values of the reference table of the pipeline
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from food_ehanpp.scenarios import BOUNDS
+
+
+RTOL = 1e-9 # relative tolerance for conservation and bound checks
+ATOL = 1e-6 # absolute tolerance (t dm, kcal)
+
+
+class ValidationError(ValueError):
+    """A check of an intermediate table failed; the message is the compact report."""
+
+
+class ValidationWarning(UserWarning):
+    """A check of the input data failed that does not stop the run (bound order, allowed NaNs)."""
+
+
+def _values(df, column):
+    """Column as float array (no copy for float columns)."""
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def null_counts(df, columns=None):
+    """Number of NaNs per column, only columns with NaNs are returned."""
+    counts = {}
+    for column in columns if columns is not None else df.columns:
+        n = int(df[column].isna().sum())
+        if n:
+            counts[column] = n
+    return counts
+
+
+def report_nans(df, name, columns=None):
+    """Warn about the NaN counts of df (for tables where NaNs are allowed) and return them."""
+    counts = null_counts(df, columns)
+    if counts:
+        warnings.warn(f'{name}: NaNs in ' + ', '.join(f'{column} ({n})' for column, n in counts.items()),
+                      ValidationWarning, stacklevel=2)
+    return counts
+
+
+def check_no_nans(df, name, columns=None):
+    """Raise a ValidationError if df contains NaNs."""
+    counts = null_counts(df, columns)
+    if counts:
+        raise ValidationError(f'{name} ({len(df)} rows): NaNs in ' +
+                              ', '.join(f'{column} ({n})' for column, n in counts.items()))
+
+
+def conservation_failures(df, rtol=RTOL, atol=ATOL):
+    """Number of rows per check where urban + rural does not add up to the national total."""
+    failures = {}
+    HANPP = _values(df, 'HANPP_embodied_in_trade')
+    kcal = _values(df, 'kcal_traded')
+    for scenario in BOUNDS:
+        for total, quantity, name in [(HANPP, 'FeH', 'HANPP_embodied_in_trade'), (kcal, 'kcal', 'kcal_traded')]:
+            urban_rural = _values(df, f'{quantity}_urban_{scenario}') + _values(df, f'{quantity}_rural_{scenario}')
+            #rows without total (e.g. kcal of infrastructure) are not allocated
+            known = ~np.isnan(total)
+            #a missing allocation only counts if there is something to allocate
+            missing = known & np.isnan(urban_rural) & (total != 0)
+            wrong = known & ~np.isnan(urban_rural) & (np.abs(urban_rural - total) > atol + rtol * np.abs(total))
+            n = int(np.count_nonzero(missing | wrong))
+            if n:
+                failures[f'{quantity}_urban_{scenario} + {quantity}_rural_{scenario} != {name}'] = n
+    return failures
+
+
+def bound_failures(df, rtol=RTOL, atol=ATOL):
+    """Number of rows per check where lower, median and upper estimate are in the wrong order."""
+    orders = [('GDD_urban_lower', 'GDD_urban_median'), ('GDD_urban_median', 'GDD_urban_upper'),
+              ('GDD_rural_lower', 'GDD_rural_median'), ('GDD_rural_median', 'GDD_rural_upper'),
+              ('FeH_urban_hoch', 'FeH_urban_median'), ('FeH_urban_median', 'FeH_urban_niedrig'),
+              ('FeH_rural_niedrig', 'FeH_rural_median'), ('FeH_rural_median', 'FeH_rural_hoch')]
+    failures = {}
+    for low, high in orders:
+        a, b = _values(df, low), _values(df, high)
+        n = int(np.count_nonzero(a - b > atol + rtol * np.abs(b))) # NaNs compare False
+        if n:
+            failures[f'{low} <= {high}'] = n
+    return failures
+
+
+def _report(name, df, failures):
+    return (f'{name} ({len(df)} rows): {len(failures)} check(s) failed\n' +
+            '\n'.join(f'  {check}: {n} rows' for check, n in failures.items()))
+
+
+def check_master_table(df, name='df_food_6', rtol=RTOL, atol=ATOL, strict=False):
+    """Run conservation and bound checks on the master table: conservation failures raise a
+    ValidationError, bound failures a ValidationWarning (with strict a ValidationError)."""
+    failures = conservation_failures(df, rtol, atol)
+    bounds = bound_failures(df, rtol, atol)
+    if strict:
+        failures.update(bounds)
+    elif bounds:
+        warnings.warn(_report(name, df, bounds), ValidationWarning, stacklevel=2)
+    if failures:
+        raise ValidationError(_report(name, df, failures))
+
+
+def _comparable_keys(df, reference, keys):
+    """Key columns of df as numbers (numeric keys of reference) or strings, so that both tables can be merged."""
+    return df.assign(**{key: pd.to_numeric(df[key], errors='coerce').astype('float64')
+                        if pd.api.types.is_numeric_dtype(reference[key]) else df[key].astype(str) for key in keys})
+
+
+def result_differences(df, reference, keys, columns, rtol=RTOL, atol=ATOL):
+    """Differences of df from reference, rows matched by keys: missing columns, rows in only one
+    of the tables and the number of rows per column outside the tolerance (NaN equals NaN)."""
+    differences = {f'{column} missing': len(reference) for column in columns if column not in df.columns}
+    columns = [column for column in columns if column in df.columns]
+    merged = _comparable_keys(reference[keys + columns], reference, keys).merge(
+        _comparable_keys(df[keys + columns], reference, keys), how='outer', on=keys, suffixes=('', '_other'), indicator=True)
+    both = (merged['_merge'] == 'both').to_numpy()
+    if not both.all():
+        differences['rows in only one table'] = int(np.count_nonzero(~both))
+    merged = merged.loc[both]
+    for column in columns:
+        a, b = _values(merged, column), _values(merged, column + '_other')
+        n = int(np.count_nonzero((np.isnan(a) != np.isnan(b)) | (np.abs(a - b) > atol + rtol * np.abs(a))))
+        if n:
+            differences[column] = n
+    return differences
+
+
+def check_same_results(df, reference, keys, columns, name, rtol=RTOL, atol=ATOL):
+    """Raise a ValidationError if df differs from the reference table (see result_differences)."""
+    differences = result_differences(df, reference, keys, columns, rtol, atol)
+    if differences:
+        raise ValidationError(f'{name} ({len(df)} rows, reference {len(reference)} rows): {len(differences)} difference(s)\n' +
+                              '\n'.join(f'  {check}: {n} rows' for check, n in differences.items()))
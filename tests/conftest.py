@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Small synthetic inputs in the layout of pipeline.load (eHANPP, look_up.xlsx sheets, GDD, food supply)."""
+
+import pytest
+
+NAN = float('nan')
+
+
+YEARS = [2018, 2019]
+
+# code_FAO, name, GDD code, income group 2010, 2020 (Cland has none and is not considered)
+COUNTRIES = [(1, 'Aland', 'AAA', 'Low income', 'Lower middle income'),
+             (2, 'Bland', 'BBB', 'High income', 'High income'),
+             (3, 'Cland', 'CCC', NAN, NAN)]
+
+# code, name, food group, GDD item (no GDD data for stimulants)
+PRODUCTS = [(15, 'Wheat', 'Cereals', 'v09_v10', 'Grains'),
+            (867, 'Beef', 'Ruminant meat', 'v17', 'Beef'),
+            (656, 'Coffee', 'Sugars and stimulants', 'v99', NAN)]
+
+# GDD intakes (median, upper, lower) per area, same for all countries and years up to a factor
+INTAKES = {'median': (1.2, 1.0), 'upper': (1.5, 1.3), 'lower': (0.9, 0.8)}
+
+
+def _look_up():
+    import pandas as pd
+
+    country_groups = pd.DataFrame({'code_FAO': [c[0] for c in COUNTRIES], 'Country': [c[1] for c in COUNTRIES],
+                                   2010: [c[3] for c in COUNTRIES], 2020: [c[4] for c in COUNTRIES],
+                                   'GDD_code': [c[2] for c in COUNTRIES], 'world_region': ['North', 'South', 'South'],
+                                   'GDD_region': ['R1', 'R2', 'R2'], 'GDD_superregion': ['S1', 'S1', 'S1']})
+    products = pd.DataFrame(PRODUCTS, columns=['primary_product_Code', 'primary_product', 'food_group', 'GDD_item_code', 'GDD_item'])
+    population = {'Unnamed: 0': range(len(COUNTRIES)), 'Unnamed: 1': '', 'Country': [c[1] for c in COUNTRIES],
+                  'world_region': country_groups['world_region'], 'GDD_code': [c[2] for c in COUNTRIES],
+                  'code_FAO': [c[0] for c in COUNTRIES]}
+    total_population = pd.DataFrame({**population, 2018: [1000.0, 5000.0, 200.0], 2019: [1100.0, 5100.0, 210.0],
+                                     'GDD_superregion': country_groups['GDD_superregion']})
+    urban_population = pd.DataFrame({**population, 2018: [30.0, 80.0, 50.0], 2019: [32.0, 81.0, 51.0]})
+    urban_population = urban_population.rename(columns={'Unnamed: 0': 'SHARE'})
+    factors = pd.DataFrame({'primary_product_Code': [15, 867, 656], 'dm_content': [0.88, 0.35, 0.9], 'kcal/g': [3.4, 2.5, 0.5]})
+    return {'country_groups': country_groups, 'products': products, 'total_population': total_population,
+            'urban_population': urban_population, 'factors': factors}
+
+
+def _gdd():
+    import pandas as pd
+
+    GDD = {}
+    for estimate, (urban, rural) in INTAKES.items():
+        rows = [(code, year, item, urban * scale, rural * scale)
+                for scale, code in enumerate(['AAA', 'BBB', 'ETH'], 1) for year in YEARS for item in ['v09_v10', 'v17']]
+        GDD[estimate] = pd.DataFrame(rows, columns=['GDD_code', 'Year', 'GDD_item_code',
+                                                    f'GDD_urban_{estimate}', f'GDD_rural_{estimate}'])
+    return GDD
+
+
+def make_inputs(seed=0):
+    """Inputs of three countries (one not considered), two years, three products and infrastructure."""
+    import numpy as np
+    import pandas as pd
+
+    from food_ehanpp.pipeline import Inputs
+
+    rng = np.random.default_rng(seed)
+    products = [(str(p[0]), p[1]) for p in PRODUCTS] + [('Infrastructure', 'Infrastructure')]
+    food = [(name, float(code), year, use, product, product_code)
+            for code, name, *_ in COUNTRIES for year in YEARS for use in ['Food', 'Feed'] for product_code, product in products]
+    df_food = pd.DataFrame(food, columns=['Destination', 'Destination_code_FAO', 'Year', 'Final_use', 'primary_product', 'primary_product_Code'])
+    df_food['HANPP_embodied_in_trade'] = rng.uniform(1, 100, len(df_food))
+
+    supply = [(i, p[2], 'S1', float(code), name, gdd_code, year, p[1], float(p[0]))
+              for i, ((code, name, gdd_code, *_), year, p) in enumerate(
+                  (country, year, p) for country in COUNTRIES for year in YEARS for p in PRODUCTS)]
+    df0_food_supply = pd.DataFrame(supply, columns=['Unnamed: 0', 'food_group', 'GDD_superregion', 'Destination_code_FAO',
+                                                    'Destination', 'GDD_code', 'Year', 'primary_product', 'primary_product_Code'])
+    df0_food_supply['tonnes_traded_dm'] = rng.uniform(10, 1000, len(df0_food_supply))
+    return Inputs(df_food=df_food, look_up=_look_up(), GDD=_gdd(), df0_food_supply=df0_food_supply)
+
+
+@pytest.fixture
+def inputs():
+    return make_inputs()
+
+
+@pytest.fixture
+def results(inputs):
+    from food_ehanpp import pipeline
+
+    return pipeline.run(inputs=inputs)
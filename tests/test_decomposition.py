@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""LMDI: the contributions of the drivers add up to the change of FeH."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from food_ehanpp.decomposition import DRIVERS, lmdi
+
+
+def test_contributions_add_up_to_change():
+    rng = np.random.default_rng(0)
+    units, years, food_groups = 4, 3, 5
+    FeH = rng.uniform(1, 100, (2, 3, units, years, food_groups))
+    kcal = rng.uniform(1, 100, (2, 3, units, years, food_groups))
+    population = rng.uniform(1e5, 1e6, (units, years))
+    area_population = population * rng.uniform(0.2, 0.8, (units, years))
+    area_population = np.stack([area_population, population - area_population])
+    infrastructure = np.array([False, False, False, False, True])
+    start, end = np.array([0, 1, 0]), np.array([1, 2, 2])
+
+    contributions, total_start, total_end, residual = lmdi(FeH, kcal, population, area_population, infrastructure, start, end)
+    assert sorted(contributions) == sorted(DRIVERS)
+    change = total_end - total_start
+    np.testing.assert_allclose(sum(contributions.values()) + residual, change)
+    np.testing.assert_allclose(residual, 0, atol=1e-9 * np.abs(change).max())
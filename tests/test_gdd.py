@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""GDD extraction from country files with rows after the last GDD year."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+
+from food_ehanpp.gdd import LAST_YEAR, PUBLISHED_ITEMS, TOTAL, extract
+
+
+YEARS = [1990, 1995, 2000, 2005, 2010, 2015, 2018, 2020]
+
+
+def _write_country_files(path):
+    """vXX_cnty.csv files of two countries with totals by area, a stratum row and a 2020 row for every variable."""
+    variables = sorted({variable for item_variables in PUBLISHED_ITEMS.values() for variable in item_variables})
+    for k, variable in enumerate(variables):
+        rows = []
+        for country, scale in [('AAA', 1.0), ('BBB', 2.0)]:
+            for year in YEARS:
+                value = scale * (k + 1) * (1 + (year - 1990) / 100)
+                rows += [(country, TOTAL, TOTAL, 1, TOTAL, year, value),
+                         (country, TOTAL, TOTAL, 0, TOTAL, year, 0.8 * value),
+                         (country, TOTAL, TOTAL, TOTAL, TOTAL, year, 0.9 * value),
+                         (country, 1, TOTAL, 1, TOTAL, year, 5 * value)]
+        df = pd.DataFrame(rows, columns=['iso3', 'age', 'female', 'urban', 'edu', 'year', 'median'])
+        df.assign(upperci_95=1.1 * df['median'], lowerci_95=0.9 * df['median']).to_csv(path / f'{variable}_cnty.csv', index=False)
+    return variables
+
+
+def test_extract_has_unique_keys(tmp_path):
+    _write_country_files(tmp_path)
+    df = extract(tmp_path, 'median')
+    assert not df.duplicated(['Year', 'Country', 'GDD_item_code']).any()
+    assert sorted(df['Year'].unique()) == list(range(YEARS[0], 2021))
+    assert set(df['GDD_item_code']) == set(PUBLISHED_ITEMS)
+    assert len(df) == 2 * len(PUBLISHED_ITEMS) * (2021 - YEARS[0])
+
+
+def test_extract_extends_last_year(tmp_path):
+    _write_country_files(tmp_path)
+    df = extract(tmp_path, 'upper').set_index(['Country', 'GDD_item_code', 'Year'])
+    last = df.xs(LAST_YEAR, level='Year')
+    for year in [2019, 2020]:
+        pd.testing.assert_frame_equal(df.xs(year, level='Year'), last)
+    interpolated = df.xs(2016, level='Year')
+    np.testing.assert_allclose(interpolated.to_numpy(), (2 * df.xs(2015, level='Year') + last).to_numpy() / 3)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Weighted Gini and Theil indices on inputs with known values."""
+
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from food_ehanpp.inequality import weighted_gini, weighted_theil
+
+
+@pytest.mark.parametrize('x, w, gini', [([1, 1, 1, 1], [1, 1, 1, 1], 0.0),
+                                        ([0, 0, 0, 1], [1, 1, 1, 1], 0.75),
+                                        ([1, 2], [2, 1], 1 / 6),
+                                        ([1, 1, 2], [1, 1, 1], 1 / 6)])
+def test_gini(x, w, gini):
+    assert weighted_gini(np.array(x, dtype=float), np.array(w, dtype=float)) == pytest.approx(gini, abs=1e-12)
+
+
+@pytest.mark.parametrize('x, w, theil', [([1, 1], [1, 1], 0.0),
+                                         ([0, 1], [1, 1], math.log(2)),
+                                         ([1, 3], [1, 1], 0.75 * math.log(1.5) + 0.25 * math.log(0.5))])
+def test_theil(x, w, theil):
+    assert weighted_theil(np.array(x, dtype=float), np.array(w, dtype=float)) == pytest.approx(theil, abs=1e-12)
+
+
+def test_weights_equal_repeated_units():
+    x, w = np.array([3.0, 1.0, 2.0]), np.array([1.0, 3.0, 2.0])
+    repeated = np.repeat(x, w.astype(int))
+    ones = np.ones(len(repeated))
+    assert weighted_gini(x, w) == pytest.approx(weighted_gini(repeated, ones))
+    assert weighted_theil(x, w) == pytest.approx(weighted_theil(repeated, ones))
+
+
+def test_missing_values_and_zero_weights_are_excluded():
+    x, w = np.array([1.0, np.nan, 2.0, 50.0]), np.array([2.0, 1.0, 1.0, 0.0])
+    assert weighted_gini(x, w) == pytest.approx(1 / 6)
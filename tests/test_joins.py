@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Dense-index joins against the merges of pipeline.prepare."""
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from food_ehanpp import joins, pipeline
+from food_ehanpp.validation import result_differences
+
+
+def test_dense_joins_equal_merges(inputs):
+    dense, merges = joins.check_against_merges(inputs)
+    assert len(dense) == len(merges) > 0
+    assert not result_differences(dense, merges, pipeline.NATIONAL_KEYS, pipeline.NATIONAL_COLUMNS)
+
+
+def test_dense_master_table_rows(inputs):
+    df_food_5 = joins.prepare(inputs).df_food_5
+    assert len(df_food_5) == len(pipeline.prepare(inputs).df_food_5)
+    assert set(df_food_5['Destination']) == {'Aland', 'Bland'} # Cland has no income group
+    infra = df_food_5['primary_product_Code'] == 'Infrastructure'
+    assert (df_food_5.loc[infra, 'food_group'] == 'Infra').all()
+    assert df_food_5.loc[infra, 'tonnes_traded_dm'].isna().all()
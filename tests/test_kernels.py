@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Fused allocation and national summation against pipeline.allocate and aggregate_national."""
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from food_ehanpp import joins, kernels, pipeline
+from food_ehanpp.validation import result_differences
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_kernels_equal_pipeline(inputs, compiled):
+    if compiled:
+        pytest.importorskip('numba')
+    results = joins.prepare(inputs)
+    df_food_6, df_food_national = kernels.allocate_national(results.df_food_5, results.df_pop_nat, compiled=compiled)
+    reference = pipeline.aggregate_national(pipeline.allocate(results.df_food_5), results.df_pop_nat)
+    assert len(df_food_6) == len(results.df_food_5)
+    assert len(df_food_national) == len(reference)
+    assert not result_differences(df_food_national, reference, pipeline.NATIONAL_KEYS, pipeline.NATIONAL_COLUMNS)
+
+
+def test_kernels_skip_rows_with_missing_keys(inputs):
+    results = joins.prepare(inputs)
+    df_food_5 = results.df_food_5.copy()
+    df_food_5.loc[0, 'Final_use'] = None
+    _, df_food_national = kernels.allocate_national(df_food_5, results.df_pop_nat, compiled=False)
+    reference = pipeline.aggregate_national(pipeline.allocate(df_food_5), results.df_pop_nat)
+    assert not result_differences(df_food_national, reference, pipeline.NATIONAL_KEYS, pipeline.NATIONAL_COLUMNS)
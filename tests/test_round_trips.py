@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Results cube and scenario engine (npz) written and read back."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from food_ehanpp.results_cube import ResultsCube, write_results_cube
+from food_ehanpp.scenarios import ScenarioEngine
+
+
+def test_results_cube_round_trip(results, tmp_path):
+    write_results_cube(tmp_path, results.df_food_national, results.df_pop_nat, results.df_countries, chunk_countries=1)
+    cube = ResultsCube(tmp_path)
+    df = cube.sel(metric='FeH_urban', scenario='median')
+    expected = results.df_food_national.groupby(['Destination', 'Year'])['FeH_urban_median'].sum()
+    df = df.set_index(['country', 'year'])['value']
+    assert len(df) == len(expected)
+    np.testing.assert_allclose(df.loc[expected.index].to_numpy(), expected.to_numpy())
+
+    #countries by GDD code, one final use and food group
+    row = results.df_food_national.iloc[0]
+    gdd_code = results.df_countries.set_index('Destination_code_FAO').loc[row['Destination_code_FAO'], 'GDD_code']
+    data, _ = cube.array(country=gdd_code, year=int(row['Year']),
+                         final_use=row['Final_use'], food_group=row['food_group'], metric='kcal_urban', scenario='hoch')
+    assert data.ravel()[0] == pytest.approx(row['kcal_urban_hoch'])
+
+
+def test_scenario_engine_round_trip(results, tmp_path):
+    engine = ScenarioEngine.from_master_table(results.df_food_6, results.df_pop_nat, results.df_classification)
+    engine.save(tmp_path / 'engine.npz')
+    loaded = ScenarioEngine.load(tmp_path / 'engine.npz')
+    assert loaded.labels == engine.labels
+    assert sorted(loaded.arrays) == sorted(engine.arrays)
+    for key, array in engine.arrays.items():
+        np.testing.assert_array_equal(loaded.arrays[key], array)
+    pd.testing.assert_frame_equal(loaded.evaluate(share_delta=[0.0, 0.1]).to_frame(),
+                                  engine.evaluate(share_delta=[0.0, 0.1]).to_frame())
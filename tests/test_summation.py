@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Exact sums against math.fsum."""
+
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from food_ehanpp.summation import sum_by
+
+
+def _table(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    magnitude = 10.0 ** rng.integers(-10, 17, n)
+    return pd.DataFrame({'k': rng.integers(0, 7, n), 'x': rng.standard_normal(n) * magnitude})
+
+
+def _fsums(df):
+    return df.groupby('k')['x'].apply(lambda x: math.fsum(x)).to_numpy()
+
+
+@pytest.mark.parametrize('chunks', [1, 4])
+def test_sums_equal_fsum(chunks):
+    df = _table()
+    sums = sum_by(df, ['k'], chunks=chunks)
+    assert list(sums['k']) == sorted(df['k'].unique())
+    np.testing.assert_allclose(sums['x'].to_numpy(), _fsums(df), rtol=4 * np.finfo(float).eps, atol=0)
+
+
+def test_sums_independent_of_row_order_and_chunks():
+    df = _table()
+    sums = sum_by(df, ['k'])['x'].to_numpy()
+    shuffled = df.sample(frac=1, random_state=1)
+    for chunks in [1, 3, 8]:
+        assert np.array_equal(sum_by(shuffled, ['k'], chunks=chunks)['x'].to_numpy(), sums)
+
+
+def test_cancellation_is_exact():
+    df = pd.DataFrame({'k': [0, 0, 0, 0, 1, 1, 1], 'x': [1e16, 1.0, -1e16, 1e-10, 2.0 ** 60, 0.5, -2.0 ** 60]})
+    sums = sum_by(df, ['k'])['x'].to_numpy()
+    assert sums[0] == math.fsum([1e16, 1.0, -1e16, 1e-10])
+    assert sums[1] == 0.5
+
+
+def test_rows_with_missing_keys_are_dropped():
+    df = pd.DataFrame({'k': [0.0, np.nan, 0.0, 1.0], 'x': [1.0, 5.0, 2.0, 4.0]})
+    sums = sum_by(df, ['k'])
+    assert list(sums['x']) == [3.0, 4.0]